@@ -0,0 +1,149 @@
+"""
+Requests/sec per worker: async check handlers vs. the threadpool path.
+
+Starts one uvicorn worker serving main.app plus sync twins of the check
+endpoints (mounted under /bench/threadpool), then drives both paths with the
+same keep-alive load and prints throughput and latency percentiles.
+
+    python benchmarks/async_vs_threadpool.py --duration 10 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from fastapi import Request
+
+import main
+
+# ------------------------
+# THREADPOOL TWINS
+# ------------------------
+# Same decision core, rate limit and response models as main.app; only the
+# handler is a plain def, so Starlette runs it in the threadpool.
+app = main.app
+THREADPOOL_PREFIX = "/bench/threadpool"
+
+
+@app.post(THREADPOOL_PREFIX + "/age-gate/check", response_model=main.AgeGateResponse, include_in_schema=False)
+@main.limiter.limit(main.RATE_LIMIT)
+def threadpool_check(payload: main.AgeGateRequest, request: Request):
+    content, cache_seconds = main.evaluate_check(payload, request.state.rule_snapshot)
+    return main.check_response(main.encode_json(content), cache_seconds)
+
+
+@app.post(THREADPOOL_PREFIX + "/age-gate/check-bulk", response_model=main.BulkAgeGateResponse, include_in_schema=False)
+@main.limiter.limit(main.RATE_LIMIT)
+def threadpool_check_bulk(payload: main.BulkAgeGateRequest, request: Request):
+    content, cache_seconds = main.evaluate_check_bulk(payload, request.state.rule_snapshot)
+    return main.check_response(main.encode_json(content), cache_seconds)
+
+
+# ------------------------
+# LOAD GENERATOR
+# ------------------------
+PAYLOADS = {
+    "/age-gate/check": {"child_dob": "2014-03-09", "region": "DE", "feature": "ai_chat"},
+    "/age-gate/check-bulk": {
+        "child_dob": "2014-03-09",
+        "region": "DE",
+        "features": ["free_chat", "ai_chat", "voice_recording", "push_notifications", "location_sharing"],
+    },
+}
+
+
+async def _connection_loop(port: int, request: bytes, deadline: float, latencies: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line[:15].lower() == b"content-length:":
+                    length = int(line[15:])
+            await reader.readexactly(length)
+            if not head.startswith(b"HTTP/1.1 200"):
+                raise RuntimeError(head.split(b"\r\n", 1)[0].decode())
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def run_load(port: int, path: str, body: dict, duration: float, concurrency: int) -> dict:
+    data = json.dumps(body).encode()
+    request = (
+        f"POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\n\r\n"
+    ).encode() + data
+    latencies = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(_connection_loop(port, request, deadline, latencies) for _ in range(concurrency)))
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50_ms": quantiles[49] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_server(port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("uvicorn did not start")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="Keep-alive connections")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Warm-up seconds per scenario")
+    args = parser.parse_args()
+
+    port = _free_port()
+    # The decision cache would answer every repeated payload; compare the handlers themselves
+    env = {**os.environ, "RATE_LIMIT": "1000000000/minute", "AGE_GATE_DECISION_CACHE_SIZE": "0"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "async_vs_threadpool:app", "--app-dir", os.path.dirname(__file__),
+         "--port", str(port), "--workers", "1", "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        _wait_for_server(port)
+        print(f"{'endpoint':<22} {'path':<11} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+        for endpoint, body in PAYLOADS.items():
+            for label, path in (("async", endpoint), ("threadpool", THREADPOOL_PREFIX + endpoint)):
+                asyncio.run(run_load(port, path, body, args.warmup, args.concurrency))
+                result = asyncio.run(run_load(port, path, body, args.duration, args.concurrency))
+                print(f"{endpoint:<22} {label:<11} {result['rps']:>10.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main_cli()
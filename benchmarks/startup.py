@@ -0,0 +1,164 @@
+"""
+Cold-start benchmark: launches a fresh uvicorn worker per run and measures
+how long it takes to answer /health (ready) and its first /age-gate/check
+and /openapi.json requests, from the moment the process was started. Also
+reports an import-time profile of main.py (python -X importtime).
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --runs 5 --env AGE_GATE_PRELOAD=0
+    python benchmarks/startup.py --runs 5 --env AGE_GATE_OPENAPI_FILE=openapi.json
+    python benchmarks/startup.py --save-baseline benchmarks/startup-baseline.json
+    python benchmarks/startup.py --baseline benchmarks/startup-baseline.json --threshold 0.2
+
+Exits 1 when --baseline is given and a median regresses past --threshold.
+Requires httpx (pip install httpx).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rate limiting stays on but must not reject the probes
+BENCH_RATE_LIMIT = "1000000000/minute"
+
+CHECK_BODY = {"child_dob": "2015-06-12", "region": "DE", "feature": "free_chat"}
+
+# Timings reported per run, in milliseconds since the process was started
+# (first_check_ms / first_openapi_ms are the latency of that single request)
+METRICS = ("ready_ms", "first_response_ms", "first_check_ms", "second_check_ms", "first_openapi_ms")
+
+
+def measure_run(port: int, env: dict, timeout: float) -> dict:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", "1",
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT,
+        env={**os.environ, "RATE_LIMIT": BENCH_RATE_LIMIT, **env},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        with httpx.Client(base_url=base_url, timeout=5.0) as client:
+            deadline = started + timeout
+            while True:
+                if time.perf_counter() > deadline or server.poll() is not None:
+                    raise RuntimeError("uvicorn did not start")
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            ready = time.perf_counter()
+
+            def timed(method: str, path: str, **kwargs) -> float:
+                before = time.perf_counter()
+                response = client.request(method, path, **kwargs)
+                response.raise_for_status()
+                return (time.perf_counter() - before) * 1000
+
+            first_check_ms = timed("POST", "/age-gate/check", json=CHECK_BODY)
+            first_response = time.perf_counter()
+            second_check_ms = timed("POST", "/age-gate/check", json=CHECK_BODY)
+            first_openapi_ms = timed("GET", "/openapi.json")
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "ready_ms": (ready - started) * 1000,
+        "first_response_ms": (first_response - started) * 1000,
+        "first_check_ms": first_check_ms,
+        "second_check_ms": second_check_ms,
+        "first_openapi_ms": first_openapi_ms,
+    }
+
+
+def import_profile(top: int) -> list:
+    """(self µs, cumulative µs, module) from `python -X importtime -c "import main"`, by self time."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), module.rstrip()))
+    total = sum(self_us for self_us, _, _ in rows)
+    print(f"Import of main: {total / 1000:.1f} ms over {len(rows)} modules; top {top} by self time:")
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    for self_us, cumulative_us, module in sorted(rows, reverse=True)[:top]:
+        print(f"{self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}  {module.strip()}")
+    print()
+    return rows
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to measure (default 5)")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for each worker")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the worker (repeatable)")
+    parser.add_argument("--importtime", type=int, default=15, metavar="N",
+                        help="Modules to list in the import profile (0 skips it)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the medians as a JSON baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare the medians against a stored baseline")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed fractional regression (default 0.20)")
+    args = parser.parse_args()
+
+    env = {}
+    for item in args.env:
+        key, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"--env expects KEY=VALUE, got {item!r}")
+        env[key] = value
+
+    if args.importtime:
+        import_profile(args.importtime)
+
+    runs = [measure_run(args.port, env, args.timeout) for _ in range(args.runs)]
+    medians = {metric: statistics.median(run[metric] for run in runs) for metric in METRICS}
+
+    print(f"{'metric':<20} {'median ms':>10} {'min ms':>9} {'max ms':>9}")
+    for metric in METRICS:
+        values = [run[metric] for run in runs]
+        print(f"{metric:<20} {medians[metric]:>10.1f} {min(values):>9.1f} {max(values):>9.1f}")
+
+    report = {
+        "environment": {"python": platform.python_version(), "runs": args.runs, "env": env},
+        "medians": medians,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = [
+            f"{metric}: {medians[metric]:.1f} ms vs baseline {previous:.1f} ms"
+            for metric, previous in baseline.get("medians", {}).items()
+            if metric in medians and medians[metric] > previous * (1 + args.threshold)
+        ]
+        if regressions:
+            print("Regressions beyond threshold:")
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print("No regressions beyond threshold.")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,319 @@
+"""
+Load/latency benchmark for every public endpoint.
+
+Drives the app in-process through an ASGI client (default), or over HTTP
+against a running server (--url) or a uvicorn worker started for the run
+(--spawn-uvicorn). Reports throughput and p50/p95/p99 per endpoint, can
+save the run as a JSON baseline, and exits non-zero when a run regresses
+past --threshold compared with a stored baseline. Before timing, every
+generated check payload is sent once and its response compared byte-for-byte
+with the response-model rendering (exit 3 on a mismatch; --skip-parity).
+
+    python benchmarks/suite.py --save-baseline benchmarks/baseline.json
+    python benchmarks/suite.py --baseline benchmarks/baseline.json --threshold 0.15
+    python benchmarks/suite.py --spawn-uvicorn --corpus checks.jsonl
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from importlib import metadata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import httpx
+
+# Rate limiting stays on (it is part of the hot path) but must not reject load
+BENCH_RATE_LIMIT = "1000000000/minute"
+
+REGIONS = ["US", "GB", "DE", "FR", "IN", "BR", "JP", "ZA", "NL", "KR", "XX"]
+FEATURES = [
+    "free_chat", "user_generated_content", "location_sharing", "voice_recording",
+    "image_upload", "ai_chat", "push_notifications", "personalized_ads",
+]
+ENDPOINTS = ["check", "check-bulk", "regions", "features", "health"]
+
+
+# ------------------------
+# PAYLOAD MIXES
+# ------------------------
+def _subject(rng: random.Random) -> dict:
+    # Roughly: 60% DOB only, 30% age only, 10% both (consistent)
+    age = rng.randint(0, 19)
+    dob = date.today() - timedelta(days=age * 365 + rng.randint(1, 360))
+    roll = rng.random()
+    if roll < 0.6:
+        return {"child_dob": dob.isoformat()}
+    if roll < 0.9:
+        return {"age": age}
+    return {"child_dob": dob.isoformat(), "age": (date.today() - dob).days * 100 // 36525}
+
+
+def build_requests(rng: random.Random, count: int, corpus: list) -> dict:
+    """Per-endpoint lists of (method, path, json body) to cycle through."""
+    checks, bulks = [], []
+    for record in corpus:
+        if "features" in record:
+            bulks.append(("POST", "/age-gate/check-bulk", record))
+        elif "feature" in record:
+            checks.append(("POST", "/age-gate/check", record))
+    for _ in range(count):
+        subject = _subject(rng)
+        region = rng.choice(REGIONS)
+        checks.append(("POST", "/age-gate/check", {**subject, "region": region, "feature": rng.choice(FEATURES)}))
+        bulks.append(("POST", "/age-gate/check-bulk", {
+            **subject, "region": region, "features": rng.sample(FEATURES, rng.randint(2, len(FEATURES))),
+        }))
+    return {
+        "check": checks,
+        "check-bulk": bulks,
+        "regions": [("GET", "/age-gate/regions", None)],
+        "features": [("GET", "/age-gate/features", None)],
+        "health": [("GET", "/health", None)],
+    }
+
+
+def load_corpus(path: str) -> list:
+    """AgeGateRequest / BulkAgeGateRequest shaped JSON lines; other lines are ignored."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and "region" in record and ("feature" in record or "features" in record):
+                records.append(record)
+    return records
+
+
+# ------------------------
+# PARITY PREFLIGHT
+# ------------------------
+# The check endpoints encode their responses directly instead of going
+# through FastAPI's response_model (see main.check_response). Before timing
+# anything, confirm every check response is byte-identical to what the
+# response model would have produced for the same content.
+# This checks the encoding only, not the decisions: tests/test_parity.py
+# compares those against a reference implementation.
+async def check_parity(client: httpx.AsyncClient, requests: dict) -> list:
+    from encoding import render_json
+    from main import AgeGateResponse, BulkAgeGateResponse
+
+    models = {"check": AgeGateResponse, "check-bulk": BulkAgeGateResponse}
+    mismatches = []
+    for endpoint, model in models.items():
+        for method, path, body in requests[endpoint]:
+            response = await client.request(method, path, json=body)
+            if response.status_code != 200:
+                continue
+            expected = render_json(model.model_validate(response.json()).model_dump(mode="json"))
+            if response.content != expected:
+                mismatches.append(f"{endpoint} {json.dumps(body)}")
+    return mismatches
+
+
+# ------------------------
+# DRIVER
+# ------------------------
+async def run_endpoint(client: httpx.AsyncClient, requests: list, duration: float, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset: int):
+        nonlocal errors
+        index = offset
+        while time.perf_counter() < deadline:
+            method, path, body = requests[index % len(requests)]
+            index += concurrency
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [latencies[0]] * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 3),
+        "p95_ms": round(quantiles[94] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3),
+    }
+
+
+async def run_suite(client: httpx.AsyncClient, endpoints: list, requests: dict, args) -> dict:
+    results = {}
+    for endpoint in endpoints:
+        if args.warmup > 0:
+            await run_endpoint(client, requests[endpoint], args.warmup, args.concurrency)
+        results[endpoint] = await run_endpoint(client, requests[endpoint], args.duration, args.concurrency)
+        result = results[endpoint]
+        print(f"{endpoint:<12} {result['rps']:>10.1f} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} "
+              f"{result['p99_ms']:>9.3f} {result['errors']:>7}", flush=True)
+    return results
+
+
+def in_process_client() -> httpx.AsyncClient:
+    os.environ["RATE_LIMIT"] = BENCH_RATE_LIMIT
+    import main
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+
+
+def spawn_uvicorn(port: int) -> subprocess.Popen:
+    env = {**os.environ, "RATE_LIMIT": BENCH_RATE_LIMIT}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", "1",
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT,
+        env=env,
+    )
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=0.5).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+# ------------------------
+# BASELINES
+# ------------------------
+def environment(mode: str, args) -> dict:
+    versions = {}
+    for package in ("fastapi", "starlette", "pydantic", "slowapi", "limits", "uvicorn"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "mode": mode,
+        "python": platform.python_version(),
+        "packages": versions,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Regressions beyond `threshold` (fractional) in throughput or p99 latency."""
+    regressions = []
+    for endpoint, result in results.items():
+        previous = baseline.get("results", {}).get(endpoint)
+        if not previous:
+            continue
+        if result["rps"] < previous["rps"] * (1 - threshold):
+            regressions.append(f"{endpoint}: throughput {result['rps']:.1f} req/s vs baseline {previous['rps']:.1f}")
+        if result["p99_ms"] > previous["p99_ms"] * (1 + threshold):
+            regressions.append(f"{endpoint}: p99 {result['p99_ms']:.3f} ms vs baseline {previous['p99_ms']:.3f} ms")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    target.add_argument("--spawn-uvicorn", action="store_true", help="Start a local uvicorn worker for the run")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --spawn-uvicorn")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated subset of " + ",".join(ENDPOINTS))
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per endpoint")
+    parser.add_argument("--warmup", type=float, default=0.5, help="Warm-up seconds per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--payloads", type=int, default=500, help="Generated payloads per check endpoint")
+    parser.add_argument("--corpus", help="JSONL file of check / check-bulk request bodies to mix in")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-parity", action="store_true", help="Skip the response parity preflight")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write this run as a JSON baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against a stored baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed fractional regression (default 0.10)")
+    args = parser.parse_args()
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    corpus = load_corpus(args.corpus) if args.corpus else []
+    requests = build_requests(random.Random(args.seed), args.payloads, corpus)
+
+    server = None
+    if args.url:
+        mode = "http"
+        client = httpx.AsyncClient(base_url=args.url, limits=httpx.Limits(max_keepalive_connections=args.concurrency))
+    elif args.spawn_uvicorn:
+        mode = "uvicorn"
+        server = spawn_uvicorn(args.port)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}",
+                                   limits=httpx.Limits(max_keepalive_connections=args.concurrency))
+    else:
+        mode = "asgi"
+        client = in_process_client()
+
+    print(f"{'endpoint':<12} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    try:
+        async def run():
+            async with client:
+                if not args.skip_parity:
+                    mismatches = await check_parity(client, requests)
+                    if mismatches:
+                        print(f"Parity check failed for {len(mismatches)} responses, e.g.:")
+                        for mismatch in mismatches[:5]:
+                            print("  " + mismatch)
+                        sys.exit(3)
+                return await run_suite(client, endpoints, requests, args)
+        results = asyncio.run(run())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {"environment": environment(mode, args), "results": results}
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment", {}).get("mode") != mode:
+            print(f"Warning: baseline was recorded in {baseline.get('environment', {}).get('mode')} mode, this run is {mode}")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions beyond {:.0%}:".format(args.threshold))
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print("No regressions beyond {:.0%}".format(args.threshold))
+
+    if any(result["errors"] for result in results.values()):
+        print("Some requests failed (non-200 responses)")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,34 @@
+"""
+Write the app's OpenAPI schema at build time, so workers can serve it
+without generating it on the first /docs or /openapi.json request:
+
+    python build_openapi.py openapi.json
+    AGE_GATE_OPENAPI_FILE=openapi.json uvicorn main:app
+
+The file records a fingerprint of the code it was built from (see
+main.openapi_fingerprint). Workers fall back to generating the schema when
+the fingerprint or the list of operations does not match, so rebuild it as
+part of every build.
+"""
+import argparse
+import json
+import os
+
+from main import OPENAPI_FINGERPRINT_KEY, app, openapi_fingerprint
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Write the OpenAPI schema to a file.")
+    parser.add_argument("output", nargs="?", default="openapi.json", help="Output path (default: openapi.json)")
+    args = parser.parse_args()
+
+    tmp_path = args.output + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({**app.openapi(), OPENAPI_FINGERPRINT_KEY: openapi_fingerprint()}, f,
+                  ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, args.output)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# ------------------------
+# PRE-RENDERED CATALOG RESPONSES
+# ------------------------
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def encoding_weights(accept_encoding: Optional[str]) -> dict:
+    """Content coding -> q-value from an Accept-Encoding header (RFC 9110)."""
+    weights = {}
+    for entry in (accept_encoding or "").lower().split(","):
+        coding, _, params = entry.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            weights[coding.strip()] = quality
+    return weights
+
+
+class RenderedCatalog:
+    """
+    A JSON body rendered once, with its strong ETag and (unless `compress`
+    is false) compressed variants.
+    """
+
+    __slots__ = ("body", "etag", "gzip_body", "br_body")
+
+    def __init__(self, body: bytes, compress: bool = True):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0) if compress else None
+        self.br_body = brotli.compress(body) if brotli is not None and compress else None
+
+    def respond(self, request: Request, cache_control: str) -> Response:
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+
+        # The highest-weighted coding we have, brotli on ties; q=0 means "not acceptable"
+        weights = encoding_weights(request.headers.get("accept-encoding"))
+        wildcard = weights.get("*", 0.0)
+        best_weight, coding, body = 0.0, None, self.body
+        for candidate, candidate_body in (("br", self.br_body), ("gzip", self.gzip_body)):
+            weight = weights.get(candidate, wildcard)
+            if candidate_body is not None and weight > best_weight:
+                best_weight, coding, body = weight, candidate, candidate_body
+        if coding is not None:
+            headers["Content-Encoding"] = coding
+        return Response(body, media_type="application/json", headers=headers)
+
+
+class CatalogCache:
+    """
+    Holds one RenderedCatalog per source object (the compiled rule data) and
+    re-renders only when the source changes. `hits` and `misses` count
+    lookups for monitoring.
+
+    Sources with a `base` (tenant views of a rule snapshot) are cached side
+    by side, up to `size` of them, least recently used dropped first; all of
+    them are dropped once a source with a different base arrives.
+    """
+
+    __slots__ = ("_builder", "_size", "_lock", "_entry", "hits", "misses")
+
+    def __init__(self, builder: Callable[[object], bytes], size: int = 1):
+        self._builder = builder
+        self._size = max(1, size)
+        self._lock = threading.Lock()
+        self._entry = (None, OrderedDict())  # (base, source -> RenderedCatalog)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source) -> RenderedCatalog:
+        base = getattr(source, "base", source)
+        cached_base, rendered_by_source = self._entry
+        rendered = rendered_by_source.get(source) if cached_base is base else None
+        if rendered is not None:
+            self.hits += 1
+            if self._size > 1:
+                with self._lock:
+                    if source in rendered_by_source:
+                        rendered_by_source.move_to_end(source)
+            return rendered
+
+        self.misses += 1
+        rendered = RenderedCatalog(self._builder(source))
+        with self._lock:
+            cached_base, rendered_by_source = self._entry
+            if cached_base is not base:
+                # Publish as one tuple so concurrent readers never mix versions
+                rendered_by_source = OrderedDict()
+                self._entry = (base, rendered_by_source)
+            rendered_by_source[source] = rendered
+            while len(rendered_by_source) > self._size:
+                rendered_by_source.popitem(last=False)
+        return rendered
@@ -0,0 +1,335 @@
+from datetime import date
+from typing import Optional
+
+import dates
+from compact import epoch_days, feature_index_version
+from dates import age_on, anniversary, days_until_next_birthday, years_before
+from metrics import REGISTRY, STAGE_TIMER
+from rulestore import RuleSnapshot
+from ruletable import NO_RULE
+
+# ------------------------
+# CHECK EVALUATION
+# ------------------------
+# The decision logic behind /age-gate/check, /age-gate/check-bulk and the
+# binary RPC front end (rpc.py), independent of any transport. `payload` is
+# any object with `child_dob`, `age` and `region` attributes plus `feature`
+# (single check) or `features` (bulk); the evaluators return the response
+# content as plain dicts and raise CheckError for requests that cannot be
+# answered. Each front end maps those to its own wire format.
+
+# Latest birth year whose every anniversary a response can name (a minimum
+# age is below NO_RULE) is still a representable date
+MAX_DOB_YEAR = date.max.year - NO_RULE
+
+CHECK_DISCLAIMER = "This response provides general guidance only and does not constitute legal advice."
+
+DECISIONS = REGISTRY.counter(
+    "age_gate_decisions", "Feature decisions by region, feature and outcome", ("region", "feature", "outcome"))
+
+
+class CheckError(ValueError):
+    """A request the rules cannot answer; `status_code` follows HTTP (400 = bad input)."""
+
+    def __init__(self, status_code: int, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def resolve_age_and_dob(child_dob: Optional[date], age: Optional[int], today: date) -> tuple[int, date]:
+    """
+    Age and DOB for a request; 400 if both are given and disagree, 422 if
+    the DOB (given or derived from the age) is outside the date range.
+    """
+    if child_dob:
+        if child_dob.year > MAX_DOB_YEAR:
+            raise CheckError(422, "child_dob is out of range")
+        calculated_age = age_on(child_dob, today)
+        # Optional: verify consistency if both provided
+        if age is not None and age != calculated_age:
+            raise CheckError(
+                400,
+                f"Provided age {age} does not match date of birth (calculated age {calculated_age})"
+            )
+        return calculated_age, child_dob
+    if not 1 <= today.year - age <= MAX_DOB_YEAR:
+        raise CheckError(422, "age is out of range")
+    return age, years_before(today, age)
+
+
+def birthday_cache_seconds(dob: date, today: date) -> int:
+    """Seconds until the next birthday, when the decision can next change (max 1 year)."""
+    return min(days_until_next_birthday(dob, today) * 86400, 31536000)
+
+
+def metrics_region(table, row: int) -> str:
+    """Region label for metrics; unknown regions share "default" to bound cardinality."""
+    return "default" if row == table.default_row else table.regions[row]
+
+
+def metrics_feature(table, feature_idx: Optional[int]) -> str:
+    """
+    Feature label for metrics; unknown feature names are reported as
+    "unknown" and features added by tenant overlays as "custom", so the label
+    set does not grow with the number of tenants.
+    """
+    if feature_idx is None:
+        return "unknown"
+    return "custom" if feature_idx >= table.n_base_features else table.features[feature_idx]
+
+
+def count_decisions(snapshot: RuleSnapshot, region: str, features, age: int) -> None:
+    """
+    Count the decisions of a check answered without running an evaluator
+    (decision cache hits and 304s), with the labels the evaluators use.
+    """
+    table = snapshot.rule_table
+    row = table.region_row(region)
+    region_label = metrics_region(table, row)
+    decision = snapshot.decision_table.lookup(row, age)
+    for feature in features:
+        feature_idx = table.feature_index.get(feature)
+        if feature_idx is None or table.min_age(row, feature_idx) is None:
+            outcome = "unsupported"
+        else:
+            outcome = "allowed" if decision.is_allowed(feature_idx) else "restricted"
+        DECISIONS.inc((region_label, metrics_feature(table, feature_idx), outcome))
+
+
+def evaluate_check(
+    payload,
+    snapshot: RuleSnapshot,
+    resolved: Optional[tuple[date, int, date]] = None,
+) -> tuple[dict, int]:
+    """
+    Single-feature decision behind /age-gate/check, the NDJSON stream and
+    the RPC "check" method.
+    Returns the AgeGateResponse content as a plain dict (fields in model
+    order) and the Cache-Control max-age in seconds. `resolved` is
+    (today, age, dob) when the caller has already resolved them.
+    """
+    table = snapshot.rule_table
+    timer = STAGE_TIMER.get()
+
+    # Determine age and DOB (one "today" for the whole request)
+    if resolved is None:
+        today = dates.today()
+        age, dob = resolve_age_and_dob(payload.child_dob, payload.age, today)
+        timer.mark("age")
+    else:
+        today, age, dob = resolved
+
+    region = payload.region
+    feature = payload.feature
+
+    # Validate feature (default rules apply if region not listed)
+    row = table.region_row(region)
+    region_label = metrics_region(table, row)
+    feature_idx = table.feature_index.get(feature)
+    min_age = None if feature_idx is None else table.min_age(row, feature_idx)
+    if min_age is None:
+        DECISIONS.inc((region_label, metrics_feature(table, feature_idx), "unsupported"))
+        raise CheckError(400, "Unsupported feature")
+
+    # Precomputed decision for this (region, age)
+    decision = snapshot.decision_table.lookup(row, age)
+
+    # Determine if allowed
+    allowed = decision.is_allowed(feature_idx)
+    DECISIONS.inc((region_label, metrics_feature(table, feature_idx), "allowed" if allowed else "restricted"))
+    timer.mark("decision")
+    
+    # Calculate years until eligible (if not allowed)
+    years_until_eligible = (min_age - age) if not allowed else None
+
+    # Get upcoming unlocks
+    upcoming_unlocks = decision.upcoming_unlocks(dob)
+    timer.mark("unlocks")
+    
+    # Get regulation reference
+    regulation_reference = decision.regulation_reference
+    
+    # Set cache headers - cache until next birthday
+    cache_seconds = birthday_cache_seconds(dob, today)
+
+    # Prepare response
+    age_gate_response = {
+        "allowed": allowed,
+        "reason_code": "AGE_RESTRICTED" if not allowed else "ALLOWED",
+        "reason": (
+            f"{feature} is restricted for children under {min_age} in {region}"
+            if not allowed else
+            f"{feature} is allowed for this age group"
+        ),
+        "age": age,
+        "age_band": decision.age_band,
+        "region": region,
+        "regulation_reference": regulation_reference,
+        "years_until_eligible": years_until_eligible,
+        "next_eligible_date": (anniversary(dob, min_age).isoformat()
+                               if not allowed else None),
+        "upcoming_unlocks": upcoming_unlocks,
+        "disclaimer": CHECK_DISCLAIMER
+    }
+    timer.mark("response")
+
+    return age_gate_response, cache_seconds
+
+
+def evaluate_check_bulk(
+    payload,
+    snapshot: RuleSnapshot,
+    resolved: Optional[tuple[date, int, date]] = None,
+) -> tuple[dict, int]:
+    """
+    Multi-feature decision behind /age-gate/check-bulk.
+    Returns the BulkAgeGateResponse content as a plain dict (fields in model
+    order) and the Cache-Control max-age in seconds. `resolved` is
+    (today, age, dob) when the caller has already resolved them.
+    """
+    timer = STAGE_TIMER.get()
+
+    # Determine age and DOB (one "today" for the whole request)
+    if resolved is None:
+        today = dates.today()
+        age, dob = resolve_age_and_dob(payload.child_dob, payload.age, today)
+        timer.mark("age")
+    else:
+        today, age, dob = resolved
+
+    region = payload.region
+    features = payload.features
+
+    # Get region row (default if region not listed)
+    table = snapshot.rule_table
+    row = table.region_row(region)
+    region_label = metrics_region(table, row)
+
+    # Precomputed decision for this (region, age)
+    decision = snapshot.decision_table.lookup(row, age)
+    timer.mark("decision")
+    
+    # Get regulation reference
+    regulation_reference = decision.regulation_reference
+    
+    # Get upcoming unlocks
+    upcoming_unlocks = decision.upcoming_unlocks(dob)
+    timer.mark("unlocks")
+    
+    # Set cache headers - cache until next birthday
+    cache_seconds = birthday_cache_seconds(dob, today)
+
+    # Check each feature
+    results = []
+    allowed_count = 0
+    restricted_count = 0
+
+    for feature in features:
+        feature_idx = table.feature_index.get(feature)
+        min_age = None if feature_idx is None else table.min_age(row, feature_idx)
+        
+        if min_age is None:
+            DECISIONS.inc((region_label, metrics_feature(table, feature_idx), "unsupported"))
+            continue
+        
+        allowed = decision.is_allowed(feature_idx)
+        DECISIONS.inc((region_label, metrics_feature(table, feature_idx), "allowed" if allowed else "restricted"))
+        
+        if allowed:
+            allowed_count += 1
+        else:
+            restricted_count += 1
+
+        # FeatureResult shape
+        results.append({
+            "feature": feature,
+            "allowed": allowed,
+            "reason_code": "ALLOWED" if allowed else "AGE_RESTRICTED",
+            "reason": (
+                f"{feature} is allowed for this age group"
+                if allowed else
+                f"{feature} is restricted for children under {min_age} in {region}"
+            ),
+            "min_age_required": min_age,
+            "next_eligible_date": (
+                anniversary(dob, min_age).isoformat()
+                if not allowed else None
+            )
+        })
+
+    # Prepare response
+    bulk_response = {
+        "age": age,
+        "age_band": decision.age_band,
+        "region": region,
+        "regulation_reference": regulation_reference,
+        "results": results,
+        "summary": {
+            "total_features_checked": len(results),
+            "allowed": allowed_count,
+            "restricted": restricted_count
+        },
+        "upcoming_unlocks": upcoming_unlocks,
+        "disclaimer": CHECK_DISCLAIMER
+    }
+    timer.mark("response")
+
+    return bulk_response, cache_seconds
+
+
+def evaluate_check_compact(
+    payload,
+    snapshot: RuleSnapshot,
+    resolved: Optional[tuple[date, int, date]] = None,
+) -> tuple[dict, int]:
+    """
+    /age-gate/check-bulk decision in the compact format. Same decisions as
+    evaluate_check_bulk; bit i of `allowed` / `restricted` is feature i of
+    /age-gate/feature-index, and `next_eligible` holds the unlock day
+    (days since 1970-01-01) of each restricted feature, in bit order.
+    Unsupported features set neither bit.
+    """
+    timer = STAGE_TIMER.get()
+
+    if resolved is None:
+        today = dates.today()
+        age, dob = resolve_age_and_dob(payload.child_dob, payload.age, today)
+        timer.mark("age")
+    else:
+        today, age, dob = resolved
+
+    table = snapshot.rule_table
+    row = table.region_row(payload.region)
+    region_label = metrics_region(table, row)
+    decision = snapshot.decision_table.lookup(row, age)
+    timer.mark("decision")
+
+    requested = 0
+    for feature in payload.features:
+        feature_idx = table.feature_index.get(feature)
+        if feature_idx is None or table.min_age(row, feature_idx) is None:
+            DECISIONS.inc((region_label, metrics_feature(table, feature_idx), "unsupported"))
+            continue
+        allowed = decision.is_allowed(feature_idx)
+        DECISIONS.inc((region_label, metrics_feature(table, feature_idx), "allowed" if allowed else "restricted"))
+        requested |= 1 << feature_idx
+
+    allowed_mask = decision.allowed_mask & requested
+    restricted_mask = requested & ~allowed_mask
+    next_eligible = [
+        epoch_days(anniversary(dob, table.min_age(row, feature_idx)))
+        for feature_idx in range(table.n_features)
+        if restricted_mask >> feature_idx & 1
+    ]
+
+    compact_response = {
+        "index_version": feature_index_version(table.features),
+        "age": age,
+        "allowed": allowed_mask,
+        "restricted": restricted_mask,
+        "next_eligible": next_eligible,
+    }
+    timer.mark("response")
+
+    return compact_response, birthday_cache_seconds(dob, today)
@@ -0,0 +1,88 @@
+import hashlib
+from datetime import date
+from functools import lru_cache
+from typing import Optional
+
+from encoding import encode_json
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; the compact MessagePack format answers 406 without it
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # cbor2 is optional; the compact CBOR format answers 406 without it
+    cbor2 = None
+
+# ------------------------
+# COMPACT RESPONSES
+# ------------------------
+# Opt-in /age-gate/check-bulk format for machine callers, chosen with the
+# Accept header. Features are numbered by their position in the rule table
+# (feature_metadata order), which /age-gate/feature-index publishes once
+# with an `index_version`. A compact response carries that version and
+# bitmasks over the numbering, so clients can tell when to refetch the index.
+
+COMPACT_JSON = "application/vnd.age-gate.compact+json"
+COMPACT_MSGPACK = "application/vnd.age-gate.compact+msgpack"
+COMPACT_CBOR = "application/vnd.age-gate.compact+cbor"
+
+ENCODERS = {
+    COMPACT_JSON: encode_json,
+    COMPACT_MSGPACK: msgpack.packb if msgpack is not None else None,
+    COMPACT_CBOR: cbor2.dumps if cbor2 is not None else None,
+}
+
+# Accept entries that are satisfied by the regular JSON response
+_JSON_RANGES = ("application/json", "application/*", "*/*")
+
+EPOCH = date(1970, 1, 1)
+
+
+class NotAcceptable(LookupError):
+    """Only compact formats whose encoder is not installed were acceptable."""
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Compact media type to answer with, or None for the regular JSON
+    response. Entries are tried in q-value order (q=0 entries are skipped).
+    """
+    if not accept or "compact" not in accept:
+        return None
+    ranges = []
+    for position, entry in enumerate(accept.split(",")):
+        media_type, _, params = entry.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            ranges.append((-quality, position, media_type.strip().lower()))
+
+    unavailable = False
+    for _, _, media_type in sorted(ranges):
+        if media_type in _JSON_RANGES:
+            return None
+        if media_type in ENCODERS:
+            if ENCODERS[media_type] is not None:
+                return media_type
+            unavailable = True
+    if unavailable:
+        raise NotAcceptable(accept)
+    return None
+
+
+@lru_cache(maxsize=16)
+def feature_index_version(features: tuple) -> str:
+    """Short hash of the feature numbering; changes only when features are added, removed or reordered."""
+    return hashlib.blake2b("\n".join(features).encode("utf-8"), digest_size=6).hexdigest()
+
+
+def epoch_days(day: date) -> int:
+    return (day - EPOCH).days
@@ -0,0 +1,78 @@
+import time
+from calendar import isleap
+from datetime import date, datetime, timedelta
+
+# ------------------------
+# DATE ARITHMETIC
+# ------------------------
+# Leap-day policy: a Feb 29 birthday is observed on Mar 1 in common years.
+# This agrees with age_on(): someone born on Feb 29 turns N on Mar 1 of a
+# common year. Going backwards, the date N years before a Feb 29 in a common
+# year is Feb 28, which is the latest birth date that gives age N today.
+
+def date_key(d: date) -> int:
+    """YYYYMMDD as an int; whole years between two keys is (later - earlier) // 10000."""
+    return d.year * 10000 + d.month * 100 + d.day
+
+
+def age_on(dob: date, today: date) -> int:
+    """
+    Completed years between dob and today. A Feb 29 birthday counts on Mar 1
+    in common years (the leap-day policy above), where relativedelta would
+    already count it on Feb 28.
+    """
+    return (date_key(today) - date_key(dob)) // 10000
+
+
+def anniversary(dob: date, years: int) -> date:
+    """The date `years` after dob (dob's birthday in that year), per the leap-day policy."""
+    year = dob.year + years
+    if dob.month == 2 and dob.day == 29 and not isleap(year):
+        return date(year, 3, 1)
+    return date(year, dob.month, dob.day)
+
+
+def years_before(today: date, years: int) -> date:
+    """Latest birth date that is exactly `years` old on `today`."""
+    year = today.year - years
+    if today.month == 2 and today.day == 29 and not isleap(year):
+        return date(year, 2, 28)
+    return date(year, today.month, today.day)
+
+
+def next_birthday(dob: date, today: date) -> date:
+    """First birthday strictly after today."""
+    birthday = anniversary(dob, today.year - dob.year)
+    if birthday <= today:
+        birthday = anniversary(dob, today.year + 1 - dob.year)
+    return birthday
+
+
+def days_until_next_birthday(dob: date, today: date) -> int:
+    return next_birthday(dob, today).toordinal() - today.toordinal()
+
+
+# ------------------------
+# DAY TICK
+# ------------------------
+# (today, epoch second of the next local midnight); swapped as one tuple
+_day_tick = (None, 0.0)
+
+
+def today() -> date:
+    """Local date, recomputed once per day tick instead of on every call."""
+    global _day_tick
+    current, tick_end = _day_tick
+    if current is None or time.time() >= tick_end:
+        current = date.today()
+        tick_end = datetime.combine(current + timedelta(days=1), datetime.min.time()).timestamp()
+        _day_tick = (current, tick_end)
+    return current
+
+
+# ------------------------
+# BATCH VARIANTS
+# ------------------------
+def ages_from_keys(keys, today_key: int) -> list:
+    """Ages for a sequence of YYYYMMDD birth keys (date_key()), as age_on() computes them."""
+    return [(today_key - key) // 10000 for key in keys]
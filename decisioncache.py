@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from resp import RespConnection, RespError
+
+# ------------------------
+# DECISION CACHE
+# ------------------------
+# Encoded check responses, keyed by (endpoint, date of birth, region,
+# features). A response depends only on the DOB (age-only requests resolve to
+# a DOB first), so an entry stays valid until the subject's next birthday.
+# The cache belongs to one rule snapshot and starts over when a request
+# arrives with a different one.
+
+logger = logging.getLogger(__name__)
+
+
+class DecisionCache:
+    """
+    Bounded LRU of response bodies. Entries are evicted least recently used
+    first once `max_entries` or `max_bytes` is exceeded, and dropped on
+    lookup once their expiry date is reached.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 32 * 1024 * 1024, shared: "Optional[SharedDecisionTier]" = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._source = None
+        self._entries = OrderedDict()  # key -> (body, expires_on)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, source, key: tuple, today: date) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key) if source is self._source else None
+            if entry is None:
+                self.misses += 1
+                return None
+            body, expires_on = entry
+            if today >= expires_on:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, source, key: tuple, body: bytes, expires_on: date) -> None:
+        if not self.enabled or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if source is not self._source:
+                # New rule snapshot: every cached answer may be stale
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                self._source = source
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, expires_on)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def _remove(self, key: tuple) -> None:
+        body, _ = self._entries.pop(key)
+        self._bytes -= len(body)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._source = None
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class SharedDecisionTier:
+    """
+    Second cache level in a Redis-protocol server, shared by every worker
+    (resp://host:6379/0?timeout=0.05&key_prefix=age-gate:). Keys include the
+    snapshot's content_version (declared version plus a hash of the rule
+    content), so an edit that keeps the version still misses. Each entry
+    expires at the local midnight that starts the subject's next birthday.
+    Calls block, so callers run them off the event loop. Errors count as
+    misses, and after one the tier is skipped for `retry_after` seconds so an
+    outage does not add a timeout to every miss.
+    """
+
+    def __init__(self, uri: str):
+        parsed = urlparse(uri)
+        if parsed.scheme != "resp":
+            raise ValueError(f"Unsupported shared decision cache URI: {uri}")
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        self.connection = RespConnection(
+            parsed.hostname or "localhost",
+            parsed.port or 6379,
+            db=int(parsed.path.strip("/") or 0),
+            timeout=float(query.get("timeout", 0.05)),
+        )
+        self.key_prefix = query.get("key_prefix", "age-gate:")
+        self.retry_after = float(query.get("retry_after", 5.0))
+        self._skip_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, content_version: str, key: tuple) -> str:
+        digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest()
+        return f"{self.key_prefix}decision:{content_version}:{digest}"
+
+    def get(self, content_version: str, key: tuple) -> Optional[bytes]:
+        body = None
+        if time.monotonic() >= self._skip_until:
+            try:
+                body = self.connection.execute("GET", self._key(content_version, key))
+            except (OSError, RespError) as exc:
+                self._error(exc)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def put(self, content_version: str, key: tuple, body: bytes, expires_on: date) -> None:
+        ttl_ms = int((datetime.combine(expires_on, datetime.min.time()).timestamp() - time.time()) * 1000)
+        if ttl_ms <= 0 or time.monotonic() < self._skip_until:
+            return
+        try:
+            self.connection.execute("SET", self._key(content_version, key), body, "PX", ttl_ms)
+        except (OSError, RespError) as exc:
+            self._error(exc)
+
+    def _error(self, exc: Exception) -> None:
+        self.errors += 1
+        self._skip_until = time.monotonic() + self.retry_after
+        # Log the first failure and then every 1000th, not every request
+        if self.errors % 1000 == 1:
+            logger.warning("Shared decision cache unavailable (%d errors): %s", self.errors, exc)
+
+
+class TenantDecisionCaches:
+    """
+    One DecisionCache partition per tenant, so a busy tenant cannot evict
+    another's entries. Partitions are created on first use with the
+    tenant's own `max_entries` (or the default) and `max_bytes` each; at
+    most `max_partitions` are kept, least recently used dropped first, so
+    memory stays bounded however many tenants are configured. Counters of
+    dropped partitions carry over into `stats()`.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 1024 * 1024, max_partitions: int = 256,
+                 shared: "Optional[SharedDecisionTier]" = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_partitions = max_partitions
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._partitions = OrderedDict()  # tenant -> DecisionCache
+        self._retired = dict.fromkeys(("hits", "misses", "evictions", "expirations", "invalidations"), 0)
+
+    def get(self, tenant: str, max_entries: Optional[int] = None) -> DecisionCache:
+        if max_entries is None:
+            max_entries = self.max_entries
+        with self._lock:
+            cache = self._partitions.get(tenant)
+            if cache is not None and cache.max_entries == max_entries:
+                self._partitions.move_to_end(tenant)
+                return cache
+            if cache is not None:
+                # The tenant's size changed with a rule reload
+                self._retire(self._partitions.pop(tenant))
+            cache = DecisionCache(max_entries, self.max_bytes, self.shared)
+            self._partitions[tenant] = cache
+            while len(self._partitions) > self.max_partitions:
+                _, dropped = self._partitions.popitem(last=False)
+                self._retire(dropped)
+            return cache
+
+    def _retire(self, cache: DecisionCache) -> None:
+        stats = cache.stats()
+        for name in self._retired:
+            self._retired[name] += stats[name]
+        self._retired["evictions"] += stats["entries"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            totals = dict(self._retired, entries=0, bytes=0, partitions=len(self._partitions))
+            for cache in self._partitions.values():
+                for name, value in cache.stats().items():
+                    totals[name] += value
+        return totals
@@ -0,0 +1,168 @@
+from bisect import bisect_right
+from datetime import date
+from typing import Optional
+
+from dates import anniversary
+from ruletable import RuleTable
+
+# ------------------------
+# PRECOMPUTED DECISIONS
+# ------------------------
+# Ages covered by the precomputed table (matches the top AGE_BANDS entry).
+MAX_PRECOMPUTED_AGE = 120
+
+# Features unlocking within this many years are reported as upcoming.
+UNLOCK_WINDOW_YEARS = 5
+
+
+class Decision:
+    """
+    Everything the check endpoints need for one (region, age) pair.
+
+    `allowed_mask` has bit i set when feature index i of the rule table is
+    allowed. `unlocks` is the relative upcoming-unlock schedule as
+    (feature, display_name, unlocks_at_age, years_until_unlock) tuples; the
+    caller only has to plug in the DOB to get dates.
+    """
+
+    __slots__ = ("allowed_mask", "age_band", "regulation_reference", "unlocks")
+
+    def __init__(self, allowed_mask: int, age_band: str, regulation_reference: str, unlocks: tuple):
+        self.allowed_mask = allowed_mask
+        self.age_band = age_band
+        self.regulation_reference = regulation_reference
+        self.unlocks = unlocks
+
+    def is_allowed(self, feature_idx: int) -> bool:
+        return bool(self.allowed_mask >> feature_idx & 1)
+
+    def upcoming_unlocks(self, dob: date):
+        """Materialize the unlock schedule for a DOB (None when nothing unlocks soon)."""
+        if not self.unlocks:
+            return None
+        return [
+            {
+                "feature": feature,
+                "feature_display_name": display_name,
+                "unlocks_at_age": min_age,
+                "years_until_unlock": years_until,
+                "unlock_date": anniversary(dob, min_age).isoformat()
+            }
+            for feature, display_name, min_age, years_until in self.unlocks
+        ]
+
+
+class Timeline:
+    """
+    A region's full unlock schedule: (feature, display_name, unlocks_at_age)
+    tuples in unlock order, with their ages in `ages` for bisecting.
+    """
+
+    __slots__ = ("ages", "entries")
+
+    def __init__(self, entries: tuple):
+        self.entries = entries
+        self.ages = tuple(min_age for _, _, min_age in entries)
+
+    def between(self, after_age: int, until_age: int) -> tuple:
+        """Entries unlocking at an age in (after_age, until_age]."""
+        ages = self.ages
+        return self.entries[bisect_right(ages, after_age):bisect_right(ages, until_age)]
+
+
+class DecisionTable:
+    """
+    Decisions for every (region row, age) pair with 0 <= age <= MAX_PRECOMPUTED_AGE.
+
+    Rows are built on first use (or all at once by `preload()`), so a worker
+    only holds decisions for the regions it actually serves. The per-row
+    unlock timelines are small and built up front.
+
+    Tables given the same `pool` (one per rule snapshot: the base table and
+    every tenant's) share identical rows and timelines instead of building
+    their own, so a tenant only adds memory for the rows its overlay changes.
+    """
+
+    __slots__ = ("rule_table", "display_names", "age_bands", "regulation_references", "rows", "timelines", "pool")
+
+    def __init__(
+        self, rule_table: RuleTable, display_names: dict, age_bands: list, regulation_references: tuple,
+        pool: Optional[dict] = None,
+    ):
+        self.rule_table = rule_table
+        self.display_names = display_names
+        self.age_bands = age_bands
+        self.regulation_references = regulation_references
+        self.rows = [None] * (rule_table.default_row + 1)
+        self.pool = pool
+        timelines = []
+        for row in range(rule_table.default_row + 1):
+            entries = tuple(
+                (rule_table.features[feature_idx],
+                 display_names.get(rule_table.features[feature_idx], rule_table.features[feature_idx]),
+                 min_age)
+                for min_age, feature_idx in rule_table.unlock_order[row]
+            )
+            timeline = None if pool is None else pool.get(("timeline", entries))
+            if timeline is None:
+                timeline = Timeline(entries)
+                if pool is not None:
+                    timeline = pool.setdefault(("timeline", entries), timeline)
+            timelines.append(timeline)
+        self.timelines = tuple(timelines)
+
+    def lookup(self, row: int, age: int) -> Decision:
+        if 0 <= age <= MAX_PRECOMPUTED_AGE:
+            decisions = self.rows[row]
+            if decisions is None:
+                decisions = self._build_row(row)
+            return decisions[age]
+        # Out-of-range ages are rare enough to compute on demand
+        return self.build(row, age)
+
+    def preload(self) -> None:
+        """Build every row now instead of on first use."""
+        for row, decisions in enumerate(self.rows):
+            if decisions is None:
+                self._build_row(row)
+
+    def _build_row(self, row: int) -> tuple:
+        # Concurrent first lookups may both build; either result is identical
+        if self.pool is None:
+            decisions = tuple(self.build(row, age) for age in range(MAX_PRECOMPUTED_AGE + 1))
+        else:
+            # A row is fully determined by its rules (with feature indexes), timeline and reference
+            key = ("row", tuple(self.rule_table.unlock_order[row]), self.timelines[row].entries,
+                   self.regulation_references[row])
+            decisions = self.pool.get(key)
+            if decisions is None:
+                decisions = tuple(self.build(row, age) for age in range(MAX_PRECOMPUTED_AGE + 1))
+                decisions = self.pool.setdefault(key, decisions)
+        self.rows[row] = decisions
+        return decisions
+
+    def build(self, row: int, age: int) -> Decision:
+        table = self.rule_table
+        allowed_mask = 0
+        for feature_idx in range(table.n_features):
+            min_age = table.min_age(row, feature_idx)
+            if min_age is not None and age >= min_age:
+                allowed_mask |= 1 << feature_idx
+
+        unlocks = [
+            (feature, display_name, min_age, min_age - age)
+            for feature, display_name, min_age in self.timelines[row].between(age, age + UNLOCK_WINDOW_YEARS)
+        ]
+
+        return Decision(
+            allowed_mask,
+            self._age_band(age),
+            self.regulation_references[row],
+            tuple(unlocks),
+        )
+
+    def _age_band(self, age: int) -> str:
+        for min_age, max_age, band in self.age_bands:
+            if min_age <= age <= max_age:
+                return band
+        return "unknown"
@@ -0,0 +1,36 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; encode_json falls back to render_json
+    orjson = None
+
+# ------------------------
+# JSON ENCODING
+# ------------------------
+# Kept free of web-framework imports so the RPC front end and CLI tools load
+# quickly.
+
+# Same encoding as FastAPI's JSONResponse, so the bytes match the model path.
+def render_json(content) -> bytes:
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def encode_json(content) -> bytes:
+    """
+    render_json with orjson when it is installed. The output is the same for
+    the str/int/bool/None/list/dict content of the check responses; anything
+    orjson rejects (e.g. integers beyond 64 bits) goes through render_json.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(content)
+        except TypeError:  # orjson.JSONEncodeError is a TypeError
+            pass
+    return render_json(content)
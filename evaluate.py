@@ -0,0 +1,288 @@
+"""
+Parallel offline evaluator: runs the /age-gate/check-bulk decision for
+every record of a large CSV or JSON Lines file on all cores and writes one
+JSON line per record, in input order.
+
+    python evaluate.py users.csv results.jsonl
+    python evaluate.py users.jsonl results.jsonl --features free_chat,ai_chat --as-of 2026-01-01
+    python evaluate.py users.csv results.jsonl --method check_compact --id-field user_id
+
+Records carry `child_dob` and/or `age` and `region` (rename with --dob-field,
+--age-field, --region-field). Output lines have the same shape as the RPC
+replies (rpc.py): {"result": {...}} with the HTTP response body, or
+{"error": {"status_code": 400, "detail": "..."}}, plus "id" with --id-field.
+
+The input is split into chunks that worker processes evaluate into part
+files under --work-dir (default: <output>.parts). Finished parts are kept, so
+an interrupted run started again with the same arguments only evaluates
+the missing chunks. The parts are concatenated in order at the end.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from datetime import date
+from typing import Optional
+
+from checks import CheckError, resolve_age_and_dob
+from encoding import encode_json
+from population import DEFAULT_CHUNK_BYTES, PopulationError, PopulationFile, chunk_rows, read_chunk
+from rpc import METHODS, CheckParams
+from rulestore import DEFAULT_RULES_FILE, RuleStore, RuleValidationError, map_snapshot
+
+# ------------------------
+# OFFLINE BULK EVALUATION
+# ------------------------
+# The parent compiles the rules once into a memory-mapped snapshot file
+# (snapshotfile.py) in the work directory; every worker maps that file, so
+# the rule table is shared through the page cache instead of compiled or
+# copied per process. Workers write their chunk's output straight to a part
+# file (renamed into place when complete), so nothing but a row count goes
+# back to the parent, and a part file on disk is the checkpoint for its chunk.
+#
+# A reply only depends on a record's DOB, age and region (the features and
+# date are fixed per job), and exports repeat those far more often than not,
+# so each worker keeps the encoded replies it has produced.
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 1.0
+
+# Encoded replies a worker keeps before starting over
+REPLY_CACHE_SIZE = 200_000
+
+MANIFEST = "job.json"
+
+
+class Job:
+    """What a worker needs to evaluate chunks; built once per worker."""
+
+    __slots__ = ("snapshot", "path", "format", "columns", "dob_field", "age_field", "region_field",
+                 "id_field", "features", "as_of", "evaluate", "work_dir", "replies")
+
+    def __init__(self, settings: dict, snapshot):
+        self.snapshot = snapshot
+        self.path = settings["input"]
+        self.format = settings["format"]
+        self.columns = settings["columns"]
+        self.dob_field, self.age_field, self.region_field, self.id_field = settings["fields"]
+        self.features = settings["features"]
+        self.as_of = date.fromisoformat(settings["as_of"])
+        self.evaluate = METHODS[settings["method"]][0]
+        self.work_dir = settings["work_dir"]
+        self.replies = {}  # (dob, age, region) -> (encoded reply, is error)
+
+    def params(self, row: dict) -> dict:
+        """Check parameters for one record; CSV values arrive as strings."""
+        dob = row.get(self.dob_field) or None
+        age = row.get(self.age_field)
+        if isinstance(age, str):
+            try:
+                age = int(age) if age.strip() else None
+            except ValueError:
+                raise CheckError(422, "age must be an integer")
+        return {"child_dob": dob, "age": age, "region": row.get(self.region_field), "features": self.features}
+
+    def evaluate_row(self, row: Optional[dict]) -> dict:
+        """The reply for one record, without its "id"."""
+        try:
+            if row is None:
+                raise CheckError(422, "Record cannot be parsed")
+            params = CheckParams(self.params(row), bulk=True)
+            today = self.as_of
+            age, dob = resolve_age_and_dob(params.child_dob, params.age, today)
+            content, _ = self.evaluate(params, self.snapshot, (today, age, dob))
+            return {"result": content}
+        except CheckError as exc:
+            return {"error": {"status_code": exc.status_code, "detail": exc.detail}}
+        except (ValueError, OverflowError) as exc:
+            # Any other value the decision core cannot handle must not fail the whole chunk
+            return {"error": {"status_code": 422, "detail": str(exc)}}
+
+    def encoded_reply(self, row: Optional[dict]) -> tuple[bytes, bool]:
+        """(encoded reply without "id", is error), from the reply cache when possible."""
+        key = None if row is None else (row.get(self.dob_field), row.get(self.age_field), row.get(self.region_field))
+        try:
+            cached = self.replies.get(key)
+        except TypeError:  # JSON lists or objects as values
+            cached = key = None
+        if cached is None:
+            reply = self.evaluate_row(row)
+            cached = (encode_json(reply), "error" in reply)
+            if key is not None:
+                if len(self.replies) >= REPLY_CACHE_SIZE:
+                    self.replies.clear()
+                self.replies[key] = cached
+        return cached
+
+
+def part_path(work_dir: str, index: int) -> str:
+    return os.path.join(work_dir, f"part-{index:06d}.jsonl")
+
+
+# Set in each worker by the pool initializer
+_job: Optional[Job] = None
+
+
+def _init_worker(settings: dict) -> None:
+    global _job
+    # Map the parent's snapshot read-only; the rule file is not read again here
+    snapshot = map_snapshot(settings["snapshot_file"], settings["rules"])
+    if settings["tenant"] is not None:
+        snapshot = snapshot.tenants[settings["tenant"]]
+    _job = Job(settings, snapshot)
+
+
+def evaluate_chunk(task: tuple) -> tuple[int, int, int]:
+    """Evaluate one chunk into its part file; (chunk index, records, errors)."""
+    index, start, end = task
+    job = _job
+    out = bytearray()
+    errors = 0
+    rows = chunk_rows(read_chunk(job.path, start, end), job.format, job.columns)
+    for row in rows:
+        body, error = job.encoded_reply(row)
+        errors += error
+        if job.id_field is not None:
+            # {"id": ..., <reply fields>}
+            out += b'{"id":'
+            out += encode_json(None if row is None else row.get(job.id_field))
+            out += b","
+            out += memoryview(body)[1:]
+        else:
+            out += body
+        out += b"\n"
+    path = part_path(job.work_dir, index)
+    with open(path + ".tmp", "wb") as f:
+        f.write(out)
+    os.replace(path + ".tmp", path)
+    return index, len(rows), errors
+
+
+# ------------------------
+# ENTRY POINT
+# ------------------------
+def _read_manifest(work_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(work_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _progress(done: int, total: int, rows: int, elapsed: float, end: str = "\r") -> None:
+    rate = rows / elapsed if elapsed else 0
+    print(f"{done}/{total} chunks, {rows:,} records, {rate:,.0f} records/s", end=end, file=sys.stderr, flush=True)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Input file (.csv, .jsonl or .ndjson)")
+    parser.add_argument("output", help="Output JSON Lines file")
+    parser.add_argument("--rules", default=os.environ.get("AGE_GATE_RULES_FILE", DEFAULT_RULES_FILE),
+                        help="Rule file (default: $AGE_GATE_RULES_FILE or rules.json)")
+    parser.add_argument("--tenant", help="Evaluate with this tenant's rules")
+    parser.add_argument("--method", choices=("check_bulk", "check_compact"), default="check_bulk",
+                        help="Response format (default check_bulk)")
+    parser.add_argument("--features", help="Comma-separated features to check (default: all)")
+    parser.add_argument("--as-of", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="Date ages are computed on (default: today, or the interrupted run's date)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Input format (default: by extension)")
+    parser.add_argument("--dob-field", default="child_dob")
+    parser.add_argument("--age-field", default="age")
+    parser.add_argument("--region-field", default="region")
+    parser.add_argument("--id-field", help="Copy this field into each output line as \"id\"")
+    parser.add_argument("--work-dir", help="Directory for part files and checkpoints (default: <output>.parts)")
+    parser.add_argument("--restart", action="store_true", help="Discard the parts of an earlier run")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes (default: all cores)")
+    parser.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_BYTES / (1024 * 1024),
+                        help="Megabytes per chunk (default 16)")
+    args = parser.parse_args()
+
+    work_dir = os.path.abspath(args.work_dir or args.output + ".parts")
+    if args.restart:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    previous = _read_manifest(work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        population = PopulationFile(args.input, (args.region_field,), args.format)
+        # Compiles the rules and writes the snapshot file the workers map
+        snapshot = RuleStore(args.rules, snapshot_path=os.path.join(work_dir, "rules.snap")).current
+    except (OSError, RuleValidationError, PopulationError) as exc:
+        parser.error(str(exc))
+    if args.tenant is not None:
+        if args.tenant not in snapshot.tenants:
+            parser.error(f"{os.path.basename(args.rules)} has no tenant '{args.tenant}'")
+        snapshot = snapshot.tenants[args.tenant]
+    features = args.features.split(",") if args.features else list(snapshot.feature_metadata)
+    unknown = [feature for feature in features if feature not in snapshot.feature_metadata]
+    if unknown:
+        parser.error(f"Unknown features: {', '.join(unknown)}")
+
+    as_of = args.as_of or (date.fromisoformat(previous["as_of"]) if previous else date.today())
+    stat = os.stat(args.input)
+    settings = {
+        "input": os.path.abspath(args.input),
+        "input_size": stat.st_size,
+        "input_mtime": stat.st_mtime,
+        "format": population.format,
+        "columns": population.columns,
+        "fields": [args.dob_field, args.age_field, args.region_field, args.id_field],
+        "rules": os.path.abspath(args.rules),
+        "rules_version": snapshot.content_version,
+        "snapshot_file": os.path.join(work_dir, "rules.snap"),
+        "tenant": args.tenant,
+        "method": args.method,
+        "features": features,
+        "as_of": as_of.isoformat(),
+        "work_dir": work_dir,
+        "chunks": [list(chunk) for chunk in population.chunks(max(1, int(args.chunk_mb * 1024 * 1024)))],
+    }
+    settings = json.loads(json.dumps(settings))  # As it reads back from the manifest
+    if previous is not None and previous != settings:
+        parser.error(f"{work_dir} holds parts of a different job (input, rules or options changed); "
+                     "pass --restart to discard them")
+    if previous is None:
+        with open(os.path.join(work_dir, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(settings, f, indent=2)
+
+    chunks = settings["chunks"]
+    pending = [(index, start, end) for index, (start, end) in enumerate(chunks)
+               if not os.path.exists(part_path(work_dir, index))]
+    if len(pending) < len(chunks):
+        print(f"Resuming: {len(chunks) - len(pending)} of {len(chunks)} chunks already done", file=sys.stderr)
+
+    started = time.perf_counter()
+    done = len(chunks) - len(pending)
+    records = errors = 0
+    last_report = started
+    try:
+        with multiprocessing.Pool(max(1, args.workers), _init_worker, (settings,)) as pool:
+            for _, chunk_records, chunk_errors in pool.imap_unordered(evaluate_chunk, pending):
+                done += 1
+                records += chunk_records
+                errors += chunk_errors
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    _progress(done, len(chunks), records, now - started)
+                    last_report = now
+    except KeyboardInterrupt:
+        print(f"\nInterrupted with {done} of {len(chunks)} chunks done; run again to resume", file=sys.stderr)
+        sys.exit(130)
+    _progress(done, len(chunks), records, time.perf_counter() - started, end="\n")
+
+    tmp_path = args.output + ".tmp"
+    with open(tmp_path, "wb") as out:
+        for index in range(len(chunks)):
+            with open(part_path(work_dir, index), "rb") as part:
+                shutil.copyfileobj(part, out)
+    os.replace(tmp_path, args.output)
+    shutil.rmtree(work_dir)
+    print(f"Wrote {args.output} ({errors} records with errors this run)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,421 +1,311 @@
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, Response
-from pydantic import BaseModel, Field, model_validator
-from typing import Optional
+from fastapi import FastAPI, HTTPException, Query, Request, __version__ as FASTAPI_VERSION
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from pydantic import VERSION as PYDANTIC_VERSION, BaseModel, Field, ValidationError, model_validator
+from typing import Literal, Optional
+from collections import Counter
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
 from datetime import date
-from dateutil.relativedelta import relativedelta
+from functools import lru_cache
+import dates
+from dates import age_on, ages_from_keys, anniversary, date_key, next_birthday
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from slowapi.wrappers import Limit
+from limits import parse_many
+from decisioncache import DecisionCache, SharedDecisionTier, TenantDecisionCaches
+from decisions import MAX_PRECOMPUTED_AGE
+from rulestore import DEFAULT_RULES_FILE, RuleSnapshot, RuleStore, RuleValidationError
+from ruletable import country_of
+from tenants import TenantSnapshot
+from catalog import CatalogCache, RenderedCatalog, etag_matches
+from encoding import encode_json, render_json
+from compact import ENCODERS as COMPACT_ENCODERS, NotAcceptable, feature_index_version, negotiate
+from checks import (
+    CHECK_DISCLAIMER, MAX_DOB_YEAR, CheckError, birthday_cache_seconds, evaluate_check, evaluate_check_bulk,
+    evaluate_check_compact, count_decisions, resolve_age_and_dob,
+)
+import metrics
+from metrics import REGISTRY, STAGE_TIMER, StageTimer
+from profiler import Profiler, ProfilerConfig, ProfilerMiddleware
 
 # ------------------------
 # APP INITIALIZATION
 # ------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve the prebuilt OpenAPI schema, if any, whether or not caches are warmed
+    if OPENAPI_FILE:
+        load_openapi_schema(OPENAPI_FILE)
+    # Warm caches before the worker takes traffic (AGE_GATE_PRELOAD=0 skips it)
+    if os.environ.get("AGE_GATE_PRELOAD", "1") != "0":
+        preload()
+    # Poll the rule file for changes (seconds; 0 disables the watcher)
+    RULE_STORE.start_watcher(float(os.environ.get("AGE_GATE_RULES_WATCH_INTERVAL", "5")))
+    # Aggregate /metrics across workers through a shared directory
+    REGISTRY.use_directory(
+        os.environ.get("AGE_GATE_METRICS_DIR") or None,
+        float(os.environ.get("AGE_GATE_METRICS_FLUSH_INTERVAL", "1")),
+    )
+    yield
+    REGISTRY.stop()
+    RULE_STORE.stop_watcher()
+
+logger = logging.getLogger(__name__)
+
 app = FastAPI(
     title="Age-Based Feature Gating API",
     description="Determines whether a feature should be enabled for a child based on age and region.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# ------------------------
+# METRICS
+# ------------------------
+# Exposed on /metrics in the Prometheus text format (see metrics.py).
+REQUESTS = REGISTRY.counter(
+    "age_gate_requests", "Requests by route and status code", ("route", "status"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "age_gate_request_duration_seconds", "Time spent in the route handler", ("route",),
+    buckets=metrics.REQUEST_BUCKETS)
+STAGE_SECONDS = REGISTRY.histogram(
+    "age_gate_stage_duration_seconds",
+    "Time per request stage: validate, rate_limit, age, cache, decision, unlocks, response, serialize",
+    ("route", "stage"))
+RATE_LIMITED = REGISTRY.counter(
+    "age_gate_rate_limited", "Requests rejected by the rate limiter", ("route",))
+CACHE_LOOKUPS = REGISTRY.counter(
+    "age_gate_cache_lookups", "Cache lookups by cache and result (hit or miss)", ("cache", "result"))
+CACHE_EVICTIONS = REGISTRY.counter(
+    "age_gate_cache_evictions", "Cache entries dropped, by cache and reason", ("cache", "reason"))
+
+# Stages are timed on one request in N (each mark costs a clock read and a
+# histogram update); totals and counters cover every request.
+STAGE_SAMPLE_EVERY = max(1, int(os.environ.get("AGE_GATE_METRICS_STAGE_SAMPLE_EVERY", "16")))
+
+
+class InstrumentedRoute(APIRoute):
+    """
+    Records the duration and status of every request to the route, and
+    installs the StageTimer that the handler's stages mark.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route = self.path
+        request_numbers = itertools.count()
+
+        async def instrumented_handler(request: Request) -> Response:
+            started = time.perf_counter_ns()
+            if next(request_numbers) % STAGE_SAMPLE_EVERY:
+                timer = metrics.NULL_TIMER
+            else:
+                timer = StageTimer(STAGE_SECONDS, route, started)
+            token = STAGE_TIMER.set(timer)
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                # Only routes that mark their own stages have a separate serialize stage
+                if timer is not metrics.NULL_TIMER and timer.last != started:
+                    timer.mark("serialize")
+                return response
+            except (StarletteHTTPException, CheckError) as exc:
+                status = exc.status_code
+                raise
+            except RequestValidationError:
+                status = 422
+                raise
+            finally:
+                STAGE_TIMER.reset(token)
+                REQUEST_SECONDS.observe_ns((route,), time.perf_counter_ns() - started)
+                REQUESTS.inc((route, str(status)))
+
+        return instrumented_handler
+
+app.router.route_class = InstrumentedRoute
+
 # ------------------------
 # RATE LIMITER CONFIG
 # ------------------------
-limiter = Limiter(key_func=get_remote_address)
+# Per-process memory by default. Set RATE_LIMIT_STORAGE_URI to share counters:
+# shm:///age-gate for all workers on one host, resp://host:6379 across the
+# fleet (see ratelimit.py).
+#
+# Tenant requests are counted separately from other clients at the same
+# address, against the tenant's own `rate_limit` when its overlay sets one.
+@lru_cache(maxsize=256)
+def parse_rate_limit(value: str) -> tuple:
+    return tuple(parse_many(value))
+
+class InstrumentedLimiter(Limiter):
+    """
+    Limiter that marks the request stages around its check: everything before
+    it (body parsing and validation) and the check itself.
+    """
+
+    def _check_request_limit(self, request, endpoint_func, in_middleware=True):
+        timer = STAGE_TIMER.get()
+        timer.mark("validate")
+        try:
+            snapshot = getattr(request.state, "rule_snapshot", None)
+            if isinstance(snapshot, TenantSnapshot) and snapshot.rate_limit and self.enabled:
+                self._check_tenant_limit(request, endpoint_func, parse_rate_limit(snapshot.rate_limit))
+            else:
+                super()._check_request_limit(request, endpoint_func, in_middleware)
+        finally:
+            timer.mark("rate_limit")
+
+    def _check_tenant_limit(self, request, endpoint_func, items: tuple) -> None:
+        # Same storage keys as a route limit of the decorated endpoint
+        key = rate_limit_key(request)
+        scope = f"{endpoint_func.__module__}.{endpoint_func.__name__}"
+        for item in items:
+            # Read back for the rate limit headers, like slowapi's own check
+            request.state.view_rate_limit = (item, [key, scope])
+            if not self.limiter.hit(item, key, scope):
+                raise RateLimitExceeded(Limit(item, rate_limit_key, None, False, None, None, None, 1, False))
+
+def rate_limit_key(request: Request) -> str:
+    """Client address; prefixed with the tenant ("acme/10.0.0.1") for tenant requests."""
+    tenant = getattr(request.state, "tenant", None)
+    address = get_remote_address(request)
+    return address if tenant is None else f"{tenant}/{address}"
+
+RATE_LIMIT_STORAGE_URI = os.environ.get("RATE_LIMIT_STORAGE_URI", "memory://")
+if RATE_LIMIT_STORAGE_URI.startswith(("shm:", "resp:")):
+    import ratelimit  # Registers the shm:// and resp:// storage schemes; only needed for them
+
+limiter = InstrumentedLimiter(
+    key_func=rate_limit_key,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+)
+# Per-client limit for the check endpoints (free plan by default)
+RATE_LIMIT = os.environ.get("RATE_LIMIT", "40/minute")
 app.state.limiter = limiter
 
+@app.exception_handler(CheckError)
+def check_error_handler(request: Request, exc: CheckError):
+    # Same body as an HTTPException with this status and detail
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
 @app.exception_handler(RateLimitExceeded)
 def rate_limit_handler(request: Request, exc: RateLimitExceeded):
+    RATE_LIMITED.inc((getattr(request.scope.get("route"), "path", request.url.path),))
     return JSONResponse(
         status_code=429,
         content={"detail": "Rate limit exceeded. Please try again later."}
     )
 
 # ------------------------
-# RULE DEFINITIONS
+# RULE STORE
 # ------------------------
-RULES = {
-    "US": {  # United States - COPPA
-        "free_chat": 13,
-        "user_generated_content": 13,
-        "location_sharing": 13,
-        "voice_recording": 8,
-        "image_upload": 8,
-        "ai_chat": 13,
-        "push_notifications": 5,
-        "personalized_ads": 13
-    },
-    "CA": {  # Canada - PIPEDA
-        "free_chat": 13,
-        "user_generated_content": 13,
-        "location_sharing": 13,
-        "voice_recording": 8,
-        "image_upload": 8,
-        "ai_chat": 13,
-        "push_notifications": 5,
-        "personalized_ads": 13
-    },
-    "GB": {  # United Kingdom - Age Appropriate Design Code
-        "free_chat": 13,
-        "user_generated_content": 13,
-        "location_sharing": 18,  # Stricter for location
-        "voice_recording": 8,
-        "image_upload": 8,
-        "ai_chat": 13,
-        "push_notifications": 5,
-        "personalized_ads": 13
-    },
-    "AU": {  # Australia - Privacy Act
-        "free_chat": 13,
-        "user_generated_content": 13,
-        "location_sharing": 13,
-        "voice_recording": 8,
-        "image_upload": 8,
-        "ai_chat": 13,
-        "push_notifications": 5,
-        "personalized_ads": 13
-    },
-    "DE": {  # Germany - GDPR (stricter interpretation)
-        "free_chat": 16,
-        "user_generated_content": 16,
-        "location_sharing": 16,
-        "voice_recording": 12,  # More lenient for media
-        "image_upload": 12,
-        "ai_chat": 16,
-        "push_notifications": 8,
-        "personalized_ads": 16
-    },
-    "FR": {  # France - GDPR
-        "free_chat": 15,
-        "user_generated_content": 15,
-        "location_sharing": 15,
-        "voice_recording": 10,
-        "image_upload": 10,
-        "ai_chat": 15,
-        "push_notifications": 6,
-        "personalized_ads": 15
-    },
-    "JP": {  # Japan - Act on Protection of Personal Information
-        "free_chat": 13,
-        "user_generated_content": 13,
-        "location_sharing": 16,
-        "voice_recording": 8,
-        "image_upload": 8,
-        "ai_chat": 13,
-        "push_notifications": 5,
-        "personalized_ads": 16
-    },
-    "IN": {  # India - Digital Personal Data Protection Act
-        "free_chat": 18,
-        "user_generated_content": 18,
-        "location_sharing": 18,
-        "voice_recording": 13,  # Slightly more lenient for media
-        "image_upload": 13,
-        "ai_chat": 18,
-        "push_notifications": 8,
-        "personalized_ads": 18
-    },
-    "BR": {  # Brazil - LGPD
-        "free_chat": 13,
-        "user_generated_content": 13,
-        "location_sharing": 18,  # Stricter for location data
-        "voice_recording": 8,
-        "image_upload": 8,
-        "ai_chat": 13,
-        "push_notifications": 5,
-        "personalized_ads": 18  # Requires adult consent
-    },
-    "MX": {  # Mexico - Federal Law on Protection of Personal Data
-        "free_chat": 13,
-        "user_generated_content": 13,
-        "location_sharing": 18,
-        "voice_recording": 8,
-        "image_upload": 8,
-        "ai_chat": 13,
-        "push_notifications": 5,
-        "personalized_ads": 18
-    },
-    "CN": {  # China - Personal Information Protection Law
-        "free_chat": 14,
-        "user_generated_content": 14,
-        "location_sharing": 14,
-        "voice_recording": 10,
-        "image_upload": 10,
-        "ai_chat": 14,
-        "push_notifications": 6,
-        "personalized_ads": 14
-    },
-    "KR": {  # South Korea - Personal Information Protection Act
-        "free_chat": 14,
-        "user_generated_content": 14,
-        "location_sharing": 14,
-        "voice_recording": 10,
-        "image_upload": 10,
-        "ai_chat": 14,
-        "push_notifications": 6,
-        "personalized_ads": 14
-    },
-    "ZA": {  # South Africa - POPIA
-        "free_chat": 18,
-        "user_generated_content": 18,
-        "location_sharing": 18,
-        "voice_recording": 13,
-        "image_upload": 13,
-        "ai_chat": 18,
-        "push_notifications": 8,
-        "personalized_ads": 18
-    },
-    # EU Countries with GDPR variations
-    "IT": {  # Italy - GDPR
-        "free_chat": 14,
-        "user_generated_content": 14,
-        "location_sharing": 14,
-        "voice_recording": 10,
-        "image_upload": 10,
-        "ai_chat": 14,
-        "push_notifications": 6,
-        "personalized_ads": 14
-    },
-    "ES": {  # Spain - GDPR
-        "free_chat": 14,
-        "user_generated_content": 14,
-        "location_sharing": 14,
-        "voice_recording": 10,
-        "image_upload": 10,
-        "ai_chat": 14,
-        "push_notifications": 6,
-        "personalized_ads": 14
-    },
-    "NL": {  # Netherlands - GDPR
-        "free_chat": 16,
-        "user_generated_content": 16,
-        "location_sharing": 16,
-        "voice_recording": 12,
-        "image_upload": 12,
-        "ai_chat": 16,
-        "push_notifications": 8,
-        "personalized_ads": 16
-    },
-    "SE": {  # Sweden - GDPR
-        "free_chat": 13,
-        "user_generated_content": 13,
-        "location_sharing": 13,
-        "voice_recording": 8,
-        "image_upload": 8,
-        "ai_chat": 13,
-        "push_notifications": 5,
-        "personalized_ads": 13
-    },
-    "PL": {  # Poland - GDPR
-        "free_chat": 16,
-        "user_generated_content": 16,
-        "location_sharing": 16,
-        "voice_recording": 12,
-        "image_upload": 12,
-        "ai_chat": 16,
-        "push_notifications": 8,
-        "personalized_ads": 16
-    },
-}
-
-# Default rules for any other region (conservative approach)
-DEFAULT_RULES = {
-    "free_chat": 13,
-    "user_generated_content": 13,
-    "location_sharing": 13,
-    "voice_recording": 8,
-    "image_upload": 8,
-    "ai_chat": 13,
-    "push_notifications": 5,
-    "personalized_ads": 13
-}
+# Rules, region/feature metadata and age bands are loaded from a versioned
+# file (rules.json unless AGE_GATE_RULES_FILE says otherwise) into an
+# immutable, precompiled snapshot. Reloads swap the whole snapshot at once;
+# see rulestore.py. With AGE_GATE_SNAPSHOT_FILE (e.g. under /dev/shm) the
+# compiled tables are shared by all workers through one memory-mapped file.
+RULE_STORE = RuleStore(
+    os.environ.get("AGE_GATE_RULES_FILE", DEFAULT_RULES_FILE),
+    snapshot_path=os.environ.get("AGE_GATE_SNAPSHOT_FILE") or None,
+)
 
-# ------------------------
-# REGION METADATA
-# ------------------------
-REGION_METADATA = {
-    "US": {
-        "name": "United States",
-        "primary_regulation": "COPPA (Children's Online Privacy Protection Act)",
-        "general_age_threshold": 13,
-        "notable_exceptions": {},
-        "description": "Federal law requiring parental consent for collection of personal information from children under 13."
-    },
-    "CA": {
-        "name": "Canada",
-        "primary_regulation": "PIPEDA (Personal Information Protection and Electronic Documents Act)",
-        "general_age_threshold": 13,
-        "notable_exceptions": {},
-        "description": "Federal privacy law with provincial variations for data collection from minors."
-    },
-    "GB": {
-        "name": "United Kingdom",
-        "primary_regulation": "Age Appropriate Design Code (Children's Code)",
-        "general_age_threshold": 13,
-        "notable_exceptions": {"location_sharing": 18},
-        "description": "ICO code requiring high privacy standards for services likely to be accessed by children under 18."
-    },
-    "AU": {
-        "name": "Australia",
-        "primary_regulation": "Privacy Act 1988",
-        "general_age_threshold": 13,
-        "notable_exceptions": {},
-        "description": "Australian privacy law with specific protections for children's personal information."
-    },
-    "DE": {
-        "name": "Germany",
-        "primary_regulation": "GDPR + German Federal Data Protection Act",
-        "general_age_threshold": 16,
-        "notable_exceptions": {},
-        "description": "Strict interpretation of GDPR requiring age 16 for consent to data processing."
-    },
-    "FR": {
-        "name": "France",
-        "primary_regulation": "GDPR (French implementation)",
-        "general_age_threshold": 15,
-        "notable_exceptions": {},
-        "description": "France set the digital consent age at 15 under GDPR."
-    },
-    "IT": {
-        "name": "Italy",
-        "primary_regulation": "GDPR (Italian implementation)",
-        "general_age_threshold": 14,
-        "notable_exceptions": {},
-        "description": "Italy set the digital consent age at 14 under GDPR."
-    },
-    "ES": {
-        "name": "Spain",
-        "primary_regulation": "GDPR (Spanish implementation)",
-        "general_age_threshold": 14,
-        "notable_exceptions": {},
-        "description": "Spain set the digital consent age at 14 under GDPR."
-    },
-    "NL": {
-        "name": "Netherlands",
-        "primary_regulation": "GDPR (Dutch implementation)",
-        "general_age_threshold": 16,
-        "notable_exceptions": {},
-        "description": "Netherlands requires age 16 for consent to data processing under GDPR."
-    },
-    "PL": {
-        "name": "Poland",
-        "primary_regulation": "GDPR (Polish implementation)",
-        "general_age_threshold": 16,
-        "notable_exceptions": {},
-        "description": "Poland requires age 16 for consent to data processing under GDPR."
-    },
-    "SE": {
-        "name": "Sweden",
-        "primary_regulation": "GDPR (Swedish implementation)",
-        "general_age_threshold": 13,
-        "notable_exceptions": {},
-        "description": "Sweden set the digital consent age at 13 under GDPR."
-    },
-    "JP": {
-        "name": "Japan",
-        "primary_regulation": "Act on Protection of Personal Information (APPI)",
-        "general_age_threshold": 13,
-        "notable_exceptions": {"location_sharing": 16, "personalized_ads": 16},
-        "description": "Japanese privacy law with enhanced protections for location data and behavioral advertising."
-    },
-    "IN": {
-        "name": "India",
-        "primary_regulation": "Digital Personal Data Protection Act 2023",
-        "general_age_threshold": 18,
-        "notable_exceptions": {},
-        "description": "Verifiable parental consent required for processing data of children under 18."
-    },
-    "BR": {
-        "name": "Brazil",
-        "primary_regulation": "LGPD (Lei Geral de Proteção de Dados)",
-        "general_age_threshold": 13,
-        "notable_exceptions": {"location_sharing": 18, "personalized_ads": 18},
-        "description": "Brazilian data protection law requiring parental consent for minors, with stricter rules for location and advertising data."
-    },
-    "MX": {
-        "name": "Mexico",
-        "primary_regulation": "Federal Law on Protection of Personal Data",
-        "general_age_threshold": 13,
-        "notable_exceptions": {"location_sharing": 18, "personalized_ads": 18},
-        "description": "Mexican privacy law with enhanced protections for sensitive data like location and advertising."
-    },
-    "CN": {
-        "name": "China",
-        "primary_regulation": "Personal Information Protection Law (PIPL)",
-        "general_age_threshold": 14,
-        "notable_exceptions": {},
-        "description": "Parental consent required for processing personal information of minors under 14."
-    },
-    "KR": {
-        "name": "South Korea",
-        "primary_regulation": "Personal Information Protection Act (PIPA)",
-        "general_age_threshold": 14,
-        "notable_exceptions": {},
-        "description": "Parental consent required for children under 14, with strict age verification requirements."
-    },
-    "ZA": {
-        "name": "South Africa",
-        "primary_regulation": "POPIA (Protection of Personal Information Act)",
-        "general_age_threshold": 18,
-        "notable_exceptions": {},
-        "description": "Very protective approach considering anyone under 18 a child requiring consent."
-    }
-}
+def resolve_tenant(snapshot: RuleSnapshot, headers) -> RuleSnapshot | TenantSnapshot:
+    """
+    The tenant view named by the X-API-Key or X-Tenant-ID request header, or
+    `snapshot` itself when neither is sent. Tenants with API keys can only
+    be selected with one of them.
+    """
+    tenant = api_key = None
+    for name, value in headers:
+        if name == b"x-tenant-id":
+            tenant = value.decode("latin-1")
+        elif name == b"x-api-key":
+            api_key = value
+    if api_key is not None:
+        keyed_tenant = snapshot.tenant_api_keys.get(hashlib.sha256(api_key).hexdigest())
+        if keyed_tenant is None:
+            raise CheckError(401, "Invalid API key")
+        if tenant is not None and tenant != keyed_tenant:
+            raise CheckError(400, "X-Tenant-ID does not match the API key")
+        return snapshot.tenants[keyed_tenant]
+    if tenant is None:
+        return snapshot
+    view = snapshot.tenants.get(tenant)
+    if view is None:
+        raise CheckError(400, f"Unknown tenant '{tenant}'")
+    if snapshot.tenant_overlays[tenant].get("api_keys"):
+        raise CheckError(401, "This tenant requires an API key")
+    return view
+
+class RuleSnapshotMiddleware:
+    """
+    Pins the current rule snapshot for the whole request (request.state.rule_snapshot)
+    and reports its version in the X-Rule-Version response header. When the
+    rule file defines tenants, a request naming one gets that tenant's view
+    instead, and request.state.tenant holds its name.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        snapshot = RULE_STORE.current
+        state = scope.setdefault("state", {})
+        extra_headers = []
+        if snapshot.tenants:
+            # Responses depend on the tenant headers; shared caches must key on them
+            extra_headers.append((b"vary", b"X-Tenant-ID, X-API-Key"))
+            try:
+                snapshot = resolve_tenant(snapshot, scope["headers"])
+            except CheckError as exc:
+                response = JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+                await response(scope, receive, send)
+                return
+            if isinstance(snapshot, TenantSnapshot):
+                state["tenant"] = snapshot.tenant
+        state["rule_snapshot"] = snapshot
+        extra_headers.append((b"x-rule-version", snapshot.version.encode("latin-1")))
+
+        async def send_with_version(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *extra_headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_version)
+
+app.add_middleware(RuleSnapshotMiddleware)
 
 # ------------------------
-# FEATURE METADATA
+# REQUEST PROFILER
 # ------------------------
-FEATURE_METADATA = {
-    "free_chat": {
-        "display_name": "Free Chat",
-        "description": "Real-time messaging and chat functionality with other users",
-        "category": "Social"
-    },
-    "user_generated_content": {
-        "display_name": "User Generated Content",
-        "description": "Ability to create, post, and share user-created content (posts, comments, reviews)",
-        "category": "Social"
-    },
-    "location_sharing": {
-        "display_name": "Location Sharing",
-        "description": "Sharing or accessing location data and geolocation features",
-        "category": "Privacy-Sensitive"
-    },
-    "voice_recording": {
-        "display_name": "Voice Recording",
-        "description": "Recording and sharing voice messages or audio content",
-        "category": "Media"
-    },
-    "image_upload": {
-        "display_name": "Image Upload",
-        "description": "Uploading and sharing photos or images",
-        "category": "Media"
-    },
-    "ai_chat": {
-        "display_name": "AI Chat",
-        "description": "Interaction with AI chatbots or conversational AI features",
-        "category": "AI-Powered"
-    },
-    "push_notifications": {
-        "display_name": "Push Notifications",
-        "description": "Receiving push notifications and alerts on device",
-        "category": "Engagement"
-    },
-    "personalized_ads": {
-        "display_name": "Personalized Ads",
-        "description": "Behavioral advertising and personalized ad targeting based on user data",
-        "category": "Advertising"
-    }
-}
-
-# Age bands
-AGE_BANDS = [
-    (0, 4, "0-4"),
-    (5, 7, "5-7"),
-    (8, 12, "8-12"),
-    (13, 15, "13-15"),
-    (16, 17, "16-17"),
-    (18, 120, "18+")
-]
+# Stack-sampling profiler for a sample of requests (see profiler.py). Off by
+# default; it can be switched on and tuned at runtime via /admin/profiler.
+PROFILER = Profiler(ProfilerConfig(
+    enabled=os.environ.get("AGE_GATE_PROFILE_ENABLED", "") == "1",
+    sample_rate=float(os.environ.get("AGE_GATE_PROFILE_SAMPLE_RATE", "0")),
+    header=os.environ.get("AGE_GATE_PROFILE_HEADER") or None,
+    paths=tuple(path for path in os.environ.get("AGE_GATE_PROFILE_PATHS", "").split(",") if path),
+))
+
+app.add_middleware(ProfilerMiddleware, profiler=PROFILER)
 
 # ------------------------
 # Pydantic Models
@@ -429,6 +319,8 @@ class AgeGateRequest(BaseModel):
 
     @model_validator(mode="before")
     def check_dob_or_age(cls, values):
+        if not isinstance(values, dict):
+            return values  # Let field validation report the wrong type
         dob = values.get("child_dob")
         age = values.get("age")
         if not dob and age is None:
@@ -456,6 +348,8 @@ class BulkAgeGateRequest(BaseModel):
 
     @model_validator(mode="before")
     def check_dob_or_age(cls, values):
+        if not isinstance(values, dict):
+            return values  # Let field validation report the wrong type
         dob = values.get("child_dob")
         age = values.get("age")
         if not dob and age is None:
@@ -489,10 +383,15 @@ class RegionInfo(BaseModel):
     description: str
 
 class RegionsResponse(BaseModel):
-    total_regions: int
+    total_regions: int  # Regions matching the filters, on all pages
     regions: list[RegionInfo]
     default_rules: dict
     disclaimer: str
+    next_offset: Optional[int] = None  # `offset` of the next page; null on the last one
+
+# /age-gate/regions page size when no `limit` is given, and the largest allowed
+DEFAULT_REGIONS_PAGE = 100
+MAX_REGIONS_PAGE = 500
 
 class FeatureInfo(BaseModel):
     name: str
@@ -509,60 +408,127 @@ class FeaturesResponse(BaseModel):
     categories: list[str]
     disclaimer: str
 
+# Upper bound on subjects per /age-gate/check-batch call
+MAX_BATCH_SUBJECTS = 10000
+
+class BatchSubject(BaseModel):
+    child_dob: Optional[date] = Field(None, description="Child's date of birth in YYYY-MM-DD format", example="2018-06-12")
+    age: Optional[int] = Field(None, description="Child's age in years", example=7)
+    region: str = Field(..., description="Country code, e.g., US", example="US")
+
+    @model_validator(mode="before")
+    def check_dob_or_age(cls, values):
+        if not isinstance(values, dict):
+            return values  # Let field validation report the wrong type
+        dob = values.get("child_dob")
+        age = values.get("age")
+        if not dob and age is None:
+            raise ValueError("Either 'child_dob' or 'age' must be provided.")
+        return values
+
+class BatchAgeGateRequest(BaseModel):
+    subjects: list[BatchSubject] = Field(..., max_length=MAX_BATCH_SUBJECTS, description="Children to evaluate")
+    features: list[str] = Field(..., description="Features to check for every subject", example=["free_chat", "ai_chat", "voice_recording"])
+
+# Error codes in /age-gate/check-batch `errors` entries
+BATCH_AGE_MISMATCH = "AGE_DOB_MISMATCH"
+
+class BatchAgeGateResponse(BaseModel):
+    total_subjects: int
+    features: list[str]  # Column order for the `allowed` bitmasks
+    unsupported_features: list[str]  # Requested features the rules do not know
+    age: list[Optional[int]]
+    age_band: list[Optional[str]]
+    region: list[str]
+    allowed: list[Optional[int]]  # Bit i set when features[i] is allowed
+    errors: list[dict]
+    disclaimer: str
+
+# Default /age-gate/timeline horizon: unlocks up to adulthood
+DEFAULT_TIMELINE_HORIZON = 18
+
+class TimelineEntry(BaseModel):
+    feature: str
+    feature_display_name: str
+    unlocks_at_age: int
+    unlock_date: str
+    unlocked: bool  # unlock_date is today or earlier
+
+class TimelineResponse(BaseModel):
+    region: str
+    child_dob: str
+    age: int
+    horizon: int  # Oldest unlock age included
+    regulation_reference: str
+    timeline: list[TimelineEntry]
+    disclaimer: str
+
+class FeatureIndexEntry(BaseModel):
+    bit: int  # Bit position in compact check-bulk masks
+    name: str
+    display_name: str
+    category: str
+
+class FeatureIndexResponse(BaseModel):
+    index_version: str
+    features: list[FeatureIndexEntry]
+
+class AgeExtreme(BaseModel):
+    min_age: int
+    regions: list[str]  # Every region in scope with this minimum age
+
+class AllowedRegionsResponse(BaseModel):
+    feature: str
+    age: int
+    scope: list[str]  # Regions considered
+    allowed: list[str]  # Youngest minimum age first
+    restricted: list[str]
+    most_lenient: Optional[AgeExtreme]
+    strictest: Optional[AgeExtreme]
+    disclaimer: str
+
+class FeatureAgeRange(BaseModel):
+    feature: str
+    most_lenient: Optional[AgeExtreme]
+    strictest: Optional[AgeExtreme]
+
+class MinAgeResponse(BaseModel):
+    scope: list[str]
+    features: list[FeatureAgeRange]
+    most_lenient_age: Optional[int]  # Youngest age at which any feature is allowed somewhere in scope
+    strictest_age: Optional[int]  # Age from which every feature is allowed everywhere in scope
+    disclaimer: str
+
 # ------------------------
 # UTILS
 # ------------------------
-def calculate_age(dob: date) -> int:
-    return relativedelta(date.today(), dob).years
-
-def get_age_band(age: int) -> str:
-    for min_age, max_age, band in AGE_BANDS:
-        if min_age <= age <= max_age:
-            return band
-    return "unknown"
-
-def get_age_requirements_by_region(feature: str) -> dict:
+def get_age_requirements_by_region(feature: str, snapshot: Optional[RuleSnapshot] = None) -> dict:
     """Get age requirements for a feature across all regions."""
+    table = (snapshot or RULE_STORE.current).rule_table
+    feature_idx = table.feature_index.get(feature)
+    if feature_idx is None:
+        return {region_code: None for region_code in table.regions}
+
+    default_age = table.min_age(table.default_row, feature_idx)
     age_requirements = {}
-    
+
     # Check all defined regions
-    for region_code in RULES.keys():
-        age_requirements[region_code] = RULES[region_code].get(feature, DEFAULT_RULES.get(feature))
-    
+    for row, region_code in enumerate(table.regions):
+        min_age = table.min_age(row, feature_idx)
+        age_requirements[region_code] = default_age if min_age is None else min_age
+
     return age_requirements
 
-def get_upcoming_unlocks(age: int, region: str, dob: date) -> list[dict]:
-    """Get features that will unlock in the next 5 years."""
-    region_rules = RULES.get(region, DEFAULT_RULES)
-    upcoming = []
-    
-    for feature, min_age in region_rules.items():
-        if age < min_age <= age + 5:  # Features unlocking within next 5 years
-            years_until = min_age - age
-            unlock_date = dob.replace(year=dob.year + min_age)
-            
-            # Get feature display name
-            feature_display = FEATURE_METADATA.get(feature, {}).get("display_name", feature)
-            
-            upcoming.append({
-                "feature": feature,
-                "feature_display_name": feature_display,
-                "unlocks_at_age": min_age,
-                "years_until_unlock": years_until,
-                "unlock_date": unlock_date.isoformat()
-            })
-    
-    # Sort by years until unlock
-    upcoming.sort(key=lambda x: x["years_until_unlock"])
-    
-    return upcoming if upcoming else None
+# ------------------------
+# ADMIN
+# ------------------------
+# Admin endpoints are disabled unless AGE_GATE_ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get("AGE_GATE_ADMIN_TOKEN")
 
-def get_regulation_reference(region: str) -> str:
-    """Get the primary regulation/law for a region."""
-    metadata = REGION_METADATA.get(region)
-    if metadata:
-        return metadata["primary_regulation"]
-    return "Standard age verification practices"
+def require_admin(request: Request):
+    token = request.headers.get("x-admin-token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
 
 # ------------------------
 # ENDPOINTS
@@ -572,222 +538,565 @@ def get_regulation_reference(region: str) -> str:
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus metrics, summed across workers when AGE_GATE_METRICS_DIR is set."""
+    return Response(REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
-@app.post("/age-gate/check", response_model=AgeGateResponse)
-@limiter.limit("40/minute")
-def age_gate_check(payload: AgeGateRequest, request: Request, response: Response):
-    # Determine age and DOB
-    if payload.child_dob:
-        age = calculate_age(payload.child_dob)
-        dob = payload.child_dob
-    else:
-        age = payload.age
-        today = date.today()
-        dob = date(today.year - age, today.month, today.day)
-
-    # Optional: verify consistency if both provided
-    if payload.child_dob and payload.age is not None:
-        calculated_age = calculate_age(payload.child_dob)
-        if payload.age != calculated_age:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Provided age {payload.age} does not match date of birth (calculated age {calculated_age})"
-            )
-
-    region = payload.region
-    feature = payload.feature
-
-    # Get region rules (default if region not listed)
-    region_rules = RULES.get(region, DEFAULT_RULES)
-
-    # Validate feature
-    min_age = region_rules.get(feature)
-    if min_age is None:
-        raise HTTPException(status_code=400, detail="Unsupported feature")
-
-    # Determine if allowed
-    allowed = age >= min_age
-    
-    # Calculate years until eligible (if not allowed)
-    years_until_eligible = (min_age - age) if not allowed else None
 
-    # Get upcoming unlocks
-    upcoming_unlocks = get_upcoming_unlocks(age, region, dob)
-    
-    # Get regulation reference
-    regulation_reference = get_regulation_reference(region)
-    
-    # Set cache headers - cache until next birthday
-    today = date.today()
-    next_birthday = dob.replace(year=today.year + 1 if (dob.month, dob.day) <= (today.month, today.day) else today.year)
-    days_until_birthday = (next_birthday - today).days
-    cache_seconds = min(days_until_birthday * 86400, 31536000)  # Max 1 year
+def check_response(
+    body: bytes, cache_seconds: int, etag: Optional[str] = None, media_type: str = "application/json"
+) -> Response:
+    """
+    Response for an encoded check body. The content is built to the
+    response model's shape, so FastAPI's response_model validation and
+    serialization are skipped; the models still define the OpenAPI schema.
+    """
+    response = Response(body, media_type=media_type)
     response.headers["Cache-Control"] = f"private, max-age={cache_seconds}"
+    if etag is not None:
+        response.headers["ETag"] = etag
+    return response
 
-    # Prepare response
-    age_gate_response = AgeGateResponse(
-        allowed=allowed,
-        reason_code="AGE_RESTRICTED" if not allowed else "ALLOWED",
-        reason=(
-            f"{feature} is restricted for children under {min_age} in {region}"
-            if not allowed else
-            f"{feature} is allowed for this age group"
-        ),
-        age=age,
-        age_band=get_age_band(age),
-        region=region,
-        regulation_reference=regulation_reference,
-        years_until_eligible=years_until_eligible,
-        next_eligible_date=(dob.replace(year=dob.year + min_age).isoformat()
-                            if not allowed else None),
-        upcoming_unlocks=upcoming_unlocks,
-        disclaimer="This response provides general guidance only and does not constitute legal advice."
+def check_etag(
+    endpoint: str, media_type: str, version: str, dob: date, age: int, region: str, features_key
+) -> str:
+    """
+    Strong ETag for a check response. The body is fully determined by these
+    inputs: every date in it (next_eligible_date, unlock dates) is an
+    anniversary of the DOB, and the age changes only on a birthday.
+    """
+    validator = render_json([endpoint, media_type, version, dob.isoformat(), age, region, features_key])
+    return '"' + hashlib.blake2b(validator, digest_size=16).hexdigest() + '"'
+
+# Encoders by response media type; compact formats whose library is missing are left out
+CHECK_ENCODERS = {"application/json": encode_json}
+CHECK_ENCODERS.update((media_type, encode) for media_type, encode in COMPACT_ENCODERS.items() if encode is not None)
+
+# ------------------------
+# DECISION CACHE
+# ------------------------
+# Encoded check responses, valid until the subject's next birthday or the
+# next rule change (see decisioncache.py). AGE_GATE_DECISION_CACHE_SIZE=0
+# disables it; AGE_GATE_DECISION_CACHE_URI adds a tier shared by all workers.
+DECISION_CACHE = DecisionCache(
+    max_entries=int(os.environ.get("AGE_GATE_DECISION_CACHE_SIZE", "10000")),
+    max_bytes=int(os.environ.get("AGE_GATE_DECISION_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    shared=(SharedDecisionTier(os.environ["AGE_GATE_DECISION_CACHE_URI"])
+            if os.environ.get("AGE_GATE_DECISION_CACHE_URI") else None),
+)
+
+# Tenant requests use their own partitions (see decisioncache.TenantDecisionCaches),
+# sized by the tenant's decision_cache_size or AGE_GATE_TENANT_DECISION_CACHE_SIZE.
+TENANT_DECISION_CACHES = TenantDecisionCaches(
+    max_entries=int(os.environ.get("AGE_GATE_TENANT_DECISION_CACHE_SIZE", "1000")),
+    max_bytes=int(os.environ.get("AGE_GATE_TENANT_DECISION_CACHE_MAX_BYTES", str(1024 * 1024))),
+    max_partitions=int(os.environ.get("AGE_GATE_TENANT_DECISION_CACHES", "256")),
+    shared=DECISION_CACHE.shared,
+)
+
+def decision_cache_for(snapshot) -> DecisionCache:
+    if isinstance(snapshot, TenantSnapshot):
+        return TENANT_DECISION_CACHES.get(snapshot.tenant, snapshot.decision_cache_size)
+    return DECISION_CACHE
+
+def collect_decision_cache_stats():
+    cache = DECISION_CACHE
+    CACHE_LOOKUPS.values[("decisions", "hit")] = cache.hits
+    CACHE_LOOKUPS.values[("decisions", "miss")] = cache.misses
+    CACHE_EVICTIONS.values[("decisions", "lru")] = cache.evictions
+    CACHE_EVICTIONS.values[("decisions", "expired")] = cache.expirations
+    CACHE_EVICTIONS.values[("decisions", "rule_change")] = cache.invalidations
+    tenant_stats = TENANT_DECISION_CACHES.stats()
+    if tenant_stats["partitions"] or tenant_stats["hits"] or tenant_stats["misses"]:
+        CACHE_LOOKUPS.values[("decisions_tenant", "hit")] = tenant_stats["hits"]
+        CACHE_LOOKUPS.values[("decisions_tenant", "miss")] = tenant_stats["misses"]
+        CACHE_EVICTIONS.values[("decisions_tenant", "lru")] = tenant_stats["evictions"]
+        CACHE_EVICTIONS.values[("decisions_tenant", "expired")] = tenant_stats["expirations"]
+        CACHE_EVICTIONS.values[("decisions_tenant", "rule_change")] = tenant_stats["invalidations"]
+    if cache.shared is not None:
+        CACHE_LOOKUPS.values[("decisions_shared", "hit")] = cache.shared.hits
+        CACHE_LOOKUPS.values[("decisions_shared", "miss")] = cache.shared.misses
+
+REGISTRY.add_collector(collect_decision_cache_stats)
+
+async def cached_check_response(
+    payload, snapshot: RuleSnapshot, features_key, evaluate, if_none_match: Optional[str] = None,
+    media_type: str = "application/json",
+) -> Response:
+    """
+    Response for a check or check-bulk payload, served from the decision
+    cache when possible. `features_key` identifies the requested feature(s),
+    `evaluate` is evaluate_check, evaluate_check_bulk or
+    evaluate_check_compact, and `media_type` picks the encoder from
+    CHECK_ENCODERS. A matching `if_none_match` gets a 304 before anything is
+    evaluated. Errors (400s) are never cached and never carry an ETag.
+    Tenant views use their tenant's cache partition. Answers that skip the
+    evaluator still count their decisions in age_gate_decisions.
+    """
+    encode = CHECK_ENCODERS[media_type]
+    cache = decision_cache_for(snapshot)
+    today = dates.today()
+    age, dob = resolve_age_and_dob(payload.child_dob, payload.age, today)
+    cache_seconds = birthday_cache_seconds(dob, today)
+    etag = check_etag(evaluate.__name__, media_type, snapshot.content_version, dob, age, payload.region, features_key)
+    timer = STAGE_TIMER.get()
+    timer.mark("age")
+    # "*" is not honoured: it would also match requests that end in a 400
+    features = (features_key,) if evaluate is evaluate_check else features_key
+    if if_none_match and if_none_match.strip() != "*" and etag_matches(if_none_match, etag):
+        count_decisions(snapshot, payload.region, features, age)
+        response = Response(status_code=304)
+        response.headers["Cache-Control"] = f"private, max-age={cache_seconds}"
+        response.headers["ETag"] = etag
+        return response
+    if not cache.enabled:
+        content, _ = evaluate(payload, snapshot, (today, age, dob))
+        return check_response(encode(content), cache_seconds, etag, media_type)
+
+    key = (evaluate.__name__, media_type, dob, payload.region, features_key)
+    body = cache.get(snapshot, key, today)
+    timer.mark("cache")
+    if body is not None:
+        count_decisions(snapshot, payload.region, features, age)
+        return check_response(body, cache_seconds, etag, media_type)
+
+    shared = cache.shared
+    if shared is not None:
+        body = await run_in_threadpool(shared.get, snapshot.content_version, key)
+    expires_on = next_birthday(dob, today)
+    if body is None:
+        content, _ = evaluate(payload, snapshot, (today, age, dob))
+        body = encode(content)
+        if shared is not None:
+            # Publish without making this request wait for the write
+            asyncio.get_running_loop().run_in_executor(None, shared.put, snapshot.content_version, key, body, expires_on)
+    else:
+        count_decisions(snapshot, payload.region, features, age)  # Shared tier hit
+    cache.put(snapshot, key, body, expires_on)
+    return check_response(body, cache_seconds, etag, media_type)
+
+# The check handlers are async: the decision is a few microseconds of CPU,
+# far less than a threadpool handoff. Keep the limiter on a storage whose
+# hit() never waits on the network (memory://, shm://, resp://) so the
+# event loop is not blocked.
+@app.post("/age-gate/check", response_model=AgeGateResponse)
+@limiter.limit(RATE_LIMIT)
+async def age_gate_check(payload: AgeGateRequest, request: Request):
+    return await cached_check_response(
+        payload, request.state.rule_snapshot, payload.feature, evaluate_check,
+        request.headers.get("if-none-match"),
     )
 
-    return age_gate_response
+# Longest NDJSON record accepted by /age-gate/check-stream
+MAX_STREAM_LINE_BYTES = 64 * 1024
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Streams results while the request body is still being read. The stock
+    StreamingResponse listens for disconnects on `receive`, which would race
+    with the body reader, so the generator owns `receive` here instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def _stream_error(line_number: int, status_code: int, detail) -> bytes:
+    return render_json({"line": line_number, "error": {"status_code": status_code, "detail": detail}}) + b"\n"
+
+def _stream_line_result(line_number: int, line: bytes, snapshot: RuleSnapshot) -> bytes:
+    """Evaluate one NDJSON record; errors become an inline error record."""
+    if len(line) > MAX_STREAM_LINE_BYTES:
+        return _stream_error(line_number, 413, f"Record exceeds {MAX_STREAM_LINE_BYTES} bytes")
+    try:
+        payload = AgeGateRequest.model_validate_json(line)
+        age_gate_response, _ = evaluate_check(payload, snapshot)
+        return encode_json(age_gate_response) + b"\n"
+    except ValidationError as exc:
+        return _stream_error(line_number, 422, json.loads(exc.json(include_url=False)))
+    except CheckError as exc:
+        return _stream_error(line_number, exc.status_code, exc.detail)
+
+async def _stream_decisions(request: Request):
+    # One snapshot for the whole stream, even across a rule reload
+    snapshot = request.state.rule_snapshot
+    buffer = b""
+    line_number = 0
+    skipping = False  # Inside an over-long record; drop bytes until its newline
+
+    async for chunk in request.stream():
+        if skipping:
+            newline = chunk.find(b"\n")
+            if newline < 0:
+                continue
+            chunk = chunk[newline + 1:]
+            line_number += 1
+            skipping = False
+
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield _stream_line_result(line_number, line, snapshot)
+
+        # Bound memory: never buffer more than one maximum-size record
+        if len(buffer) > MAX_STREAM_LINE_BYTES:
+            yield _stream_error(line_number + 1, 413, f"Record exceeds {MAX_STREAM_LINE_BYTES} bytes")
+            buffer = b""
+            skipping = True
+
+    # Final record without a trailing newline
+    if buffer.strip():
+        yield _stream_line_result(line_number + 1, buffer, snapshot)
+
+@app.post("/age-gate/check-stream")
+@limiter.limit(RATE_LIMIT)
+async def age_gate_check_stream(request: Request):
+    """
+    Evaluate newline-delimited AgeGateRequest records, one decision per output
+    line in input order (blank lines are skipped). Records that fail are
+    reported inline as {"line": n, "error": {...}} without ending the stream.
+    """
+    return NDJSONStreamingResponse(_stream_decisions(request), media_type="application/x-ndjson")
 
 @app.post("/age-gate/check-bulk", response_model=BulkAgeGateResponse)
-@limiter.limit("40/minute")
-def age_gate_check_bulk(payload: BulkAgeGateRequest, request: Request, response: Response):
-    # Determine age and DOB
-    if payload.child_dob:
-        age = calculate_age(payload.child_dob)
-        dob = payload.child_dob
+@limiter.limit(RATE_LIMIT)
+async def age_gate_check_bulk(payload: BulkAgeGateRequest, request: Request):
+    # Accept: application/vnd.age-gate.compact+json (or +msgpack, +cbor) opts in to the compact format
+    try:
+        media_type = negotiate(request.headers.get("accept"))
+    except NotAcceptable:
+        raise HTTPException(status_code=406, detail="The requested compact format is not available on this server")
+    if media_type is None:
+        response = await cached_check_response(
+            payload, request.state.rule_snapshot, tuple(payload.features), evaluate_check_bulk,
+            request.headers.get("if-none-match"),
+        )
     else:
-        age = payload.age
-        today = date.today()
-        dob = date(today.year - age, today.month, today.day)
-
-    # Optional: verify consistency if both provided
-    if payload.child_dob and payload.age is not None:
-        calculated_age = calculate_age(payload.child_dob)
-        if payload.age != calculated_age:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Provided age {payload.age} does not match date of birth (calculated age {calculated_age})"
-            )
-
-    region = payload.region
-    features = payload.features
-
-    # Get region rules
-    region_rules = RULES.get(region, DEFAULT_RULES)
-    
-    # Get regulation reference
-    regulation_reference = get_regulation_reference(region)
-    
-    # Get upcoming unlocks
-    upcoming_unlocks = get_upcoming_unlocks(age, region, dob)
-    
-    # Set cache headers - cache until next birthday
-    today = date.today()
-    next_birthday = dob.replace(year=today.year + 1 if (dob.month, dob.day) <= (today.month, today.day) else today.year)
-    days_until_birthday = (next_birthday - today).days
-    cache_seconds = min(days_until_birthday * 86400, 31536000)  # Max 1 year
-    response.headers["Cache-Control"] = f"private, max-age={cache_seconds}"
+        response = await cached_check_response(
+            payload, request.state.rule_snapshot, tuple(payload.features), evaluate_check_compact,
+            request.headers.get("if-none-match"), media_type,
+        )
+    response.headers["Vary"] = "Accept"
+    return response
 
-    # Check each feature
-    results = []
-    allowed_count = 0
-    restricted_count = 0
+# Stays on the threadpool: a full batch is milliseconds of CPU and would
+# stall other requests if it ran on the event loop.
+@app.post("/age-gate/check-batch", response_model=BatchAgeGateResponse)
+@limiter.limit(RATE_LIMIT)
+def age_gate_check_batch(payload: BatchAgeGateRequest, request: Request):
+    """
+    Evaluate many children against the same features in one call.
 
-    for feature in features:
-        min_age = region_rules.get(feature)
-        
-        if min_age is None:
-            continue
-        
-        allowed = age >= min_age
-        
-        if allowed:
-            allowed_count += 1
-        else:
-            restricted_count += 1
-
-        results.append(FeatureResult(
-            feature=feature,
-            allowed=allowed,
-            reason_code="ALLOWED" if allowed else "AGE_RESTRICTED",
-            reason=(
-                f"{feature} is allowed for this age group"
-                if allowed else
-                f"{feature} is restricted for children under {min_age} in {region}"
-            ),
-            min_age_required=min_age,
-            next_eligible_date=(
-                dob.replace(year=dob.year + min_age).isoformat()
-                if not allowed else None
-            )
-        ))
+    Results are columnar: entry i of each list belongs to subjects[i], and
+    `allowed[i]` is a bitmask over the returned `features` list. Unknown
+    features are listed in `unsupported_features` instead.
+    """
+    snapshot = request.state.rule_snapshot
+    table = snapshot.rule_table
+    decisions = snapshot.decision_table
+
+    # Each feature once, in request order
+    features = []
+    feature_indexes = []
+    unsupported_features = []
+    for feature in payload.features:
+        feature_idx = table.feature_index.get(feature)
+        if feature_idx is None:
+            if feature not in unsupported_features:
+                unsupported_features.append(feature)
+        elif feature not in features:
+            features.append(feature)
+            feature_indexes.append(feature_idx)
 
-    # Prepare response
-    bulk_response = BulkAgeGateResponse(
-        age=age,
-        age_band=get_age_band(age),
-        region=region,
-        regulation_reference=regulation_reference,
-        results=results,
-        summary={
-            "total_features_checked": len(results),
-            "allowed": allowed_count,
-            "restricted": restricted_count
-        },
-        upcoming_unlocks=upcoming_unlocks,
+    subjects = payload.subjects
+    total = len(subjects)
+    # Ages from DOBs in one pass over the whole batch
+    dob_indexes = [i for i, subject in enumerate(subjects) if subject.child_dob]
+    dob_ages = dict(zip(dob_indexes, ages_from_keys(
+        [date_key(subjects[i].child_dob) for i in dob_indexes], date_key(dates.today()))))
+    ages = [None] * total
+    age_bands = [None] * total
+    allowed = [None] * total
+    errors = []
+
+    # Group subjects by region row so each group shares one rule row
+    groups = {}
+    for i, subject in enumerate(subjects):
+        groups.setdefault(table.region_row(subject.region), []).append(i)
+
+    for row, indexes in groups.items():
+        # Per-group cache of (age -> request-ordered mask, band)
+        projected = {}
+        for i in indexes:
+            subject = subjects[i]
+            age = dob_ages.get(i)
+            if age is not None:
+                if subject.age is not None and subject.age != age:
+                    errors.append({
+                        "index": i,
+                        "code": BATCH_AGE_MISMATCH,
+                        "detail": f"Provided age {subject.age} does not match date of birth (calculated age {age})"
+                    })
+                    continue
+            else:
+                age = subject.age
+
+            entry = projected.get(age)
+            if entry is None:
+                decision = decisions.lookup(row, age)
+                mask = 0
+                for bit, feature_idx in enumerate(feature_indexes):
+                    if decision.is_allowed(feature_idx):
+                        mask |= 1 << bit
+                entry = projected[age] = (mask, decision.age_band)
+
+            ages[i] = age
+            allowed[i], age_bands[i] = entry
+
+    errors.sort(key=lambda error: error["index"])
+
+    return BatchAgeGateResponse(
+        total_subjects=total,
+        features=features,
+        unsupported_features=unsupported_features,
+        age=ages,
+        age_band=age_bands,
+        region=[subject.region for subject in subjects],
+        allowed=allowed,
+        errors=errors,
         disclaimer="This response provides general guidance only and does not constitute legal advice."
     )
 
-    return bulk_response
- 
-@app.get("/age-gate/regions", response_model=RegionsResponse)
-def list_regions(response: Response):
+@app.get("/age-gate/timeline", response_model=TimelineResponse)
+@limiter.limit(RATE_LIMIT)
+async def age_gate_timeline(
+    request: Request,
+    region: str = Query(..., description="Country code, e.g., US", examples=["US"]),
+    child_dob: date = Query(..., description="Child's date of birth in YYYY-MM-DD format", examples=["2018-06-12"]),
+    horizon: int = Query(DEFAULT_TIMELINE_HORIZON, ge=0, le=MAX_PRECOMPUTED_AGE, description="Include unlocks up to this age"),
+):
     """
-    List all supported regions with their privacy regulations and age thresholds.
+    Every feature unlock for a child from birth up to `horizon`, in date
+    order, from the region's precomputed timeline.
     """
-    # Static data - cache for 7 days
+    if child_dob.year > MAX_DOB_YEAR:
+        raise CheckError(422, "child_dob is out of range")
+    snapshot = request.state.rule_snapshot
+    today = dates.today()
+    row = snapshot.rule_table.region_row(region)
+    timeline = snapshot.decision_table.timelines[row].between(-1, horizon)
+
+    content = {
+        "region": region,
+        "child_dob": child_dob.isoformat(),
+        "age": age_on(child_dob, today),
+        "horizon": horizon,
+        "regulation_reference": snapshot.decision_table.regulation_references[row],
+        "timeline": [],
+        "disclaimer": CHECK_DISCLAIMER,
+    }
+    for feature, display_name, min_age in timeline:
+        unlock_date = anniversary(child_dob, min_age)
+        content["timeline"].append({
+            "feature": feature,
+            "feature_display_name": display_name,
+            "unlocks_at_age": min_age,
+            "unlock_date": unlock_date.isoformat(),
+            "unlocked": unlock_date <= today,
+        })
+    # The `unlocked` flags can next change on a birthday
+    return check_response(encode_json(content), birthday_cache_seconds(child_dob, today))
+
+# ------------------------
+# REVERSE QUERIES
+# ------------------------
+def _split_names(value: Optional[str]) -> Optional[tuple]:
+    """Comma-separated query value as a tuple; None when absent or blank."""
+    names = tuple(name.strip() for name in (value or "").split(",") if name.strip())
+    return names or None
+
+def _feature_ages(rule_index, feature: str, names: Optional[tuple]):
+    try:
+        feature_ages = rule_index.feature_ages(feature, names)
+    except KeyError as exc:
+        raise HTTPException(status_code=400, detail=f"Unknown region or group '{exc.args[0]}'")
+    if feature_ages is None:
+        raise HTTPException(status_code=400, detail="Unsupported feature")
+    return feature_ages
+
+def _age_extreme(extreme: Optional[tuple]) -> Optional[dict]:
+    if extreme is None:
+        return None
+    min_age, regions = extreme
+    return {"min_age": min_age, "regions": list(regions)}
+
+def _reference_response(content: dict) -> Response:
+    response = Response(encode_json(content), media_type="application/json")
+    # Derived from the rule data only, like the catalogs
     response.headers["Cache-Control"] = "public, max-age=604800"
-    
-    regions_list = []
-    
-    for code, metadata in REGION_METADATA.items():
-        regions_list.append(RegionInfo(
+    return response
+
+@app.get("/age-gate/query/regions", response_model=AllowedRegionsResponse)
+@limiter.limit(RATE_LIMIT)
+async def query_allowed_regions(
+    request: Request,
+    feature: str = Query(..., description="Feature to look up", examples=["ai_chat"]),
+    age: int = Query(..., ge=0, description="Child's age in years", examples=[14]),
+    regions: Optional[str] = Query(None, description="Comma-separated region codes and/or groups (e.g. EU); all listed regions by default", examples=["EU"]),
+):
+    """
+    Regions (in scope) where a child of `age` may use `feature`, plus the
+    most lenient and strictest minimum ages for it.
+    """
+    rule_index = request.state.rule_snapshot.rule_index
+    names = _split_names(regions)
+    feature_ages = _feature_ages(rule_index, feature, names)
+    return _reference_response({
+        "feature": feature,
+        "age": age,
+        "scope": list(rule_index.regions if names is None else rule_index.expand(names)),
+        "allowed": list(feature_ages.allowed(age)),
+        "restricted": list(feature_ages.restricted(age)),
+        "most_lenient": _age_extreme(feature_ages.most_lenient()),
+        "strictest": _age_extreme(feature_ages.strictest()),
+        "disclaimer": CHECK_DISCLAIMER,
+    })
+
+@app.get("/age-gate/query/min-age", response_model=MinAgeResponse)
+@limiter.limit(RATE_LIMIT)
+async def query_min_age(
+    request: Request,
+    features: str = Query(..., description="Comma-separated features", examples=["free_chat,ai_chat"]),
+    regions: Optional[str] = Query(None, description="Comma-separated region codes and/or groups (e.g. EU); all listed regions by default", examples=["EU"]),
+):
+    """
+    Most lenient and strictest minimum age for each feature across the
+    regions in scope, and the overall range for the whole set.
+    """
+    rule_index = request.state.rule_snapshot.rule_index
+    names = _split_names(regions)
+    feature_names = _split_names(features)
+    if feature_names is None:
+        raise HTTPException(status_code=400, detail="Unsupported feature")
+
+    results = []
+    lenient_ages = []
+    strict_ages = []
+    for feature in dict.fromkeys(feature_names):
+        feature_ages = _feature_ages(rule_index, feature, names)
+        most_lenient = feature_ages.most_lenient()
+        strictest = feature_ages.strictest()
+        if most_lenient is not None:
+            lenient_ages.append(most_lenient[0])
+            strict_ages.append(strictest[0])
+        results.append({
+            "feature": feature,
+            "most_lenient": _age_extreme(most_lenient),
+            "strictest": _age_extreme(strictest),
+        })
+    return _reference_response({
+        "scope": list(rule_index.regions if names is None else rule_index.expand(names)),
+        "features": results,
+        "most_lenient_age": min(lenient_ages, default=None),
+        "strictest_age": max(strict_ages, default=None),
+        "disclaimer": CHECK_DISCLAIMER,
+    })
+
+# ------------------------
+# CATALOG RENDERING
+# ------------------------
+class RegionListing:
+    """
+    /age-gate/regions entries of one rule snapshot, sorted by code, with the
+    subsets the filters select: by level ("country" / "subdivision") and by
+    country (the country and its subdivisions).
+    """
+
+    __slots__ = ("entries", "by_level", "by_country")
+
+    def __init__(self, entries: list):
+        self.entries = entries
+        self.by_level = {"country": [], "subdivision": []}
+        self.by_country = {}
+        for entry in entries:
+            country = country_of(entry["code"])
+            self.by_level["country" if country is None else "subdivision"].append(entry)
+            self.by_country.setdefault(country or entry["code"], []).append(entry)
+
+    def select(self, country: Optional[str], level: Optional[str]) -> list:
+        if country is None:
+            return self.entries if level is None else self.by_level[level]
+        entries = self.by_country.get(country, [])
+        if level is not None:
+            entries = [entry for entry in entries if (country_of(entry["code"]) is None) == (level == "country")]
+        return entries
+
+@lru_cache(maxsize=2)
+def region_listing(snapshot: RuleSnapshot) -> RegionListing:
+    """Listing for a (base) rule snapshot; tenant views share their base's region metadata."""
+    entries = []
+    for code, metadata in snapshot.region_metadata.items():
+        entries.append(RegionInfo(
             code=code,
             name=metadata["name"],
             primary_regulation=metadata["primary_regulation"],
             general_age_threshold=metadata["general_age_threshold"],
             notable_exceptions=metadata.get("notable_exceptions"),
             description=metadata["description"]
-        ))
-    
-    # Sort by region code
-    regions_list.sort(key=lambda x: x.code)
-    
-    regions_response = RegionsResponse(
-        total_regions=len(regions_list),
-        regions=regions_list,
-        default_rules=DEFAULT_RULES,
-        disclaimer="Region rules are based on common interpretations of privacy laws as of 2025. Always consult legal counsel for compliance requirements."
-    )
-    
-    return regions_response 
-    
-@app.get("/age-gate/features", response_model=FeaturesResponse)
-def list_features(response: Response):
-    """
-    List all available features with descriptions and age requirements by region.
-    """
-    # Static data - cache for 7 days
-    response.headers["Cache-Control"] = "public, max-age=604800"
-    
+        ).model_dump(mode="json"))
+
+    # Subdivisions without their own metadata entry are still served by /check;
+    # list them under their country's metadata with their overrides as exceptions
+    for code, ages in snapshot.rules.items():
+        country = country_of(code)
+        if code in snapshot.region_metadata or country is None or country not in snapshot.region_metadata:
+            continue
+        parent = snapshot.region_metadata[country]
+        entries.append(RegionInfo(
+            code=code,
+            name=f"{parent['name']} ({code})",
+            primary_regulation=parent["primary_regulation"],
+            general_age_threshold=parent["general_age_threshold"],
+            notable_exceptions=dict(ages),
+            description=f"Subdivision of {parent['name']}; the country's rules apply except for the listed features."
+        ).model_dump(mode="json"))
+
+    # Sort by region code (subdivisions follow their country)
+    entries.sort(key=lambda entry: entry["code"])
+    return RegionListing(entries)
+
+def render_regions_page(snapshot, entries: list, offset: int, limit: int) -> bytes:
+    """One /age-gate/regions page of `entries` (already filtered)."""
+    next_offset = offset + limit if offset + limit < len(entries) else None
+    return render_json({
+        "total_regions": len(entries),
+        "regions": entries[offset:offset + limit],
+        "default_rules": dict(snapshot.default_rules),
+        "disclaimer": "Region rules are based on common interpretations of privacy laws as of 2025. Always consult legal counsel for compliance requirements.",
+        "next_offset": next_offset,
+    })
+
+def build_regions_catalog(snapshot: RuleSnapshot) -> bytes:
+    """Render the unfiltered first /age-gate/regions page; called once per rule snapshot."""
+    listing = region_listing(getattr(snapshot, "base", snapshot))
+    return render_regions_page(snapshot, listing.entries, 0, DEFAULT_REGIONS_PAGE)
+
+def build_features_catalog(snapshot: RuleSnapshot) -> bytes:
+    """Render the /age-gate/features body; called once per rule snapshot."""
     features_list = []
     categories_set = set()
     
-    for feature_key, metadata in FEATURE_METADATA.items():
+    for feature_key, metadata in snapshot.feature_metadata.items():
         # Get age requirements across all regions
-        age_requirements = get_age_requirements_by_region(feature_key)
+        age_requirements = get_age_requirements_by_region(feature_key, snapshot)
         
-        # Calculate most common and strictest ages
-        ages = list(age_requirements.values())
-        most_common_age = max(set(ages), key=ages.count)
+        # Calculate most common and strictest ages (tenant features can be unsupported in some regions)
+        ages = [age for age in age_requirements.values() if age is not None]
+        age_counts = Counter(ages)
+        most_common_age = max(set(ages), key=age_counts.__getitem__)
         strictest_age = max(ages)
         
         # Track categories
@@ -813,4 +1122,210 @@ def list_features(response: Response):
         disclaimer="Feature restrictions are based on common interpretations of privacy laws. Always consult legal counsel for compliance requirements."
     )
     
-    return features_response
\ No newline at end of file
+    return render_json(features_response.model_dump(mode="json"))
+
+def build_feature_index_catalog(snapshot: RuleSnapshot) -> bytes:
+    """Feature numbering for compact check-bulk responses; only changes with the feature list."""
+    table = snapshot.rule_table
+    features = []
+    for bit, name in enumerate(table.features):
+        metadata = snapshot.feature_metadata.get(name, {})
+        features.append({
+            "bit": bit,
+            "name": name,
+            "display_name": metadata.get("display_name", name),
+            "category": metadata.get("category", "unknown"),
+        })
+    return render_json({"index_version": feature_index_version(table.features), "features": features})
+
+# Rendered lazily and re-rendered only when the rule snapshot is replaced;
+# up to AGE_GATE_TENANT_CATALOGS tenant views are kept besides the base rules
+CATALOG_CACHE_SIZE = 1 + int(os.environ.get("AGE_GATE_TENANT_CATALOGS", "64"))
+REGIONS_CATALOG = CatalogCache(build_regions_catalog, CATALOG_CACHE_SIZE)
+FEATURES_CATALOG = CatalogCache(build_features_catalog, CATALOG_CACHE_SIZE)
+FEATURE_INDEX_CATALOG = CatalogCache(build_feature_index_catalog, CATALOG_CACHE_SIZE)
+
+def collect_catalog_cache_stats():
+    for name, cache in (
+        ("regions_catalog", REGIONS_CATALOG),
+        ("features_catalog", FEATURES_CATALOG),
+        ("feature_index_catalog", FEATURE_INDEX_CATALOG),
+    ):
+        CACHE_LOOKUPS.values[(name, "hit")] = cache.hits
+        CACHE_LOOKUPS.values[(name, "miss")] = cache.misses
+
+REGISTRY.add_collector(collect_catalog_cache_stats)
+
+# ------------------------
+# STARTUP
+# ------------------------
+# Set AGE_GATE_OPENAPI_FILE to a schema written by build_openapi.py to serve
+# it instead of generating it on the first /docs or /openapi.json request.
+OPENAPI_FILE = os.environ.get("AGE_GATE_OPENAPI_FILE") or None
+
+# Top-level key of a prebuilt schema holding openapi_fingerprint() at build time
+OPENAPI_FINGERPRINT_KEY = "x-age-gate-fingerprint"
+
+def openapi_fingerprint() -> str:
+    """
+    Hash of what the generated schema is built from: the source of every
+    module next to this one (routes, models and the constants they use) and
+    the FastAPI and Pydantic versions. Far cheaper than generating the schema.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256(f"{FASTAPI_VERSION} {PYDANTIC_VERSION}".encode("utf-8"))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            with open(os.path.join(directory, name), "rb") as f:
+                digest.update(name.encode("utf-8") + b"\0" + f.read())
+    return digest.hexdigest()[:32]
+
+def load_openapi_schema(path: str) -> bool:
+    """
+    Install a prebuilt OpenAPI schema unless it is missing, was built from
+    different code (see openapi_fingerprint) or its operations differ from the app's.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            schema = json.load(f)
+    except (OSError, ValueError) as exc:
+        logger.warning("Cannot load OpenAPI schema from %s: %s", path, exc)
+        return False
+    if schema.pop(OPENAPI_FINGERPRINT_KEY, None) != openapi_fingerprint():
+        logger.warning("OpenAPI schema in %s was built from other code; rebuild it with build_openapi.py", path)
+        return False
+    operations = {
+        (route.path, method.lower())
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.include_in_schema
+        for method in route.methods
+    }
+    described = {(route_path, method) for route_path, methods in schema.get("paths", {}).items() for method in methods}
+    if described != operations:
+        logger.warning("OpenAPI schema in %s is out of date; rebuild it with build_openapi.py", path)
+        return False
+    app.openapi_schema = schema
+    return True
+
+def preload() -> None:
+    """
+    Build everything the first requests would otherwise build on demand:
+    every decision table row and the rendered catalogs.
+    """
+    snapshot = RULE_STORE.current
+    snapshot.decision_table.preload()
+    for catalog in (REGIONS_CATALOG, FEATURES_CATALOG, FEATURE_INDEX_CATALOG):
+        catalog.get(snapshot)
+
+@app.get("/age-gate/regions", response_model=RegionsResponse)
+def list_regions(
+    request: Request,
+    country: Optional[str] = Query(None, description="Only this country and its subdivisions", examples=["US"]),
+    level: Optional[Literal["country", "subdivision"]] = Query(None, description="Only countries or only subdivisions (e.g. US-CA)"),
+    offset: int = Query(0, ge=0, description="Regions to skip"),
+    limit: int = Query(DEFAULT_REGIONS_PAGE, ge=1, le=MAX_REGIONS_PAGE, description="Regions per page"),
+):
+    """
+    List supported regions with their privacy regulations and age thresholds,
+    sorted by code. Follow `next_offset` for further pages.
+    """
+    snapshot = request.state.rule_snapshot
+    # Static data - cache for 7 days
+    if country is None and level is None and offset == 0 and limit == DEFAULT_REGIONS_PAGE:
+        return REGIONS_CATALOG.get(snapshot).respond(request, "public, max-age=604800")
+    entries = region_listing(getattr(snapshot, "base", snapshot)).select(country, level)
+    # Rendered per request: pages are small, and not worth compressing ahead of time
+    page = RenderedCatalog(render_regions_page(snapshot, entries, offset, limit), compress=False)
+    return page.respond(request, "public, max-age=604800")
+    
+@app.get("/age-gate/features", response_model=FeaturesResponse)
+def list_features(request: Request):
+    """
+    List all available features with descriptions and age requirements by region.
+    """
+    # Static data - cache for 7 days
+    return FEATURES_CATALOG.get(request.state.rule_snapshot).respond(request, "public, max-age=604800")
+
+@app.get("/age-gate/feature-index", response_model=FeatureIndexResponse)
+def feature_index(request: Request):
+    """
+    Bit numbering of features for compact /age-gate/check-bulk responses.
+    """
+    # Static data - cache for 7 days; clients refetch when index_version changes
+    return FEATURE_INDEX_CATALOG.get(request.state.rule_snapshot).respond(request, "public, max-age=604800")
+
+@app.post("/admin/rules/reload", include_in_schema=False)
+def reload_rules(request: Request):
+    """
+    Re-read the rule file and swap in the new snapshot. In-flight requests
+    finish on the snapshot they started with. Requires X-Admin-Token.
+    """
+    require_admin(request)
+    previous_version = RULE_STORE.current.version
+    try:
+        snapshot, _ = RULE_STORE.reload(force=True)
+    except (OSError, RuleValidationError) as exc:
+        raise HTTPException(status_code=422, detail=f"Rules not reloaded: {exc}")
+    return {"version": snapshot.version, "previous_version": previous_version}
+
+class ProfilerSettings(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1, description="Fraction of eligible requests to profile")
+    header: Optional[str] = Field(None, description="Always profile requests carrying this header; empty string clears it")
+    paths: Optional[list[str]] = Field(None, description="Only profile paths with one of these prefixes; empty list for all")
+    interval_ms: Optional[float] = Field(None, gt=0, le=1000, description="Stack sampling interval")
+    max_stacks: Optional[int] = Field(None, ge=1, le=1000000, description="Distinct stacks kept before folding into one entry")
+
+def profiler_status() -> dict:
+    config = PROFILER.config.to_dict()
+    config["interval_ms"] = config.pop("interval") * 1000
+    config["paths"] = list(config["paths"])
+    return {"pid": os.getpid(), "config": config, "stats": PROFILER.stats()}
+
+@app.get("/admin/profiler", include_in_schema=False)
+def get_profiler(request: Request):
+    """Profiler settings and counters for this worker. Requires X-Admin-Token."""
+    require_admin(request)
+    return profiler_status()
+
+@app.patch("/admin/profiler", include_in_schema=False)
+def configure_profiler(settings: ProfilerSettings, request: Request):
+    """
+    Change profiler settings on this worker without a restart; omitted
+    fields keep their value. Requires X-Admin-Token.
+    """
+    require_admin(request)
+    changes = settings.model_dump(exclude_unset=True)
+    if "interval_ms" in changes:
+        changes["interval"] = changes.pop("interval_ms") / 1000
+    if "paths" in changes:
+        changes["paths"] = tuple(changes["paths"] or ())
+    changes = {name: value for name, value in changes.items() if value is not None or name == "header"}
+    try:
+        PROFILER.configure(**changes)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return profiler_status()
+
+@app.get("/admin/profiler/stacks", include_in_schema=False)
+def download_profile(request: Request, reset: bool = False):
+    """
+    Collapsed stacks collected on this worker, for flamegraph.pl or
+    speedscope. `reset=true` clears them after download. Requires X-Admin-Token.
+    """
+    require_admin(request)
+    body = PROFILER.collapsed()
+    if reset:
+        PROFILER.reset()
+    return Response(
+        body,
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="age-gate-{os.getpid()}.collapsed"'},
+    )
+
+@app.delete("/admin/profiler/stacks", include_in_schema=False)
+def reset_profile(request: Request):
+    """Discard the collected stacks. Requires X-Admin-Token."""
+    require_admin(request)
+    PROFILER.reset()
+    return profiler_status()
@@ -0,0 +1,299 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+# ------------------------
+# METRICS
+# ------------------------
+# Dependency-free counters and histograms rendered in the Prometheus text
+# format. Recording is a dict lookup and an integer add, with no lock: under
+# the GIL a concurrent update can very rarely be lost, which is fine for
+# monitoring and keeps the hot path around a microsecond per request.
+#
+# With a metrics directory, every worker periodically writes its values to
+# <dir>/metrics-<pid>.json and a scrape of any worker sums all files, so
+# /metrics reports the whole host. Clear the directory on deploy; files of
+# exited workers are kept so counters never go backwards.
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; per-stage timings are single-digit microseconds
+STAGE_BUCKETS = (
+    0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001,
+    0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1,
+)
+REQUEST_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, labels: tuple = (), amount: int = 1) -> None:
+        values = self.values
+        values[labels] = values.get(labels, 0) + amount
+
+    def dump(self) -> list:
+        return [[list(labels), value] for labels, value in list(self.values.items())]
+
+    def render(self, series: dict) -> list:
+        return [
+            f"{self.name}_total{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in sorted(series.items())
+        ]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram keyed by a tuple of label values. Observations are
+    integer nanoseconds; rendering converts to seconds.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._bounds_ns = tuple(round(bound * 1e9) for bound in buckets)
+        self.values = {}
+
+    def observe_ns(self, labels: tuple, nanoseconds: int) -> None:
+        # Per series: one count per bucket, then +Inf, then the sum in ns
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self._bounds_ns) + 2)
+        series[bisect_left(self._bounds_ns, nanoseconds)] += 1
+        series[-1] += nanoseconds
+
+    def dump(self) -> list:
+        return [[list(labels), list(series)] for labels, series in list(self.values.items())]
+
+    def render(self, series: dict) -> list:
+        lines = []
+        for labels, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = 'le="%s"' % (bound if bound == "+Inf" else _number(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            labels_text = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{labels_text} {_number(counts[-1] / 1e9)}")
+            lines.append(f"{self.name}_count{labels_text} {cumulative}")
+        return lines
+
+
+def _merge(metric, target: dict, dumped: Iterable) -> None:
+    for labels, value in dumped:
+        labels = tuple(labels)
+        if isinstance(metric, Histogram):
+            existing = target.get(labels)
+            target[labels] = list(value) if existing is None else [a + b for a, b in zip(existing, value)]
+        else:
+            target[labels] = target.get(labels, 0) + value
+
+
+class Registry:
+    """
+    The metrics of one process. Callbacks registered with `add_collector`
+    run at dump time and feed counters that are cheaper to keep elsewhere
+    (e.g. cache statistics).
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._collectors = []
+        self.directory: Optional[str] = None
+        self._flusher = None
+        self._flusher_pid = None
+        self._stop = threading.Event()
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = STAGE_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self._collectors.append(collector)
+
+    def reset(self) -> None:
+        for metric in self.metrics.values():
+            metric.values = {}
+
+    def dump(self) -> dict:
+        for collector in self._collectors:
+            collector()
+        return {name: metric.dump() for name, metric in self.metrics.items()}
+
+    # ------------------------
+    # MULTI-WORKER AGGREGATION
+    # ------------------------
+    def use_directory(self, directory: Optional[str], flush_interval: float = 1.0) -> None:
+        """Share values with the other workers through `directory` (None disables)."""
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._start_flusher(flush_interval)
+
+    def _file_path(self) -> str:
+        return os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+
+    def flush(self) -> None:
+        """Write this worker's values to the metrics directory."""
+        if not self.directory:
+            return
+        fd, tmp_path = tempfile.mkstemp(prefix=".metrics-", dir=self.directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.dump(), f, separators=(",", ":"))
+            os.replace(tmp_path, self._file_path())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _start_flusher(self, interval: float) -> None:
+        if interval <= 0 or self._flusher_pid == os.getpid():
+            return
+
+        def flush_forever():
+            while not self._stop.wait(interval):
+                try:
+                    self.flush()
+                except OSError as exc:
+                    logger.warning("Cannot write metrics to %s: %s", self.directory, exc)
+
+        self._stop.clear()
+        self._flusher_pid = os.getpid()
+        self._flusher = threading.Thread(target=flush_forever, name="metrics-flusher", daemon=True)
+        self._flusher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._flusher = None
+        self._flusher_pid = None
+
+    def collect(self) -> dict:
+        """Values to expose: this process alone, or every worker's file summed."""
+        if not self.directory:
+            return self.dump()
+        self.flush()
+        merged = {name: {} for name in self.metrics}
+        for entry in os.scandir(self.directory):
+            if not (entry.name.startswith("metrics-") and entry.name.endswith(".json")):
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as f:
+                    dumped = json.load(f)
+            except (OSError, ValueError):
+                # Being replaced or truncated; the next scrape picks it up
+                continue
+            for name, values in dumped.items():
+                if name in self.metrics:
+                    _merge(self.metrics[name], merged[name], values)
+        return {name: [[list(labels), value] for labels, value in series.items()]
+                for name, series in merged.items()}
+
+    def render(self) -> bytes:
+        """Prometheus text exposition of `collect()`."""
+        collected = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            series = {}
+            _merge(metric, series, collected.get(name, ()))
+            lines.extend(metric.render(series))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+REGISTRY = Registry()
+
+
+def _after_fork() -> None:
+    # A forked worker must not report the parent's values as its own, and
+    # needs its own flusher thread (see use_directory)
+    REGISTRY.reset()
+    REGISTRY._flusher = None
+    REGISTRY._flusher_pid = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+# ------------------------
+# PER-REQUEST STAGE TIMING
+# ------------------------
+class StageTimer:
+    """
+    Splits one request into consecutive stages: each `mark(stage)` records
+    the time since the previous mark under (route, stage).
+    """
+
+    __slots__ = ("histogram", "route", "last")
+
+    def __init__(self, histogram: Histogram, route: str, started: Optional[int] = None):
+        self.histogram = histogram
+        self.route = route
+        self.last = time.perf_counter_ns() if started is None else started
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter_ns()
+        self.histogram.observe_ns((self.route, stage), now - self.last)
+        self.last = now
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def mark(self, stage: str) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+# The timer of the request being handled; NULL_TIMER outside instrumented routes
+STAGE_TIMER: ContextVar = ContextVar("stage_timer", default=NULL_TIMER)
@@ -0,0 +1,154 @@
+import csv
+import json
+import os
+from operator import itemgetter
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; records are decoded with json then
+    orjson = None
+
+# ------------------------
+# POPULATION FILES
+# ------------------------
+# Offline jobs (simulate.py, evaluate.py) read large files of user records: CSV with a
+# header row, or JSON Lines. Every record must be on one line (no quoted
+# newlines in CSV), so a file can be split into byte ranges on line
+# boundaries and the ranges read by separate processes.
+#
+# `PopulationFile` describes a file and its chunks; `read_chunk`,
+# `chunk_records` and `chunk_rows` are plain functions so pool workers only
+# need a path, a byte range and the column spec.
+
+FORMATS = ("csv", "jsonl")
+
+# Byte size of one chunk handed to a worker
+DEFAULT_CHUNK_BYTES = 16 * 1024 * 1024
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+class PopulationError(ValueError):
+    """The file cannot be read as a population file (format or missing columns)."""
+
+
+def detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise PopulationError(f"Cannot tell the format of {os.path.basename(path)}; pass csv or jsonl")
+
+
+class PopulationFile:
+    """
+    A population file split into chunks. `fields` are the column names to
+    read; `spec` is what `chunk_records` needs to pick them out of a line
+    (column indexes for CSV, the names for JSON Lines). `columns` are the
+    CSV header's column names (None for JSON Lines).
+    """
+
+    __slots__ = ("path", "format", "fields", "header", "columns", "spec", "data_start", "size")
+
+    def __init__(self, path: str, fields: tuple, format: Optional[str] = None):
+        self.path = path
+        self.format = format or detect_format(path)
+        if self.format not in FORMATS:
+            raise PopulationError(f"Unknown format '{self.format}'")
+        self.fields = fields
+        self.size = os.path.getsize(path)
+        self.header = None
+        self.columns = None
+        self.spec = fields
+        self.data_start = 0
+        if self.format == "csv":
+            with open(path, "rb") as f:
+                line = f.readline()
+            self.data_start = len(line)
+            self.header = line.decode("utf-8-sig").rstrip("\r\n")
+            self.columns = columns = tuple(next(csv.reader([self.header]), []))
+            missing = [field for field in fields if field not in columns]
+            if missing:
+                raise PopulationError(f"{os.path.basename(path)} has no column {', '.join(missing)}")
+            self.spec = tuple(columns.index(field) for field in fields)
+
+    def chunks(self, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> list:
+        """(start, end) byte ranges covering the records, each ending on a line boundary."""
+        chunks = []
+        start = self.data_start
+        with open(self.path, "rb") as f:
+            while start < self.size:
+                end = start + chunk_bytes
+                if end < self.size:
+                    f.seek(end)
+                    f.readline()
+                    end = f.tell()
+                else:
+                    end = self.size
+                chunks.append((start, end))
+                start = end
+        return chunks
+
+
+def read_chunk(path: str, start: int, end: int) -> list:
+    """The lines in one byte range, without line endings."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+    lines = text.split("\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    if "\r" in text:
+        lines = [line.rstrip("\r") for line in lines]
+    return lines
+
+
+def chunk_records(lines: list, format: str, spec: tuple) -> list:
+    """
+    The chosen fields of each line as a tuple, aligned with `lines`; None
+    for blank lines and for lines that cannot be parsed or lack a field.
+    """
+    getter = itemgetter(*spec) if len(spec) > 1 else (lambda record: (record[spec[0]],))
+    try:
+        # Fast path: the whole chunk in C loops, for files without bad lines
+        if format == "csv":
+            return list(map(getter, csv.reader(lines)))
+        return list(map(getter, map(_loads, lines)))
+    except (IndexError, KeyError, TypeError, ValueError, csv.Error):
+        pass
+
+    records = []
+    for line in lines:
+        if not line:
+            records.append(None)
+            continue
+        try:
+            record = next(csv.reader([line])) if format == "csv" else _loads(line)
+            records.append(getter(record))
+        except (IndexError, KeyError, TypeError, ValueError, csv.Error, StopIteration):
+            records.append(None)
+    return records
+
+
+def chunk_rows(lines: list, format: str, columns: Optional[tuple]) -> list:
+    """
+    Each non-blank line as a dict (CSV: column -> string value), in order;
+    None for lines that cannot be parsed.
+    """
+    if format == "csv":
+        try:
+            return [dict(zip(columns, row)) for row in csv.reader(line for line in lines if line)]
+        except csv.Error:
+            pass
+    rows = []
+    for line in lines:
+        if not line:
+            continue
+        try:
+            row = dict(zip(columns, next(csv.reader([line])))) if format == "csv" else _loads(line)
+        except (ValueError, csv.Error):
+            row = None
+        rows.append(row if isinstance(row, dict) else None)
+    return rows
@@ -0,0 +1,205 @@
+import os
+import random
+import sys
+import threading
+import time
+from typing import Optional
+
+# ------------------------
+# REQUEST SAMPLING PROFILER
+# ------------------------
+# Off unless enabled. While at least one profiled request is in flight, a
+# background thread samples the Python stacks of the worker's threads every
+# `interval` seconds and counts them in collapsed-stack form
+# ("thread;outer (file.py:1);inner (file.py:9) <count>"), which flamegraph.pl,
+# speedscope and similar tools read directly.
+#
+# Concurrent requests share the process, so a sample taken while a profiled
+# request runs can show another request's work; sample enough requests and
+# the hot paths dominate. Idle threads (waiting in selectors, locks or
+# queues) are not recorded.
+
+MAX_STACK_DEPTH = 64
+
+# Leaf frames in these files mean the thread is waiting, not working
+IDLE_FILES = ("selectors.py", "threading.py", "queue.py")
+
+# Stacks beyond `max_stacks` distinct entries are counted here
+TRUNCATED_STACK = "[other stacks]"
+
+
+class ProfilerConfig:
+    """
+    Immutable profiler settings; `Profiler.configure` swaps in a new one.
+
+    A request is profiled when the profiler is enabled, its path starts with
+    one of `paths` (any path if empty), and it either carries `header` or
+    wins the `sample_rate` draw.
+    """
+
+    __slots__ = ("enabled", "sample_rate", "header", "paths", "interval", "max_stacks")
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        sample_rate: float = 0.0,
+        header: Optional[str] = None,
+        paths: tuple = (),
+        interval: float = 0.005,
+        max_stacks: int = 10000,
+    ):
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if max_stacks < 1:
+            raise ValueError("max_stacks must be at least 1")
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.header = header.lower() if header else None
+        self.paths = tuple(paths)
+        self.interval = interval
+        self.max_stacks = max_stacks
+
+    def replace(self, **changes) -> "ProfilerConfig":
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return ProfilerConfig(**values)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """Samples stacks while profiled requests are running; see module comment."""
+
+    def __init__(self, config: Optional[ProfilerConfig] = None):
+        self.config = config or ProfilerConfig()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._active = 0
+        self._thread = None
+        self._thread_pid = None
+        self._thread_names = {}
+        self.stacks = {}
+        self.samples = 0
+        self.profiled_requests = 0
+        self.started_at = time.time()
+
+    def configure(self, **changes) -> ProfilerConfig:
+        """Apply setting changes at runtime (raises ValueError for bad values)."""
+        self.config = self.config.replace(**changes)
+        return self.config
+
+    def should_profile(self, path: str, headers) -> bool:
+        config = self.config
+        if not config.enabled:
+            return False
+        if config.paths and not path.startswith(config.paths):
+            return False
+        if config.header:
+            header = config.header.encode("latin-1")
+            if any(name == header for name, _ in headers):
+                return True
+        return config.sample_rate > 0 and random.random() < config.sample_rate
+
+    # ------------------------
+    # PROFILED WINDOWS
+    # ------------------------
+    def begin(self) -> None:
+        with self._lock:
+            self._active += 1
+            self.profiled_requests += 1
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def end(self) -> None:
+        with self._lock:
+            self._active -= 1
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while True:
+            with self._lock:
+                while self._active == 0:
+                    self._wake.wait()
+            self._sample(own_ident)
+            time.sleep(self.config.interval)
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._thread_names.get(ident)
+        if name is None:
+            self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            name = self._thread_names.get(ident, f"thread-{ident}")
+        return name
+
+    def _sample(self, own_ident: int) -> None:
+        max_stacks = self.config.max_stacks
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                continue
+            labels = []
+            while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(self._thread_name(ident))
+            stack = ";".join(reversed(labels))
+
+            stacks = self.stacks
+            if stack not in stacks and len(stacks) >= max_stacks:
+                stack = TRUNCATED_STACK
+            stacks[stack] = stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    # ------------------------
+    # RESULTS
+    # ------------------------
+    def collapsed(self) -> str:
+        """Aggregated stacks in collapsed-stack format, hottest first."""
+        stacks = sorted(list(self.stacks.items()), key=lambda item: item[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def stats(self) -> dict:
+        return {
+            "active_requests": self._active,
+            "profiled_requests": self.profiled_requests,
+            "samples": self.samples,
+            "distinct_stacks": len(self.stacks),
+            "since": self.started_at,
+        }
+
+    def reset(self) -> None:
+        self.stacks = {}
+        self.samples = 0
+        self.profiled_requests = 0
+        self.started_at = time.time()
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware that opens a profiling window around selected requests."""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if scope["type"] != "http" or not profiler.config.enabled \
+                or not profiler.should_profile(scope["path"], scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        profiler.begin()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.end()
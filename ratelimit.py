@@ -0,0 +1,316 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from limits.storage import Storage
+
+from resp import RespConnection, RespError
+
+# ------------------------
+# SHARED RATE LIMIT STORAGE
+# ------------------------
+# Importing this module registers two extra `limits` storage schemes that the
+# slowapi Limiter can be pointed at through RATE_LIMIT_STORAGE_URI:
+#
+#   shm:///age-gate?slots=65536       counters shared by all workers on one host
+#   resp://host:6379/0?flush_interval=0.05
+#                                     counters shared across the fleet through any
+#                                     Redis-protocol server, updated in batches
+#
+# Both implement the fixed-window strategy (slowapi's default).
+
+
+def _query_options(uri: str) -> dict:
+    return {key: values[-1] for key, values in parse_qs(urlparse(uri).query).items()}
+
+
+def _key_hash(key: str) -> int:
+    # 0 marks an empty slot, so force a non-zero hash
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryStorage(Storage):
+    """
+    Fixed-window counters in a memory-mapped file (under /dev/shm when
+    available), so every worker on the host draws from the same counters.
+
+    The file is an open-addressing hash table of (key hash, window expiry,
+    count) slots. Writers serialize on flock() across processes and a thread
+    lock within the process. When every probed slot holds a live window, the
+    one closest to expiry is recycled.
+
+    A flock() belongs to the open file description, which forked workers
+    share with the process that created the storage before the fork. Each
+    process therefore opens its own lock descriptor on first use.
+    """
+
+    STORAGE_SCHEME = ["shm"]
+
+    SLOT = struct.Struct("<Qdq")  # key hash, window expiry (epoch seconds), count
+    MAX_PROBES = 8
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        parsed = urlparse(uri)
+        name = (parsed.netloc + parsed.path).strip("/") or "age-gate-ratelimit"
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        self.path = os.path.join(directory, name.replace("/", "_"))
+        self.slots = int(_query_options(uri).get("slots", options.get("slots", 65536)))
+        self.size = self.slots * self.SLOT.size
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock = (os.getpid(), threading.Lock(), self._fd)  # (owner pid, thread lock, flock descriptor)
+        with self._locked():
+            if os.fstat(self._fd).st_size < self.size:
+                os.ftruncate(self._fd, self.size)
+        self._map = mmap.mmap(self._fd, self.size)
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    @contextmanager
+    def _locked(self):
+        pid, thread_lock, fd = self._lock
+        if pid != os.getpid():
+            # Forked: the inherited descriptor would share its lock with the parent
+            pid, thread_lock, fd = self._lock = (os.getpid(), threading.Lock(), os.open(self.path, os.O_RDWR))
+        with thread_lock:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _find(self, key_hash: int, now: float, create: bool) -> Optional[int]:
+        """Offset of the slot for key_hash; with create, a slot to (re)use."""
+        start = key_hash % self.slots
+        free = None
+        oldest = None
+        oldest_expiry = float("inf")
+        for probe in range(self.MAX_PROBES):
+            offset = ((start + probe) % self.slots) * self.SLOT.size
+            slot_hash, expiry, _ = self.SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                return offset
+            if not create:
+                continue
+            if slot_hash == 0 or expiry <= now:
+                if free is None:
+                    free = offset
+            elif expiry < oldest_expiry:
+                oldest, oldest_expiry = offset, expiry
+        return free if free is not None else oldest
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        key_hash = _key_hash(key)
+        now = time.time()
+        with self._locked():
+            offset = self._find(key_hash, now, create=True)
+            slot_hash, window_end, count = self.SLOT.unpack_from(self._map, offset)
+            if slot_hash != key_hash or window_end <= now:
+                window_end, count = now + expiry, 0
+            count += amount
+            self.SLOT.pack_into(self._map, offset, key_hash, window_end, count)
+        return count
+
+    def get(self, key: str) -> int:
+        now = time.time()
+        with self._locked():
+            offset = self._find(_key_hash(key), now, create=False)
+            if offset is None:
+                return 0
+            _, window_end, count = self.SLOT.unpack_from(self._map, offset)
+        return count if window_end > now else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        with self._locked():
+            offset = self._find(_key_hash(key), now, create=False)
+            if offset is None:
+                return now
+            return self.SLOT.unpack_from(self._map, offset)[1]
+
+    def check(self) -> bool:
+        return not self._map.closed
+
+    def reset(self) -> Optional[int]:
+        with self._locked():
+            cleared = sum(
+                1 for slot in range(self.slots)
+                if self.SLOT.unpack_from(self._map, slot * self.SLOT.size)[0]
+            )
+            self._map[:] = bytes(self.size)
+        return cleared
+
+    def clear(self, key: str) -> None:
+        key_hash = _key_hash(key)
+        with self._locked():
+            offset = self._find(key_hash, time.time(), create=False)
+            if offset is not None:
+                self.SLOT.pack_into(self._map, offset, 0, 0.0, 0)
+
+
+class _Window:
+    __slots__ = ("remote", "pending", "in_flight", "expiry", "window_end")
+
+    def __init__(self, expiry: int, now: float):
+        self.remote = 0      # Fleet-wide count as of the last flush
+        self.pending = 0     # Local hits not yet sent
+        self.in_flight = 0   # Local hits sent in the flush currently running
+        self.expiry = expiry
+        self.window_end = now + expiry
+
+
+class RespStorage(Storage):
+    """
+    Fixed-window counters kept in any Redis-protocol server, with
+    write-behind batching.
+
+    `incr` only updates a local view (fleet count from the last flush plus
+    local pending hits), so no network round trip happens on the request
+    path. A background thread pipelines INCRBY/PEXPIRE for all dirty keys
+    every `flush_interval` seconds and refreshes the local view from the
+    replies. Limits therefore hold fleet-wide, with at most one flush
+    interval of local drift.
+    """
+
+    STORAGE_SCHEME = ["resp"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        parsed = urlparse(uri)
+        query = {**options, **_query_options(uri)}
+        db = int(parsed.path.strip("/") or 0)
+        self.connection = RespConnection(
+            parsed.hostname or "localhost",
+            parsed.port or 6379,
+            db=db,
+            timeout=float(query.get("timeout", 1.0)),
+        )
+        self.flush_interval = float(query.get("flush_interval", 0.05))
+        self.key_prefix = query.get("key_prefix", "age-gate:")
+        self._windows: dict[str, _Window] = {}
+        self._dirty: set[str] = set()
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+        self._stopped = threading.Event()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return (OSError, RespError)
+
+    def _ensure_flusher(self):
+        # Start lazily, and again in a forked child where the thread is gone
+        if self._flusher_pid != os.getpid():
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._flush_loop, name="resp-ratelimit-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except (OSError, RespError):
+                pass  # Pending hits stay queued and are retried on the next tick
+
+    def flush(self):
+        """Send all pending increments in one pipeline and refresh the local view."""
+        now = time.time()
+        with self._lock:
+            batch = []
+            for key in self._dirty:
+                window = self._windows.get(key)
+                if window is None or not window.pending:
+                    continue
+                window.in_flight, window.pending = window.pending, 0
+                batch.append((key, window))
+            self._dirty.clear()
+            # Forget windows that ended and have nothing left to send
+            for key in [key for key, window in self._windows.items()
+                        if window.window_end <= now and not window.pending and not window.in_flight]:
+                del self._windows[key]
+        if not batch:
+            return
+
+        commands = []
+        for key, window in batch:
+            commands.append(("INCRBY", self.key_prefix + key, window.in_flight))
+            commands.append(("PTTL", self.key_prefix + key))
+        try:
+            replies = self.connection.pipeline(commands)
+        except OSError:
+            with self._lock:
+                for key, window in batch:
+                    window.pending += window.in_flight
+                    window.in_flight = 0
+                    self._dirty.add(key)
+            raise
+
+        expire_commands = []
+        with self._lock:
+            for index, (key, window) in enumerate(batch):
+                total, ttl_ms = replies[2 * index], replies[2 * index + 1]
+                window.in_flight = 0
+                if isinstance(total, RespError) or isinstance(ttl_ms, RespError):
+                    continue
+                window.remote = total
+                if ttl_ms is None or ttl_ms < 0:
+                    # New key on the server: this node opened the window
+                    expire_commands.append(("PEXPIRE", self.key_prefix + key, int(window.expiry * 1000)))
+                    window.window_end = now + window.expiry
+                else:
+                    window.window_end = now + ttl_ms / 1000
+        if expire_commands:
+            self.connection.pipeline(expire_commands)
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        self._ensure_flusher()
+        now = time.time()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or (window.window_end <= now and not window.in_flight):
+                window = self._windows[key] = _Window(expiry, now)
+            window.pending += amount
+            self._dirty.add(key)
+            return window.remote + window.in_flight + window.pending
+
+    def get(self, key: str) -> int:
+        window = self._windows.get(key)
+        if window is None or window.window_end <= time.time():
+            return 0
+        return window.remote + window.in_flight + window.pending
+
+    def get_expiry(self, key: str) -> float:
+        window = self._windows.get(key)
+        return window.window_end if window is not None else time.time()
+
+    def check(self) -> bool:
+        try:
+            return self.connection.execute("PING") == "PONG"
+        except (OSError, RespError):
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self._lock:
+            self._windows.clear()
+            self._dirty.clear()
+        keys = self.connection.execute("KEYS", self.key_prefix + "*") or []
+        if keys:
+            self.connection.execute("DEL", *keys)
+        return len(keys)
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._windows.pop(key, None)
+            self._dirty.discard(key)
+        self.connection.execute("DEL", self.key_prefix + key)
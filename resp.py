@@ -0,0 +1,95 @@
+import socket
+import threading
+
+# ------------------------
+# RESP CLIENT
+# ------------------------
+# A minimal blocking client for Redis-protocol (RESP2) servers, shared by the
+# resp:// rate limit storage (ratelimit.py) and the shared decision cache
+# tier (decisioncache.py). It has no dependencies, so using the decision
+# cache does not pull in the rate limit storages.
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespConnection:
+    """Minimal blocking RESP2 client: just enough to pipeline simple commands."""
+
+    def __init__(self, host: str, port: int, db: int = 0, timeout: float = 1.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._io_lock = threading.Lock()  # Shared by the flusher and request threads
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        if self.db:
+            self._send([("SELECT", self.db)])
+            self._read()
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._file = None
+
+    @staticmethod
+    def _encode(command) -> bytes:
+        parts = [b"*%d\r\n" % len(command)]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _send(self, commands):
+        self._sock.sendall(b"".join(self._encode(command) for command in commands))
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("RESP server closed the connection")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            return RespError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            return self._file.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise ConnectionError(f"Unexpected RESP reply: {line!r}")
+
+    def pipeline(self, commands) -> list:
+        """Send all commands in one write and read every reply; reconnects once on failure."""
+        with self._io_lock:
+            for attempt in (0, 1):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._send(commands)
+                    return [self._read() for _ in commands]
+                except OSError:
+                    self.close()
+                    if attempt:
+                        raise
+
+    def execute(self, *command):
+        reply = self.pipeline([command])[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
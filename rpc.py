@@ -0,0 +1,315 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+from datetime import date
+from typing import Iterator, Optional
+
+from encoding import encode_json
+from checks import CheckError, evaluate_check, evaluate_check_bulk, evaluate_check_compact
+from metrics import REGISTRY
+from rulestore import DEFAULT_RULES_FILE, RuleStore
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; frames are decoded with json then
+    orjson = None
+
+# ------------------------
+# BINARY RPC FRONT END
+# ------------------------
+# A low-overhead alternative to the HTTP API for internal callers on the same
+# host: length-prefixed frames over a Unix socket, evaluated by the same
+# decision core (checks.py) with no HTTP parsing, routing or Pydantic models.
+#
+# Each frame is a 4-byte big-endian length followed by a UTF-8 JSON object.
+#
+#   request   {"id": 1, "method": "check", "params": {<same fields as the HTTP body>}}
+#   result    {"id": 1, "result": {<same content as the HTTP body>}, "max_age": 86400, "rule_version": "2025.1"}
+#   error     {"id": 1, "error": {"status_code": 400, "detail": "Unsupported feature"}}
+#
+# Methods are "check", "check_bulk" and "check_compact" (the compact bulk
+# format). "batch" streams many calls of one method:
+#
+#   request   {"id": 2, "method": "batch", "params": {"method": "check", "items": [{...}, ...]}}
+#   replies   {"id": 2, "index": 0, "result": {...}, "max_age": ...} per item, in order,
+#             then {"id": 2, "done": true, "count": <items>}
+#
+# Requests on one connection are answered in order, so clients may pipeline
+# (send many frames before reading). A whole batch uses one rule snapshot.
+# A request with "tenant": "<name>" is evaluated with that tenant's overlay
+# (see tenants.py); the socket is for trusted local callers, so API keys are
+# not asked for.
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct(">I")
+
+# Frames above this are refused and the connection is closed
+MAX_FRAME_BYTES = 1024 * 1024
+
+# Batch replies are flushed to the socket every this many items
+BATCH_FLUSH_EVERY = 256
+
+METHODS = {
+    "check": (evaluate_check, False),
+    "check_bulk": (evaluate_check_bulk, True),
+    "check_compact": (evaluate_check_compact, True),
+}
+
+
+def encode_frame(message: dict) -> bytes:
+    body = encode_json(message)
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+def decode_body(body: bytes):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+class CheckParams:
+    """Validated call parameters; the attribute shape the evaluators in checks.py read."""
+
+    __slots__ = ("child_dob", "age", "region", "feature", "features")
+
+    def __init__(self, params, bulk: bool):
+        if not isinstance(params, dict):
+            raise CheckError(422, "params must be an object")
+        child_dob = params.get("child_dob")
+        if child_dob is not None:
+            try:
+                child_dob = date.fromisoformat(child_dob)
+            except (TypeError, ValueError):
+                raise CheckError(422, "child_dob must be a date in YYYY-MM-DD format")
+        age = params.get("age")
+        if age is not None and (not isinstance(age, int) or isinstance(age, bool)):
+            raise CheckError(422, "age must be an integer")
+        if not child_dob and age is None:
+            raise CheckError(422, "Either 'child_dob' or 'age' must be provided.")
+        region = params.get("region")
+        if not isinstance(region, str):
+            raise CheckError(422, "region must be a string")
+
+        self.child_dob = child_dob
+        self.age = age
+        self.region = region
+        self.feature = None
+        self.features = None
+        if bulk:
+            features = params.get("features")
+            if not isinstance(features, list) or not all(isinstance(feature, str) for feature in features):
+                raise CheckError(422, "features must be a list of strings")
+            self.features = features
+        else:
+            feature = params.get("feature")
+            if not isinstance(feature, str):
+                raise CheckError(422, "feature must be a string")
+            self.feature = feature
+
+
+def _error(status_code: int, detail) -> dict:
+    return {"error": {"status_code": status_code, "detail": detail}}
+
+
+def evaluate_call(method: str, params, snapshot) -> dict:
+    """Reply fields (without "id") for one call; errors become an "error" reply."""
+    try:
+        if method not in METHODS:
+            raise CheckError(404, f"Unknown method '{method}'")
+        evaluate, bulk = METHODS[method]
+        content, max_age = evaluate(CheckParams(params, bulk), snapshot)
+        return {"result": content, "max_age": max_age, "rule_version": snapshot.version}
+    except CheckError as exc:
+        return _error(exc.status_code, exc.detail)
+    except Exception:
+        # One bad call must not take the connection (and its pipeline) down
+        logger.exception("RPC call %s failed", method)
+        return _error(500, "Internal error")
+
+
+class RpcServer:
+    """Serves the protocol above on a Unix socket, answering from `store.current`."""
+
+    def __init__(self, store: RuleStore, path: str, max_frame_bytes: int = MAX_FRAME_BYTES):
+        self.store = store
+        self.path = path
+        self.max_frame_bytes = max_frame_bytes
+        self._server = None
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left over from a previous run
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                    if length > self.max_frame_bytes:
+                        writer.write(encode_frame({"id": None, **_error(413, f"Frame exceeds {self.max_frame_bytes} bytes")}))
+                        break
+                    body = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    break  # Client closed the connection
+                await self._dispatch(body, writer)
+                await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, body: bytes, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = decode_body(body)
+        except ValueError:
+            writer.write(encode_frame({"id": None, **_error(400, "Frame is not valid JSON")}))
+            return
+        if not isinstance(request, dict):
+            writer.write(encode_frame({"id": None, **_error(400, "Frame must be a JSON object")}))
+            return
+
+        request_id = request.get("id")
+        method = request.get("method")
+        params = request.get("params")
+        snapshot = self.store.current
+        tenant = request.get("tenant")
+        if tenant is not None:
+            snapshot = snapshot.tenants.get(tenant) if isinstance(tenant, str) else None
+            if snapshot is None:
+                writer.write(encode_frame({"id": request_id, **_error(400, f"Unknown tenant '{tenant}'")}))
+                return
+        if method != "batch":
+            writer.write(encode_frame({"id": request_id, **evaluate_call(method, params, snapshot)}))
+            return
+
+        items = params.get("items") if isinstance(params, dict) else None
+        if not isinstance(items, list):
+            writer.write(encode_frame({"id": request_id, **_error(422, "batch params need a list of items")}))
+            return
+        item_method = params.get("method")
+        for index, item in enumerate(items):
+            writer.write(encode_frame({"id": request_id, "index": index, **evaluate_call(item_method, item, snapshot)}))
+            if index % BATCH_FLUSH_EVERY == BATCH_FLUSH_EVERY - 1:
+                await writer.drain()
+        writer.write(encode_frame({"id": request_id, "done": True, "count": len(items)}))
+
+
+# ------------------------
+# CLIENT
+# ------------------------
+class RpcClient:
+    """
+    Blocking client for the protocol above. `call` raises CheckError for
+    error replies; `batch` yields (index, result or CheckError) as the
+    replies arrive. With `tenant`, every request uses that tenant's rules.
+    """
+
+    def __init__(self, path: str, timeout: Optional[float] = 5.0, tenant: Optional[str] = None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.tenant = tenant
+        self._ids = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def _send(self, method: str, params) -> int:
+        self._ids += 1
+        request = {"id": self._ids, "method": method, "params": params}
+        if self.tenant is not None:
+            request["tenant"] = self.tenant
+        self.sock.sendall(encode_frame(request))
+        return self._ids
+
+    def _recv_exactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("RPC server closed the connection")
+            data += chunk
+        return bytes(data)
+
+    def receive(self) -> dict:
+        (length,) = FRAME_HEADER.unpack(self._recv_exactly(FRAME_HEADER.size))
+        return decode_body(self._recv_exactly(length))
+
+    def call(self, method: str, **params) -> dict:
+        self._send(method, params)
+        reply = self.receive()
+        if "error" in reply:
+            raise CheckError(reply["error"]["status_code"], reply["error"]["detail"])
+        return reply["result"]
+
+    def batch(self, method: str, items: list) -> Iterator[tuple]:
+        self._send("batch", {"method": method, "items": items})
+        while True:
+            reply = self.receive()
+            if reply.get("done"):
+                return
+            if "error" in reply and "index" not in reply:
+                raise CheckError(reply["error"]["status_code"], reply["error"]["detail"])
+            if "error" in reply:
+                yield reply["index"], CheckError(reply["error"]["status_code"], reply["error"]["detail"])
+            else:
+                yield reply["index"], reply["result"]
+
+
+# ------------------------
+# ENTRY POINT
+# ------------------------
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve age-gate checks over a Unix socket.")
+    parser.add_argument("--socket", default=os.environ.get("AGE_GATE_RPC_SOCKET", "/tmp/age-gate.sock"),
+                        help="Unix socket path (default: $AGE_GATE_RPC_SOCKET or /tmp/age-gate.sock)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    # Same rule configuration as the HTTP workers
+    store = RuleStore(
+        os.environ.get("AGE_GATE_RULES_FILE", DEFAULT_RULES_FILE),
+        snapshot_path=os.environ.get("AGE_GATE_SNAPSHOT_FILE") or None,
+    )
+    store.start_watcher(float(os.environ.get("AGE_GATE_RULES_WATCH_INTERVAL", "5")))
+    # Decisions show up in the HTTP workers' /metrics when they share the directory
+    REGISTRY.use_directory(
+        os.environ.get("AGE_GATE_METRICS_DIR") or None,
+        float(os.environ.get("AGE_GATE_METRICS_FLUSH_INTERVAL", "1")),
+    )
+    server = RpcServer(store, args.socket)
+    logger.info("Serving age-gate RPC on %s (rules %s)", args.socket, store.current.version)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        REGISTRY.stop()
+        store.stop_watcher()
+
+
+if __name__ == "__main__":
+    main()
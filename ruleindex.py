@@ -0,0 +1,110 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Optional
+
+from ruletable import RuleTable
+
+# ------------------------
+# REVERSE RULE INDEX
+# ------------------------
+# Answers "which regions allow feature F at age A" and "what is the
+# strictest / most lenient minimum age for F" without checking every region.
+# Per feature, the listed regions are kept sorted by minimum age, so both
+# questions are a binary search or a look at the ends of the list. Each
+# region group gets its own sorted lists, built with the snapshot. The
+# default rules are not a region and are not indexed.
+
+
+class FeatureAges:
+    """One feature's (min_age, region) pairs in ascending age order, as parallel tuples."""
+
+    __slots__ = ("ages", "regions")
+
+    def __init__(self, pairs: Iterable[tuple]):
+        # sorted() is stable, so equal ages keep the rule file's region order
+        pairs = sorted(pairs, key=lambda pair: pair[0])
+        self.ages = tuple(age for age, _ in pairs)
+        self.regions = tuple(region for _, region in pairs)
+
+    def allowed(self, age: int) -> tuple:
+        """Regions whose minimum age is at most `age`."""
+        return self.regions[:bisect_right(self.ages, age)]
+
+    def restricted(self, age: int) -> tuple:
+        return self.regions[bisect_right(self.ages, age):]
+
+    def most_lenient(self) -> Optional[tuple]:
+        """(lowest minimum age, regions with it), or None when no region has a rule."""
+        if not self.ages:
+            return None
+        age = self.ages[0]
+        return age, self.regions[:bisect_right(self.ages, age)]
+
+    def strictest(self) -> Optional[tuple]:
+        """(highest minimum age, regions with it), or None when no region has a rule."""
+        if not self.ages:
+            return None
+        age = self.ages[-1]
+        return age, self.regions[bisect_left(self.ages, age):]
+
+
+class RuleIndex:
+    """
+    feature -> FeatureAges for all listed regions and for each region group.
+    Groups map a name (e.g. "EU") to member region codes.
+    """
+
+    __slots__ = ("regions", "groups", "_by_scope")
+
+    def __init__(self, table: RuleTable, groups: dict):
+        self.regions = table.regions
+        self.groups = {name: tuple(members) for name, members in groups.items()}
+        self._by_scope = {None: self._build(table, range(len(table.regions)))}
+        for name, members in self.groups.items():
+            self._by_scope[name] = self._build(table, [table.region_index[code] for code in members])
+
+    @staticmethod
+    def _build(table: RuleTable, rows) -> dict:
+        by_feature = {}
+        for feature_idx, feature in enumerate(table.features):
+            pairs = []
+            for row in rows:
+                min_age = table.min_age(row, feature_idx)
+                if min_age is not None:
+                    pairs.append((min_age, table.regions[row]))
+            by_feature[feature] = FeatureAges(pairs)
+        return by_feature
+
+    def expand(self, codes: Iterable[str]) -> tuple:
+        """
+        Region codes for a mix of region codes and group names, in first-seen
+        order. Raises KeyError for a name that is neither.
+        """
+        expanded = {}
+        for code in codes:
+            members = self.groups.get(code)
+            if members is None:
+                if code not in self.regions:
+                    raise KeyError(code)
+                members = (code,)
+            for member in members:
+                expanded[member] = None
+        return tuple(expanded)
+
+    def feature_ages(self, feature: str, names: Optional[tuple] = None) -> Optional[FeatureAges]:
+        """
+        Index for a feature over `names` (region codes and/or group names; all
+        listed regions when None). A single group uses its prebuilt index; any
+        other mix filters the full one. None for an unknown feature; KeyError
+        for an unknown name.
+        """
+        if names is None:
+            return self._by_scope[None].get(feature)
+        if len(names) == 1 and names[0] in self.groups:
+            return self._by_scope[names[0]].get(feature)
+        members = set(self.expand(names))
+        everywhere = self._by_scope[None].get(feature)
+        if everywhere is None:
+            return None
+        return FeatureAges(
+            (age, region) for age, region in zip(everywhere.ages, everywhere.regions) if region in members
+        )
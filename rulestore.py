@@ -0,0 +1,400 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import tomllib
+from types import MappingProxyType
+from typing import Optional
+
+from decisions import DecisionTable
+from ruleindex import RuleIndex
+from ruletable import NO_RULE, RuleTable, compile_rules, country_of, resolve_region_rules
+from snapshotfile import file_identity, map_snapshot_file, read_snapshot_source_mtime, write_snapshot_file
+from tenants import compile_tenants
+
+# ------------------------
+# RULE STORE
+# ------------------------
+# Rules, region/feature metadata and age bands live in a versioned JSON or
+# TOML file. Each load is validated once into an immutable RuleSnapshot, and
+# RuleStore swaps snapshots atomically: a request pins `store.current` once
+# and keeps using that snapshot, even if a reload lands mid-request.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+
+# Regulation reference for regions without metadata (including the default rules)
+DEFAULT_REGULATION_REFERENCE = "Standard age verification practices"
+
+REGION_METADATA_FIELDS = ("name", "primary_regulation", "general_age_threshold", "description")
+FEATURE_METADATA_FIELDS = ("display_name", "description", "category")
+
+TENANT_FIELDS = ("feature_metadata", "rules", "default_rules", "rate_limit", "decision_cache_size", "api_keys")
+TENANT_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+API_KEY_DIGEST = re.compile(r"[0-9a-f]{64}")
+# The rate limit notation of the `limits` package ("100/minute", "10 per second;1000/day"),
+# checked here without importing it
+RATE_LIMIT_ITEM = re.compile(
+    r"\s*\d+\s*(/|\s+per\s+)\s*(\d+\s*)?(second|minute|hour|day|month|year)s?\s*", re.IGNORECASE)
+
+
+class RuleValidationError(ValueError):
+    """The rule file is malformed; the current snapshot stays in place."""
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _check_ages(where: str, ages, features) -> None:
+    if not isinstance(ages, dict):
+        raise RuleValidationError(f"{where} must be an object of feature -> minimum age")
+    for feature, age in ages.items():
+        if feature not in features:
+            raise RuleValidationError(f"{where} references unknown feature '{feature}'")
+        if not isinstance(age, int) or isinstance(age, bool) or not 0 <= age < NO_RULE:
+            raise RuleValidationError(f"{where}.{feature} must be an integer age between 0 and {NO_RULE - 1}")
+
+
+def validate_rule_data(data) -> None:
+    """Raise RuleValidationError unless `data` is a complete rule document."""
+    if not isinstance(data, dict):
+        raise RuleValidationError("Rule file must contain an object")
+    for key in ("rules", "default_rules", "region_metadata", "feature_metadata", "age_bands"):
+        if key not in data:
+            raise RuleValidationError(f"Rule file is missing '{key}'")
+
+    features = data["feature_metadata"]
+    if not isinstance(features, dict) or not features:
+        raise RuleValidationError("feature_metadata must be a non-empty object")
+    for feature, metadata in features.items():
+        missing = [field for field in FEATURE_METADATA_FIELDS if field not in metadata]
+        if missing:
+            raise RuleValidationError(f"feature_metadata.{feature} is missing {', '.join(missing)}")
+
+    _check_ages("default_rules", data["default_rules"], features)
+    if not isinstance(data["rules"], dict):
+        raise RuleValidationError("rules must be an object of region -> rules")
+    for region, ages in data["rules"].items():
+        _check_ages(f"rules.{region}", ages, features)
+        # Subdivisions (US-CA) inherit from their country, one level deep
+        country = country_of(region)
+        if country is not None and (country not in data["rules"] or country_of(country) is not None):
+            raise RuleValidationError(f"rules.{region} is a subdivision of '{country}', which is not a listed country")
+
+    if not isinstance(data["region_metadata"], dict):
+        raise RuleValidationError("region_metadata must be an object of region -> metadata")
+    for region, metadata in data["region_metadata"].items():
+        missing = [field for field in REGION_METADATA_FIELDS if field not in metadata]
+        if missing:
+            raise RuleValidationError(f"region_metadata.{region} is missing {', '.join(missing)}")
+
+    # Optional: named region groups such as "EU" for the reverse-index queries
+    groups = data.get("region_groups", {})
+    if not isinstance(groups, dict):
+        raise RuleValidationError("region_groups must be an object of group -> region codes")
+    for group, members in groups.items():
+        if group in data["rules"]:
+            raise RuleValidationError(f"region_groups.{group} has the same name as a region")
+        if not isinstance(members, list) or not members:
+            raise RuleValidationError(f"region_groups.{group} must be a non-empty list of region codes")
+        unknown = [code for code in members if code not in data["rules"]]
+        if unknown:
+            raise RuleValidationError(f"region_groups.{group} references unknown regions {', '.join(map(str, unknown))}")
+
+    bands = data["age_bands"]
+    if not isinstance(bands, list) or not all(
+        isinstance(band, (list, tuple)) and len(band) == 3 and band[0] <= band[1] for band in bands
+    ):
+        raise RuleValidationError("age_bands must be a list of [min_age, max_age, label]")
+
+    # Optional: per-tenant overlays (see tenants.py)
+    tenants = data.get("tenants", {})
+    if not isinstance(tenants, dict):
+        raise RuleValidationError("tenants must be an object of tenant -> overlay")
+    api_keys = set()
+    baseline = resolve_region_rules(data["rules"], data["default_rules"]) if tenants else {}
+    for tenant, overlay in tenants.items():
+        _check_tenant(tenant, overlay, data, baseline)
+        for digest in overlay.get("api_keys", ()):
+            if digest in api_keys:
+                raise RuleValidationError(f"tenants.{tenant}.api_keys repeats a key of another tenant")
+            api_keys.add(digest)
+
+
+def _check_overrides(where: str, ages: dict, baseline: dict) -> None:
+    for feature, age in ages.items():
+        minimum = baseline.get(feature)
+        if minimum is not None and age < minimum:
+            raise RuleValidationError(f"{where}.{feature} ({age}) is below the baseline minimum age {minimum}")
+
+
+def _check_tenant(tenant, overlay, data, baseline: dict) -> None:
+    """Overlays may add features and raise (never lower) the baseline's minimum ages."""
+    where = f"tenants.{tenant}"
+    if not isinstance(tenant, str) or not TENANT_NAME.fullmatch(tenant):
+        raise RuleValidationError(f"{where}: tenant names use letters, digits, '_', '.' and '-' (at most 64)")
+    if not isinstance(overlay, dict):
+        raise RuleValidationError(f"{where} must be an object")
+    unknown = [key for key in overlay if key not in TENANT_FIELDS]
+    if unknown:
+        raise RuleValidationError(f"{where} has unknown fields {', '.join(unknown)}")
+
+    extra_features = overlay.get("feature_metadata", {})
+    if not isinstance(extra_features, dict):
+        raise RuleValidationError(f"{where}.feature_metadata must be an object")
+    for feature, metadata in extra_features.items():
+        if feature in data["feature_metadata"]:
+            raise RuleValidationError(f"{where}.feature_metadata.{feature} is already a baseline feature")
+        if not isinstance(metadata, dict):
+            raise RuleValidationError(f"{where}.feature_metadata.{feature} must be an object")
+        missing = [field for field in FEATURE_METADATA_FIELDS if field not in metadata]
+        if missing:
+            raise RuleValidationError(f"{where}.feature_metadata.{feature} is missing {', '.join(missing)}")
+    features = {**data["feature_metadata"], **extra_features}
+
+    rules = overlay.get("rules", {})
+    if not isinstance(rules, dict):
+        raise RuleValidationError(f"{where}.rules must be an object of region -> rules")
+    for region, ages in rules.items():
+        # Overlays cannot add regions: every tenant shares the baseline's region rows
+        if region not in data["rules"]:
+            raise RuleValidationError(f"{where}.rules references unknown region '{region}'")
+        _check_ages(f"{where}.rules.{region}", ages, features)
+        _check_overrides(f"{where}.rules.{region}", ages, baseline[region])
+    default_rules = overlay.get("default_rules", {})
+    _check_ages(f"{where}.default_rules", default_rules, features)
+    _check_overrides(f"{where}.default_rules", default_rules, data["default_rules"])
+    for feature in extra_features:
+        if feature not in default_rules and not any(feature in ages for ages in rules.values()):
+            raise RuleValidationError(f"{where}.feature_metadata.{feature} has no minimum age in rules or default_rules")
+
+    rate_limit = overlay.get("rate_limit")
+    if rate_limit is not None and (
+        not isinstance(rate_limit, str)
+        or not all(RATE_LIMIT_ITEM.fullmatch(item) for item in re.split(r"[,;]", rate_limit))
+    ):
+        raise RuleValidationError(f"{where}.rate_limit must be a rate limit such as \"100/minute\"")
+    cache_size = overlay.get("decision_cache_size")
+    if cache_size is not None and (not isinstance(cache_size, int) or isinstance(cache_size, bool) or cache_size < 0):
+        raise RuleValidationError(f"{where}.decision_cache_size must be a non-negative integer")
+    api_keys = overlay.get("api_keys", [])
+    if not isinstance(api_keys, list) or not all(isinstance(digest, str) and API_KEY_DIGEST.fullmatch(digest) for digest in api_keys):
+        raise RuleValidationError(f"{where}.api_keys must be a list of lowercase hex SHA-256 digests of the keys")
+
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class RuleSnapshot:
+    """
+    One validated, compiled and read-only version of the rule data.
+
+    `rule_table` is compiled from `data` unless a precompiled one is passed
+    in (a mapped snapshot file); `mapped_file` then identifies that file.
+    `tenants` maps each tenant to its TenantSnapshot, and `tenant_api_keys`
+    maps SHA-256 digests of API keys to tenants.
+
+    `version` is the version the file declares; `content_version` adds a
+    hash of the rule content, so it also changes when the file is edited
+    without a version bump. Cache validators (ETags, shared cache keys) use
+    `content_version`.
+    """
+
+    __slots__ = (
+        "version", "content_version", "rules", "default_rules", "region_metadata", "feature_metadata",
+        "age_bands", "region_groups", "tenant_overlays", "rule_table", "decision_table", "rule_index",
+        "tenants", "tenant_api_keys", "source_path", "source_mtime", "mapped_file",
+    )
+
+    def __init__(
+        self,
+        data: dict,
+        source_path: Optional[str] = None,
+        source_mtime: Optional[float] = None,
+        rule_table: Optional[RuleTable] = None,
+        mapped_file: Optional[tuple] = None,
+    ):
+        if rule_table is None:
+            validate_rule_data(data)
+        # Without an explicit version, derive a stable one from the content
+        self.version = str(data.get("version") or hashlib.sha256(
+            json.dumps(data, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12])
+        self.rules = _freeze(data["rules"])
+        self.default_rules = _freeze(data["default_rules"])
+        self.region_metadata = _freeze(data["region_metadata"])
+        self.feature_metadata = _freeze(data["feature_metadata"])
+        self.age_bands = tuple(tuple(band) for band in data["age_bands"])
+        self.region_groups = _freeze(data.get("region_groups", {}))
+        self.tenant_overlays = _freeze(data.get("tenants", {}))
+        self.source_path = source_path
+        self.source_mtime = source_mtime
+        self.mapped_file = mapped_file
+
+        if rule_table is None:
+            rule_table = compile_rules(self.rules, self.default_rules, self.feature_metadata)
+        self.rule_table: RuleTable = rule_table
+        self.decision_table = DecisionTable(
+            self.rule_table,
+            {feature: metadata["display_name"] for feature, metadata in self.feature_metadata.items()},
+            self.age_bands,
+            tuple(self.regulation_reference(code) for code in (*self.rule_table.regions, None)),
+            pool={},
+        )
+        self.rule_index = RuleIndex(self.rule_table, self.region_groups)
+        # Hashed from the normalized document, so a mapped snapshot of the same file agrees
+        content = {key: value for key, value in self.to_document().items() if key != "version"}
+        content_hash = hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+        self.content_version = f"{self.version}+{content_hash[:12]}"
+        self.tenants, self.tenant_api_keys = compile_tenants(self, self.tenant_overlays)
+
+    def regulation_reference(self, region: Optional[str]) -> str:
+        metadata = self.region_metadata.get(region)
+        if not metadata and region is not None and country_of(region) is not None:
+            # Subdivisions without their own metadata cite their country's law
+            metadata = self.region_metadata.get(country_of(region))
+        if metadata:
+            return metadata["primary_regulation"]
+        return DEFAULT_REGULATION_REFERENCE
+
+    def to_document(self) -> dict:
+        """The rule file contents this snapshot was built from."""
+        document = {
+            "version": self.version,
+            "rules": _thaw(self.rules),
+            "default_rules": _thaw(self.default_rules),
+            "region_metadata": _thaw(self.region_metadata),
+            "feature_metadata": _thaw(self.feature_metadata),
+            "age_bands": _thaw(self.age_bands),
+        }
+        if self.region_groups:
+            document["region_groups"] = _thaw(self.region_groups)
+        if self.tenant_overlays:
+            document["tenants"] = _thaw(self.tenant_overlays)
+        return document
+
+
+def read_rule_file(path: str) -> dict:
+    """Parse a JSON or TOML rule file (chosen by extension)."""
+    try:
+        if path.endswith(".toml"):
+            with open(path, "rb") as f:
+                return tomllib.load(f)
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, tomllib.TOMLDecodeError) as exc:
+        raise RuleValidationError(f"Cannot parse {os.path.basename(path)}: {exc}") from exc
+
+
+def load_snapshot(path: str) -> RuleSnapshot:
+    mtime = os.stat(path).st_mtime
+    return RuleSnapshot(read_rule_file(path), source_path=path, source_mtime=mtime)
+
+
+def map_snapshot(snapshot_path: str, source_path: Optional[str] = None) -> RuleSnapshot:
+    """Build a RuleSnapshot over a memory-mapped snapshot file (no recompilation)."""
+    document, table, source_mtime, identity = map_snapshot_file(snapshot_path)
+    return RuleSnapshot(document, source_path=source_path, source_mtime=source_mtime,
+                        rule_table=table, mapped_file=identity)
+
+
+class RuleStore:
+    """
+    Holds the current RuleSnapshot. `reload()` compiles a new snapshot off to
+    the side and publishes it with a single reference swap; readers never
+    take a lock.
+
+    With `snapshot_path`, the compiled table is shared through a
+    memory-mapped file (snapshotfile.py): one worker compiles and writes it
+    under a file lock, and every worker maps it read-only and re-maps when a
+    new file is renamed into place.
+    """
+
+    def __init__(self, path: str = DEFAULT_RULES_FILE, snapshot_path: Optional[str] = None):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        if snapshot_path:
+            self.current: RuleSnapshot = self._publish_mapped(force=False)
+        else:
+            self.current: RuleSnapshot = load_snapshot(path)
+
+    def reload(self, force: bool = False) -> tuple[RuleSnapshot, bool]:
+        """
+        Load the rule file again. Returns (snapshot, changed); a file whose
+        mtime has not moved is skipped unless `force` is set. Raises
+        RuleValidationError (or OSError) and keeps the old snapshot when the
+        new file is bad.
+        """
+        with self._reload_lock:
+            current = self.current
+            if self.snapshot_path:
+                if not force and file_identity(self.snapshot_path) == current.mapped_file \
+                        and os.stat(self.path).st_mtime == current.source_mtime:
+                    return current, False
+                snapshot = self._publish_mapped(force)
+                if snapshot.mapped_file == current.mapped_file:
+                    return current, False
+            else:
+                if not force and os.stat(self.path).st_mtime == current.source_mtime:
+                    return current, False
+                snapshot = load_snapshot(self.path)
+            self.current = snapshot
+            return snapshot, True
+
+    def _publish_mapped(self, force: bool) -> RuleSnapshot:
+        """
+        Map the shared snapshot file, first (re)writing it if it is missing,
+        was built from an older rule file, or `force` is set.
+        """
+        source_mtime = os.stat(self.path).st_mtime
+        if not force and read_snapshot_source_mtime(self.snapshot_path) == source_mtime:
+            return map_snapshot(self.snapshot_path, self.path)
+
+        with open(self.snapshot_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another worker may have written it while we waited for the lock
+            if force or read_snapshot_source_mtime(self.snapshot_path) != source_mtime:
+                snapshot = load_snapshot(self.path)
+                write_snapshot_file(self.snapshot_path, snapshot.to_document(),
+                                    snapshot.rule_table, snapshot.source_mtime)
+        return map_snapshot(self.snapshot_path, self.path)
+
+    def start_watcher(self, interval: float) -> None:
+        """Poll the rule file every `interval` seconds and reload on change."""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    snapshot, changed = self.reload()
+                    if changed:
+                        logger.info("Loaded rules version %s from %s", snapshot.version, self.path)
+                except (OSError, RuleValidationError) as exc:
+                    # Keep serving the last good snapshot
+                    logger.warning("Rule reload from %s failed: %s", self.path, exc)
+
+        self._stop.clear()
+        self._watcher = threading.Thread(target=watch, name="rule-file-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        self._watcher = None
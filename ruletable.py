@@ -0,0 +1,212 @@
+from array import array
+from typing import Optional
+
+# ------------------------
+# COMPILED RULE TABLE
+# ------------------------
+# Sentinel stored in the matrix when a region has no rule for a feature.
+NO_RULE = 255
+
+
+def country_of(region: str) -> Optional[str]:
+    """Country part of a subdivision code ("US" for "US-CA"); None for a country code."""
+    country, separator, _ = region.partition("-")
+    return country if separator else None
+
+
+class RuleTable:
+    """
+    Dense region x feature matrix of minimum ages, compiled once from the
+    RULES / DEFAULT_RULES dicts.
+
+    Regions and features are interned to integer indexes. The default rules
+    occupy the last row, so unknown regions resolve to `default_row` and every
+    lookup is a single array read. Subdivision rows (US-CA) hold their
+    country's rules with their own written over them, resolved at compile
+    time. `min_ages` may be an array or a read-only
+    memoryview over a mapped snapshot file (see snapshotfile.py).
+
+    The first `n_base_features` features come from the rule file itself; a
+    tenant overlay (see tenants.py) appends its own after them.
+    """
+
+    __slots__ = (
+        "regions", "features", "region_index", "feature_index",
+        "n_features", "n_base_features", "default_row", "min_ages", "unlock_order",
+    )
+
+    def __init__(
+        self, regions: tuple, features: tuple, min_ages: array, unlock_order: tuple,
+        n_base_features: Optional[int] = None,
+    ):
+        self.regions = regions
+        self.features = features
+        self.region_index = {code: i for i, code in enumerate(regions)}
+        self.feature_index = {name: i for i, name in enumerate(features)}
+        self.n_features = len(features)
+        self.n_base_features = len(features) if n_base_features is None else n_base_features
+        self.default_row = len(regions)
+        self.min_ages = min_ages
+        self.unlock_order = unlock_order
+
+    def region_row(self, region: str) -> int:
+        """
+        Row for a region code. An unlisted subdivision (US-NY) falls back to
+        its country's row, anything else unlisted to the default rules.
+        """
+        row = self.region_index.get(region)
+        if row is None:
+            country = country_of(region)
+            row = self.default_row if country is None else self.region_index.get(country, self.default_row)
+        return row
+
+    def min_age(self, row: int, feature: int) -> Optional[int]:
+        """Minimum age for a (row, feature index) pair, or None if there is no rule."""
+        value = self.min_ages[row * self.n_features + feature]
+        return None if value == NO_RULE else value
+
+    def feature_min_age(self, region: str, feature: str) -> Optional[int]:
+        """String-keyed convenience lookup; None for unknown features."""
+        feature_idx = self.feature_index.get(feature)
+        if feature_idx is None:
+            return None
+        return self.min_age(self.region_row(region), feature_idx)
+
+
+def resolve_region_rules(rules: dict, default_rules: dict) -> dict:
+    """
+    Complete rules per region code: a subdivision's own rules over its
+    country's (or the default rules when the country is not listed).
+    """
+    resolved = {}
+    for code, region_rules in rules.items():
+        country = country_of(code)
+        if country is not None:
+            region_rules = {**rules.get(country, default_rules), **region_rules}
+        resolved[code] = region_rules
+    return resolved
+
+
+def compile_rules(rules: dict, default_rules: dict, feature_order) -> RuleTable:
+    """Build a RuleTable from the nested rule dicts."""
+    rules = resolve_region_rules(rules, default_rules)
+    regions = tuple(rules.keys())
+    features = tuple(feature_order)
+    for region_rules in (*rules.values(), default_rules):
+        for feature in region_rules:
+            if feature not in features:
+                features += (feature,)
+
+    rows = [*(rules[code] for code in regions), default_rules]
+    min_ages = array("B", [NO_RULE]) * (len(rows) * len(features))
+    unlock_order = []
+
+    for row, region_rules in enumerate(rows):
+        base = row * len(features)
+        for feature_idx, feature in enumerate(features):
+            age = region_rules.get(feature)
+            if age is None:
+                continue
+            if not 0 <= age < NO_RULE:
+                raise ValueError(f"Minimum age {age} for {feature} is out of range")
+            min_ages[base + feature_idx] = age
+
+        # Features in unlock order; ties keep the region's own rule order
+        ordered = sorted(
+            ((age, features.index(feature)) for feature, age in region_rules.items()),
+            key=lambda item: item[0],
+        )
+        unlock_order.append(tuple(ordered))
+
+    return RuleTable(regions, features, min_ages, tuple(unlock_order))
+
+
+def overlay_rules(base: RuleTable, extra_features: tuple, rules: dict, default_rules: dict) -> RuleTable:
+    """
+    A RuleTable for `base` with `extra_features` appended and the ages in
+    `rules` (region -> feature -> age) and `default_rules` written over it.
+    Regions must be listed in `base`. Ages in `default_rules` for the added
+    features apply in every region that does not give its own, as the base
+    table has no rule for them anywhere. A country's ages also apply to its
+    listed subdivisions where they are stricter than the subdivision's own;
+    ages given for the subdivision itself win. Rows without changes keep the
+    base table's unlock_order entries (the same tuple objects).
+    """
+    features = base.features + tuple(extra_features)
+    feature_index = {name: i for i, name in enumerate(features)}
+    n_base = base.n_features
+    padding = bytes([NO_RULE]) * len(extra_features)
+    min_ages = array("B")
+    for row in range(base.default_row + 1):
+        min_ages.frombytes(bytes(base.min_ages[row * n_base:(row + 1) * n_base]) + padding)
+
+    unlock_order = list(base.unlock_order)
+    changes = {}  # row -> {feature index: age}
+    added_defaults = {feature_index[feature]: age for feature, age in default_rules.items()
+                      if feature_index[feature] >= n_base}
+    if added_defaults:
+        for row in range(base.default_row):
+            changes[row] = dict(added_defaults)
+    for code in base.regions:
+        country = country_of(code)
+        if country in rules:
+            row = base.region_index[code]
+            for feature, age in rules[country].items():
+                feature_idx = feature_index[feature]
+                current = base.min_age(row, feature_idx) if feature_idx < n_base else None
+                if current is None or age > current:
+                    changes.setdefault(row, {})[feature_idx] = age
+    for code, ages in rules.items():
+        row_changes = changes.setdefault(base.region_index[code], {})
+        row_changes.update((feature_index[feature], age) for feature, age in ages.items())
+    if default_rules:
+        changes[base.default_row] = {feature_index[feature]: age for feature, age in default_rules.items()}
+    for row, changed in changes.items():
+        for feature_idx, age in changed.items():
+            min_ages[row * len(features) + feature_idx] = age
+        # Keep the base unlock order for ties; new features follow in overlay order
+        ordered = [(changed.pop(feature_idx, age), feature_idx) for age, feature_idx in unlock_order[row]]
+        ordered.extend((age, feature_idx) for feature_idx, age in changed.items())
+        unlock_order[row] = tuple(sorted(ordered, key=lambda item: item[0]))
+
+    return RuleTable(base.regions, features, min_ages, tuple(unlock_order), n_base_features=base.n_base_features)
+
+
+class PackedUnlockOrder:
+    """
+    Read-only `unlock_order` backed by a flat uint16 buffer: per row,
+    n_features (age, feature index) pairs, padded with NO_RULE ages.
+    """
+
+    __slots__ = ("buffer", "n_features", "n_rows")
+
+    def __init__(self, buffer, n_features: int):
+        self.buffer = buffer
+        self.n_features = n_features
+        self.n_rows = len(buffer) // (2 * n_features) if n_features else 0
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __getitem__(self, row: int) -> tuple:
+        if not 0 <= row < self.n_rows:
+            raise IndexError(row)
+        buffer = self.buffer
+        base = row * self.n_features * 2
+        ordered = []
+        for offset in range(base, base + self.n_features * 2, 2):
+            age = buffer[offset]
+            if age == NO_RULE:
+                break
+            ordered.append((age, buffer[offset + 1]))
+        return tuple(ordered)
+
+
+def pack_unlock_order(unlock_order, n_features: int) -> array:
+    """Flatten an unlock_order into the PackedUnlockOrder layout."""
+    packed = array("H")
+    for ordered in unlock_order:
+        for age, feature_idx in ordered:
+            packed.extend((age, feature_idx))
+        packed.extend((NO_RULE, 0) * (n_features - len(ordered)))
+    return packed
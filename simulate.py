@@ -0,0 +1,261 @@
+"""
+Rule-change impact simulator: evaluates every user in a population file
+under the current rules and a candidate rule file, and reports how many
+decisions flip, by region, feature and age band.
+
+    python simulate.py candidate.json users.csv > impact.json
+    python simulate.py candidate.json users.jsonl --rules rules.json --as-of 2026-01-01
+    python simulate.py candidate.json users.csv --affected affected.csv --workers 16
+
+The population file is CSV with a header row or JSON Lines (one record per
+line), with the user's date of birth and region in the `child_dob` and
+`region` fields (--dob-field / --region-field). --affected writes the records
+with at least one changed decision, in the input format and order.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from datetime import date
+from itertools import compress
+from typing import Optional
+
+from dates import age_on
+from population import DEFAULT_CHUNK_BYTES, PopulationError, PopulationFile, chunk_records, read_chunk
+from rulestore import DEFAULT_RULES_FILE, RuleValidationError, load_snapshot
+
+# ------------------------
+# IMPACT SIMULATION
+# ------------------------
+# A decision depends only on (region, age), and a population has far fewer
+# distinct (date of birth, region) pairs than rows. The workers therefore
+# only count the distinct pairs in their chunks; the merged counts are
+# evaluated once per distinct (region, age) against both rule snapshots,
+# through the same precomputed DecisionTable rows as /age-gate/check-bulk.
+# Only --affected needs a second pass over the file.
+
+KINDS = ("newly_restricted", "newly_allowed")
+
+
+def _hashable(record) -> bool:
+    try:
+        hash(record)
+    except TypeError:
+        return False
+    return True
+
+
+def count_chunk(task: tuple) -> Counter:
+    """Counts of (dob, region) in one chunk; None counts blank and unreadable lines."""
+    path, format, spec, start, end = task
+    records = chunk_records(read_chunk(path, start, end), format, spec)
+    try:
+        return Counter(records)
+    except TypeError:  # JSON lists or objects where a string was expected
+        return Counter(record if _hashable(record) else None for record in records)
+
+
+# Set in each filter worker by the pool initializer
+_affected_keys = frozenset()
+
+
+def _set_affected_keys(keys: frozenset) -> None:
+    global _affected_keys
+    _affected_keys = keys
+
+
+def filter_chunk(task: tuple) -> list:
+    """Lines of one chunk whose (dob, region) is in the affected keys."""
+    path, format, spec, start, end = task
+    lines = read_chunk(path, start, end)
+    records = chunk_records(lines, format, spec)
+    keys = _affected_keys
+    try:
+        selected = list(map(keys.__contains__, records))
+    except TypeError:
+        selected = [_hashable(record) and record in keys for record in records]
+    return list(compress(lines, selected))
+
+
+class MaskEvaluator:
+    """
+    Allowed-feature bitmasks for one snapshot, renumbered onto a feature
+    list shared by both snapshots (bit i = features[i]), per (region, age).
+    """
+
+    __slots__ = ("table", "decision_table", "bits", "masks")
+
+    def __init__(self, snapshot, features: tuple):
+        self.table = snapshot.rule_table
+        self.decision_table = snapshot.decision_table
+        self.bits = tuple(
+            (self.table.feature_index[feature], position)
+            for position, feature in enumerate(features)
+            if feature in self.table.feature_index
+        )
+        self.masks = {}
+
+    def decision(self, region: str, age: int) -> tuple[int, str]:
+        """(allowed mask over the shared features, age band)."""
+        key = (self.table.region_row(region), age)
+        result = self.masks.get(key)
+        if result is None:
+            decision = self.decision_table.lookup(*key)
+            allowed = decision.allowed_mask
+            mask = 0
+            for feature_idx, position in self.bits:
+                if allowed >> feature_idx & 1:
+                    mask |= 1 << position
+            result = self.masks[key] = (mask, decision.age_band)
+        return result
+
+
+def _totals() -> dict:
+    return {"rows": 0, "affected_rows": 0, "newly_restricted": 0, "newly_allowed": 0}
+
+
+def simulate(current, candidate, counts: Counter, as_of: date) -> tuple[dict, frozenset]:
+    """
+    The impact report for merged `counts` ((dob, region) -> rows), and the
+    (dob, region) keys whose decisions change. Age bands are the current
+    rules' bands.
+    """
+    features = tuple(dict.fromkeys((*current.rule_table.features, *candidate.rule_table.features)))
+    before = MaskEvaluator(current, features)
+    after = MaskEvaluator(candidate, features)
+
+    # Collapse dates of birth to ages first: decisions only depend on (region, age)
+    skipped = 0
+    pairs = Counter()
+    pair_keys = {}
+    for key, rows in counts.items():
+        dob, region = key if key is not None else (None, None)
+        if not isinstance(dob, str) or not isinstance(region, str):
+            skipped += rows
+            continue
+        try:
+            born = date.fromisoformat(dob)
+        except ValueError:
+            skipped += rows
+            continue
+        pair = (region, age_on(born, as_of))
+        pairs[pair] += rows
+        pair_keys.setdefault(pair, []).append(key)
+
+    by_region = {}
+    by_age_band = {}
+    by_feature = {}
+    cells = {}
+    affected_keys = []
+    for pair, rows in pairs.items():
+        old_mask, age_band = before.decision(*pair)
+        new_mask, _ = after.decision(*pair)
+        region_totals = by_region.setdefault(pair[0], _totals())
+        band_totals = by_age_band.setdefault(age_band, _totals())
+        region_totals["rows"] += rows
+        band_totals["rows"] += rows
+        changed = old_mask ^ new_mask
+        if not changed:
+            continue
+        affected_keys.extend(pair_keys[pair])
+        region_totals["affected_rows"] += rows
+        band_totals["affected_rows"] += rows
+        for position, feature in enumerate(features):
+            if changed >> position & 1:
+                kind = KINDS[0] if old_mask >> position & 1 else KINDS[1]
+                region_totals[kind] += rows
+                band_totals[kind] += rows
+                by_feature.setdefault(feature, dict.fromkeys(KINDS, 0))[kind] += rows
+                cells.setdefault((pair[0], feature, age_band), dict.fromkeys(KINDS, 0))[kind] += rows
+
+    report = {
+        "current_version": current.version,
+        "candidate_version": candidate.version,
+        "as_of": as_of.isoformat(),
+        "rows": sum(pairs.values()),
+        "skipped_rows": skipped,
+        "affected_rows": sum(totals["affected_rows"] for totals in by_region.values()),
+        "by_feature": {feature: by_feature[feature] for feature in features if feature in by_feature},
+        "by_region": dict(sorted(by_region.items())),
+        "by_age_band": by_age_band,
+        "changes": [
+            {"region": region, "feature": feature, "age_band": age_band, **cells[region, feature, age_band]}
+            for region, feature, age_band in sorted(cells)
+        ],
+    }
+    return report, frozenset(affected_keys)
+
+
+# ------------------------
+# ENTRY POINT
+# ------------------------
+def _snapshot(path: str, tenant: Optional[str]):
+    snapshot = load_snapshot(path)
+    if tenant is None:
+        return snapshot
+    if tenant not in snapshot.tenants:
+        raise RuleValidationError(f"{os.path.basename(path)} has no tenant '{tenant}'")
+    return snapshot.tenants[tenant]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("candidate", help="Candidate rule file (JSON or TOML)")
+    parser.add_argument("population", help="Population file (.csv, .jsonl or .ndjson)")
+    parser.add_argument("--rules", default=os.environ.get("AGE_GATE_RULES_FILE", DEFAULT_RULES_FILE),
+                        help="Current rule file (default: $AGE_GATE_RULES_FILE or rules.json)")
+    parser.add_argument("--tenant", help="Compare this tenant's rules (its overlay in both files)")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=date.today(), metavar="YYYY-MM-DD",
+                        help="Date ages are computed on (default: today)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Population format (default: by extension)")
+    parser.add_argument("--dob-field", default="child_dob")
+    parser.add_argument("--region-field", default="region")
+    parser.add_argument("--affected", metavar="PATH", help="Write the records whose decisions change")
+    parser.add_argument("--output", metavar="PATH", help="Write the report here instead of stdout")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes (default: all cores)")
+    parser.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_BYTES / (1024 * 1024),
+                        help="Megabytes per chunk (default 16)")
+    args = parser.parse_args()
+
+    try:
+        current = _snapshot(args.rules, args.tenant)
+        candidate = _snapshot(args.candidate, args.tenant)
+        population = PopulationFile(args.population, (args.dob_field, args.region_field), args.format)
+    except (OSError, RuleValidationError, PopulationError) as exc:
+        parser.error(str(exc))
+    tasks = [(population.path, population.format, population.spec, start, end)
+             for start, end in population.chunks(max(1, int(args.chunk_mb * 1024 * 1024)))]
+
+    started = time.perf_counter()
+    counts = Counter()
+    with multiprocessing.Pool(max(1, args.workers)) as pool:
+        for chunk_counts in pool.imap_unordered(count_chunk, tasks):
+            counts.update(chunk_counts)
+    report, affected_keys = simulate(current, candidate, counts, args.as_of)
+
+    if args.affected:
+        with multiprocessing.Pool(max(1, args.workers), _set_affected_keys, (affected_keys,)) as pool, \
+                open(args.affected, "w", encoding="utf-8", newline="") as f:
+            if population.header is not None:
+                f.write(population.header + "\n")
+            for lines in pool.imap(filter_chunk, tasks):
+                if lines:
+                    f.write("\n".join(lines) + "\n")
+    elapsed = time.perf_counter() - started
+
+    document = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(document + "\n")
+    else:
+        print(document)
+    total = report["rows"] + report["skipped_rows"]
+    print(f"{total} rows in {elapsed:.2f}s ({total / elapsed if elapsed else 0:,.0f} rows/s), "
+          f"{report['affected_rows']} affected, {report['skipped_rows']} skipped", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main_cli()
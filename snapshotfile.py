@@ -0,0 +1,128 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import Optional
+
+from ruletable import PackedUnlockOrder, RuleTable, pack_unlock_order
+
+# ------------------------
+# MEMORY-MAPPED RULE SNAPSHOTS
+# ------------------------
+# A compiled rule table written to one binary file, which every worker maps
+# read-only. The page cache holds a single copy for all workers on the host,
+# and a worker only parses the small metadata section at startup.
+#
+# Layout (native byte order; the file never leaves the host that wrote it):
+#   header    HEADER below
+#   matrix    (n_regions + 1) * n_features uint8 minimum ages (RuleTable.min_ages)
+#   unlock    PackedUnlockOrder uint16 pairs
+#   metadata  UTF-8 JSON: {"document": <rule file contents>, "regions": [...], "features": [...]}
+# Every section starts on an 8-byte boundary.
+
+MAGIC = b"AGRS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("=4sHxxIId6Q")  # magic, format, n_regions, n_features, source mtime, 3 x (offset, length)
+
+
+class SnapshotFileError(ValueError):
+    """The file is not a snapshot this code can read."""
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def write_snapshot_file(path: str, document: dict, table: RuleTable, source_mtime: float) -> None:
+    """Write a snapshot next to `path` and atomically rename it into place."""
+    matrix = bytes(table.min_ages)
+    unlock = pack_unlock_order(table.unlock_order, table.n_features).tobytes()
+    metadata = json.dumps(
+        {"document": document, "regions": list(table.regions), "features": list(table.features)},
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+    sections = []
+    offset = _align(HEADER.size)
+    for data in (matrix, unlock, metadata):
+        sections.append((offset, data))
+        offset = _align(offset + len(data))
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, len(table.regions), table.n_features, source_mtime,
+        *(value for section_offset, data in sections for value in (section_offset, len(data))),
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            for section_offset, data in sections:
+                f.seek(section_offset)
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        # Readers holding the old mapping keep the old inode until they re-map
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def read_snapshot_source_mtime(path: str) -> Optional[float]:
+    """Source mtime recorded in a snapshot file, or None if it is missing or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(header) < HEADER.size:
+        return None
+    magic, format_version, _, _, source_mtime, *_ = HEADER.unpack(header)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        return None
+    return source_mtime
+
+
+def file_identity(path: str) -> Optional[tuple]:
+    """(inode, mtime_ns) of a file; changes whenever a new snapshot is renamed in."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def map_snapshot_file(path: str) -> tuple[dict, RuleTable, float, tuple]:
+    """
+    Map a snapshot read-only. Returns (document, rule_table, source_mtime,
+    file_identity); the table's matrix and unlock order read straight from
+    the mapping, which stays alive as long as the table does.
+    """
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapped) < HEADER.size:
+        raise SnapshotFileError(f"{path} is truncated")
+    (magic, format_version, n_regions, n_features, source_mtime,
+     matrix_offset, matrix_length, unlock_offset, unlock_length,
+     metadata_offset, metadata_length) = HEADER.unpack_from(mapped)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise SnapshotFileError(f"{path} is not a format {FORMAT_VERSION} rule snapshot")
+    if matrix_length != (n_regions + 1) * n_features:
+        raise SnapshotFileError(f"{path} has an inconsistent rule matrix")
+
+    view = memoryview(mapped)
+    metadata = json.loads(bytes(view[metadata_offset:metadata_offset + metadata_length]))
+    table = RuleTable(
+        tuple(metadata["regions"]),
+        tuple(metadata["features"]),
+        view[matrix_offset:matrix_offset + matrix_length],
+        PackedUnlockOrder(view[unlock_offset:unlock_offset + unlock_length].cast("H"), n_features),
+    )
+    return metadata["document"], table, source_mtime, (stat.st_ino, stat.st_mtime_ns)
@@ -0,0 +1,86 @@
+from types import MappingProxyType
+from typing import Optional
+
+from decisions import DecisionTable
+from ruleindex import RuleIndex
+from ruletable import overlay_rules
+
+# ------------------------
+# TENANT OVERLAYS
+# ------------------------
+# Apps sharing one deployment (tenants) can add their own features and raise
+# minimum ages above the regulatory baseline. Overlays live under "tenants"
+# in the rule file (validated in rulestore.py) and are compiled with the
+# snapshot into one TenantSnapshot each, so a request only has to pick one.
+#
+# A TenantSnapshot reads like a RuleSnapshot. Region metadata, groups and age
+# bands are the base snapshot's own objects; the rule matrix is a small copy
+# with the overlay applied; decision rows and timelines come from the base
+# snapshot's pool, so rows an overlay leaves unchanged exist only once, and
+# tenants with the same overlay for a region share that row too.
+
+
+class TenantSnapshot:
+    """One tenant's view of a RuleSnapshot: the base rules with its overlay applied."""
+
+    __slots__ = (
+        "tenant", "base", "version", "content_version", "default_rules", "region_metadata", "feature_metadata",
+        "age_bands", "region_groups", "rule_table", "decision_table", "rate_limit",
+        "decision_cache_size", "_rule_index",
+    )
+
+    def __init__(self, base, tenant: str, overlay):
+        self.tenant = tenant
+        self.base = base
+        self.version = f"{base.version}+{tenant}"
+        self.content_version = f"{base.content_version}+{tenant}"
+        self.region_metadata = base.region_metadata
+        self.age_bands = base.age_bands
+        self.region_groups = base.region_groups
+        self.rate_limit = overlay.get("rate_limit")
+        self.decision_cache_size = overlay.get("decision_cache_size")
+
+        extra_features = overlay.get("feature_metadata", {})
+        default_rules = overlay.get("default_rules", {})
+        self.feature_metadata = MappingProxyType({**base.feature_metadata, **extra_features})
+        self.default_rules = MappingProxyType({**base.default_rules, **default_rules})
+        self.rule_table = overlay_rules(
+            base.rule_table, tuple(extra_features), overlay.get("rules", {}), default_rules,
+        )
+        if not extra_features:
+            display_names = base.decision_table.display_names
+        else:
+            display_names = {**base.decision_table.display_names,
+                             **{feature: metadata["display_name"] for feature, metadata in extra_features.items()}}
+        self.decision_table = DecisionTable(
+            self.rule_table,
+            display_names,
+            self.age_bands,
+            base.decision_table.regulation_references,
+            pool=base.decision_table.pool,
+        )
+        self._rule_index = None
+
+    @property
+    def rule_index(self) -> RuleIndex:
+        # Built on first use: most tenants never run a reverse query
+        if self._rule_index is None:
+            self._rule_index = RuleIndex(self.rule_table, self.region_groups)
+        return self._rule_index
+
+    def regulation_reference(self, region: Optional[str]) -> str:
+        return self.base.regulation_reference(region)
+
+
+def compile_tenants(base, overlays) -> tuple[dict, dict]:
+    """
+    TenantSnapshots for every overlay, and the API key index (SHA-256 hex
+    digest of the key -> tenant name).
+    """
+    tenants = {}
+    api_keys = {}
+    for tenant, overlay in overlays.items():
+        tenants[tenant] = TenantSnapshot(base, tenant, overlay)
+        for digest in overlay.get("api_keys", ()):
+            api_keys[digest] = tenant
+    return tenants, api_keys
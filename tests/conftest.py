@@ -0,0 +1,53 @@
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# The app reads its configuration at import time: point it at a scratch copy
+# of the rules, without the watcher or a limit tests could run into
+RULES_DIR = tempfile.mkdtemp(prefix="age-gate-tests-")
+RULES_FILE = os.path.join(RULES_DIR, "rules.json")
+shutil.copy(os.path.join(ROOT, "rules.json"), RULES_FILE)
+os.environ["AGE_GATE_RULES_FILE"] = RULES_FILE
+os.environ["AGE_GATE_RULES_WATCH_INTERVAL"] = "0"
+os.environ["RATE_LIMIT"] = "1000000/minute"
+
+with open(RULES_FILE, encoding="utf-8") as f:
+    BASE_RULES = json.load(f)
+
+
+@pytest.fixture
+def rule_data():
+    """A fresh copy of the shipped rule data to edit."""
+    return copy.deepcopy(BASE_RULES)
+
+
+@pytest.fixture
+def use_rules():
+    """Write rule data to the app's rule file and reload it; restored afterwards."""
+    import main
+
+    def load(data):
+        with open(RULES_FILE, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        return main.RULE_STORE.reload(force=True)[0]
+
+    yield load
+    load(BASE_RULES)
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    return TestClient(main.app)
@@ -0,0 +1,137 @@
+import socket
+import socketserver
+import threading
+import time
+
+# ------------------------
+# FAKE RESP SERVER
+# ------------------------
+# An in-process stand-in for a Redis-protocol server with just the commands
+# ratelimit.RespStorage and decisioncache.SharedDecisionTier send. Every
+# command is logged in `commands`, so tests can check how writes were
+# batched. `stop()` drops the listener and every open connection to simulate
+# losing the server; `start()` brings it back on the same port, empty.
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.fake.connections.add(self.request)
+        try:
+            while True:
+                command = self._read_command()
+                if command is None:
+                    return
+                self.wfile.write(self.server.fake.execute(command))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.server.fake.connections.discard(self.request)
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        command = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            command.append(self.rfile.read(length + 2)[:-2])
+        return command
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def _bulk(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class FakeRespServer:
+    def __init__(self):
+        self.port = None
+        self.data = {}  # key -> (value, expires_at or None)
+        self.commands = []
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def uri(self) -> str:
+        return f"resp://127.0.0.1:{self.port}/0"
+
+    def start(self):
+        self._server = _Server(("127.0.0.1", self.port or 0), _Handler)
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.data.clear()
+
+    def names(self, name: str) -> list:
+        """Logged commands with this name, as lists of decoded arguments."""
+        return [[arg.decode() for arg in command[1:]] for command in self.commands
+                if command[0].decode().upper() == name]
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, command) -> bytes:
+        with self._lock:
+            self.commands.append(command)
+            name, args = command[0].decode().upper(), command[1:]
+            if name == "PING":
+                return b"+PONG\r\n"
+            if name == "SELECT":
+                return b"+OK\r\n"
+            if name == "GET":
+                entry = self._live(args[0])
+                return _bulk(None if entry is None else entry[0])
+            if name == "SET":
+                expires_at = None
+                if len(args) == 4 and args[2].upper() == b"PX":
+                    expires_at = time.time() + int(args[3]) / 1000
+                self.data[args[0]] = (args[1], expires_at)
+                return b"+OK\r\n"
+            if name == "INCRBY":
+                entry = self._live(args[0])
+                value = int(entry[0] if entry else 0) + int(args[1])
+                self.data[args[0]] = (str(value).encode(), entry[1] if entry else None)
+                return b":%d\r\n" % value
+            if name == "PTTL":
+                entry = self._live(args[0])
+                if entry is None:
+                    return b":-2\r\n"
+                if entry[1] is None:
+                    return b":-1\r\n"
+                return b":%d\r\n" % int((entry[1] - time.time()) * 1000)
+            if name == "PEXPIRE":
+                entry = self._live(args[0])
+                if entry is None:
+                    return b":0\r\n"
+                self.data[args[0]] = (entry[0], time.time() + int(args[1]) / 1000)
+                return b":1\r\n"
+            if name == "DEL":
+                removed = sum(self.data.pop(key, None) is not None for key in args)
+                return b":%d\r\n" % removed
+            if name == "KEYS":
+                prefix = args[0].rstrip(b"*")
+                keys = [key for key in list(self.data) if key.startswith(prefix) and self._live(key)]
+                return b"*%d\r\n" % len(keys) + b"".join(_bulk(key) for key in keys)
+            return b"-ERR unknown command '%s'\r\n" % name.encode()
@@ -0,0 +1,73 @@
+import gzip
+from types import SimpleNamespace
+
+import pytest
+
+from catalog import CatalogCache, RenderedCatalog, encoding_weights
+
+
+class Source:
+    def __init__(self, base, name):
+        self.base = base
+        self.name = name
+
+
+def test_cache_drops_the_least_recently_used_source():
+    built = []
+    cache = CatalogCache(lambda source: built.append(source.name) or source.name.encode(), size=2)
+    base = object()
+    a, b, c = Source(base, "a"), Source(base, "b"), Source(base, "c")
+    cache.get(a)
+    cache.get(b)
+    cache.get(a)  # a is now the most recently used
+    cache.get(c)  # evicts b
+    cache.get(a)
+    assert built == ["a", "b", "c"]
+    cache.get(b)
+    assert built == ["a", "b", "c", "b"]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_cache_starts_over_for_a_new_base():
+    cache = CatalogCache(lambda source: source.name.encode(), size=4)
+    first = cache.get(Source(object(), "a"))
+    assert cache.get(Source(object(), "a")) is not first
+
+
+def respond(catalog, accept_encoding):
+    headers = {} if accept_encoding is None else {"accept-encoding": accept_encoding}
+    return catalog.respond(SimpleNamespace(headers=headers), "public, max-age=60")
+
+
+@pytest.mark.parametrize("accept_encoding,expected", [
+    (None, None),
+    ("gzip", "gzip"),
+    ("gzip;q=0.5, identity", "gzip"),
+    ("gzip;q=0", None),
+    ("GZIP; q=0.0", None),
+    ("*", "gzip"),
+    ("*, gzip;q=0", None),
+    ("deflate", None),
+])
+def test_content_coding_respects_q_values(accept_encoding, expected):
+    catalog = RenderedCatalog(b'{"hello":"world"}')
+    catalog.br_body = None  # Without brotli, whether or not it is installed
+    response = respond(catalog, accept_encoding)
+    assert response.headers.get("content-encoding") == expected
+    body = gzip.decompress(response.body) if expected == "gzip" else response.body
+    assert body == b'{"hello":"world"}'
+
+
+def test_brotli_is_skipped_when_refused():
+    catalog = RenderedCatalog(b'{"hello":"world"}')
+    catalog.br_body = b"brotli"  # Stand-in; only the selection matters here
+    assert respond(catalog, "br, gzip").headers["content-encoding"] == "br"
+    assert respond(catalog, "br;q=0, gzip").headers["content-encoding"] == "gzip"
+    assert respond(catalog, "br;q=0.4, gzip;q=0.8").headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in respond(catalog, "br;q=0").headers
+
+
+def test_encoding_weights():
+    assert encoding_weights("br;q=0, gzip ;q=0.7,identity") == {"br": 0.0, "gzip": 0.7, "identity": 1.0}
+    assert encoding_weights("gzip;q=abc") == {"gzip": 0.0}
+    assert encoding_weights(None) == {}
@@ -0,0 +1,61 @@
+from datetime import date
+
+import dates
+
+TODAY = date(2026, 1, 1)
+
+
+def check_batch(client, monkeypatch, subjects, features):
+    monkeypatch.setattr(dates, "today", lambda: TODAY)
+    response = client.post("/age-gate/check-batch", json={"subjects": subjects, "features": features})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_mixed_regions_match_single_checks(client, monkeypatch):
+    subjects = [
+        {"age": 14, "region": "US"},
+        {"age": 14, "region": "FR"},
+        {"child_dob": "2012-02-29", "region": "DE"},
+        {"age": 9, "region": "ZZ"},
+        {"age": 14, "region": "US"},
+    ]
+    features = ["free_chat", "voice_recording", "push_notifications"]
+    body = check_batch(client, monkeypatch, subjects, features)
+    assert body["total_subjects"] == 5
+    assert body["region"] == ["US", "FR", "DE", "ZZ", "US"]
+    assert body["age"] == [14, 14, 13, 9, 14]
+    assert body["errors"] == []
+    for i, subject in enumerate(subjects):
+        single = client.post("/age-gate/check-bulk", json={**subject, "features": features}).json()
+        expected = sum(1 << bit for bit, result in enumerate(single["results"]) if result["allowed"])
+        assert body["allowed"][i] == expected, subject
+        assert body["age_band"][i] == single["age_band"]
+
+
+def test_age_dob_mismatch_is_reported_with_a_code(client, monkeypatch):
+    subjects = [{"child_dob": "2015-06-01", "age": 12, "region": "US"}, {"child_dob": "2015-06-01", "age": 10, "region": "US"}]
+    body = check_batch(client, monkeypatch, subjects, ["free_chat"])
+    assert body["errors"] == [{
+        "index": 0,
+        "code": "AGE_DOB_MISMATCH",
+        "detail": "Provided age 12 does not match date of birth (calculated age 10)",
+    }]
+    assert body["age"] == [None, 10]
+    assert body["allowed"] == [None, 0]
+    assert body["age_band"] == [None, "8-12"]
+
+
+def test_duplicate_and_unknown_features(client, monkeypatch):
+    body = check_batch(client, monkeypatch, [{"age": 16, "region": "US"}],
+                       ["free_chat", "teleport", "free_chat", "push_notifications", "teleport"])
+    assert body["features"] == ["free_chat", "push_notifications"]
+    assert body["unsupported_features"] == ["teleport"]
+    assert body["allowed"] == [0b11]
+
+
+def test_empty_batch(client, monkeypatch):
+    body = check_batch(client, monkeypatch, [], ["free_chat"])
+    assert body["total_subjects"] == 0
+    assert body["age"] == body["age_band"] == body["region"] == body["allowed"] == body["errors"] == []
+    assert body["features"] == ["free_chat"]
@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+
+from compact import COMPACT_CBOR, COMPACT_JSON, COMPACT_MSGPACK, ENCODERS, epoch_days, negotiate
+from conftest import BASE_RULES
+
+BULK = {"child_dob": "2012-06-15", "region": "FR", "features": ["free_chat", "push_notifications", "teleport", "ai_chat"]}
+
+
+def feature_index(client):
+    response = client.get("/age-gate/feature-index")
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_feature_index_follows_feature_metadata_order(client):
+    body = feature_index(client)
+    assert [entry["name"] for entry in body["features"]] == list(BASE_RULES["feature_metadata"])
+    assert [entry["bit"] for entry in body["features"]] == list(range(len(BASE_RULES["feature_metadata"])))
+
+
+def test_index_version_changes_only_with_the_feature_list(client, rule_data, use_rules):
+    version = feature_index(client)["index_version"]
+    rule_data["rules"]["FR"]["ai_chat"] = 13
+    use_rules(rule_data)
+    assert feature_index(client)["index_version"] == version
+
+    rule_data["feature_metadata"]["photo_upload"] = {
+        "display_name": "Photo Upload", "description": "Share photos", "category": "Media"}
+    rule_data["default_rules"]["photo_upload"] = 13
+    use_rules(rule_data)
+    assert feature_index(client)["index_version"] != version
+
+
+def test_compact_bits_match_the_full_response(client):
+    full = client.post("/age-gate/check-bulk", json=BULK).json()
+    response = client.post("/age-gate/check-bulk", json=BULK, headers={"Accept": COMPACT_JSON})
+    assert response.headers["content-type"] == COMPACT_JSON
+    assert response.headers["vary"] == "Accept"
+    compact = response.json()
+
+    bits = {entry["name"]: entry["bit"] for entry in feature_index(client)["features"]}
+    assert compact["index_version"] == feature_index(client)["index_version"]
+    assert compact["age"] == full["age"]
+    assert compact["allowed"] == sum(1 << bits[result["feature"]] for result in full["results"] if result["allowed"])
+    assert compact["restricted"] == sum(1 << bits[result["feature"]] for result in full["results"] if not result["allowed"])
+    restricted = sorted((bits[result["feature"]], result["next_eligible_date"])
+                        for result in full["results"] if not result["allowed"])
+    assert compact["next_eligible"] == [epoch_days(date.fromisoformat(day)) for _, day in restricted]
+
+
+@pytest.mark.parametrize("accept,expected", [
+    (None, None),
+    ("application/json", None),
+    (COMPACT_JSON, COMPACT_JSON),
+    (f"application/json;q=0.5, {COMPACT_JSON}", COMPACT_JSON),
+    (f"{COMPACT_JSON};q=0.5, application/json", None),
+    (f"{COMPACT_JSON};q=0, application/json", None),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+
+@pytest.mark.parametrize("media_type", [COMPACT_MSGPACK, COMPACT_CBOR])
+def test_binary_formats_need_their_library(client, media_type):
+    response = client.post("/age-gate/check-bulk", json=BULK, headers={"Accept": media_type})
+    if ENCODERS[media_type] is None:
+        assert response.status_code == 406
+    else:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == media_type
@@ -0,0 +1,17 @@
+from datetime import date
+
+from dates import age_on, ages_from_keys, anniversary, date_key
+
+
+def test_leap_day_birthday_counts_on_march_1_in_common_years():
+    dob = date(2012, 2, 29)
+    assert age_on(dob, date(2023, 2, 28)) == 10
+    assert age_on(dob, date(2023, 3, 1)) == 11
+    assert anniversary(dob, 11) == date(2023, 3, 1)
+    assert age_on(dob, date(2024, 2, 29)) == 12
+
+
+def test_batch_ages_match_age_on():
+    today = date(2023, 2, 28)
+    dobs = [date(2012, 2, 29), date(2010, 3, 1), date(2010, 2, 28), date(2023, 2, 28)]
+    assert ages_from_keys([date_key(dob) for dob in dobs], date_key(today)) == [age_on(dob, today) for dob in dobs]
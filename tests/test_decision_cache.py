@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+from decisioncache import SharedDecisionTier
+from resp_fake import FakeRespServer
+
+CHECK = {"age": 14, "region": "FR", "feature": "free_chat"}
+
+
+@pytest.fixture
+def shared_tier(monkeypatch):
+    import main
+
+    server = FakeRespServer().start()
+    tier = SharedDecisionTier(server.uri + "?timeout=0.5")
+    monkeypatch.setattr(main.DECISION_CACHE, "shared", tier)
+    yield server
+    tier.connection.close()
+    server.stop()
+
+
+def wait_for_keys(server, count):
+    # Bodies are published off the request path
+    deadline = time.monotonic() + 2
+    while len(server.data) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(server.data) == count
+
+
+def test_shared_tier_misses_after_edit_without_version_bump(client, shared_tier, rule_data, use_rules):
+    before = client.post("/age-gate/check", json=CHECK).json()
+    wait_for_keys(shared_tier, 1)
+
+    rule_data["rules"]["FR"]["free_chat"] = 13
+    use_rules(rule_data)
+    after = client.post("/age-gate/check", json=CHECK).json()
+    assert before["allowed"] != after["allowed"]
+    wait_for_keys(shared_tier, 2)  # Published under the new content version
@@ -0,0 +1,25 @@
+from checks import DECISIONS
+
+CHECK = {"age": 11, "region": "GB", "feature": "ai_chat"}
+BULK = {"age": 11, "region": "GB", "features": ["ai_chat", "no_such_feature"]}
+
+
+def counted(labels):
+    return DECISIONS.values.get(labels, 0)
+
+
+def test_cache_hits_count_every_decision(client):
+    before = counted(("GB", "ai_chat", "restricted"))
+    for _ in range(10):
+        assert client.post("/age-gate/check", json=CHECK).status_code == 200
+    assert counted(("GB", "ai_chat", "restricted")) == before + 10
+
+
+def test_304_counts_the_decisions(client):
+    etag = client.post("/age-gate/check-bulk", json=BULK).headers["ETag"]
+    restricted = counted(("GB", "ai_chat", "restricted"))
+    unsupported = counted(("GB", "unknown", "unsupported"))
+    response = client.post("/age-gate/check-bulk", json=BULK, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert counted(("GB", "ai_chat", "restricted")) == restricted + 1
+    assert counted(("GB", "unknown", "unsupported")) == unsupported + 1
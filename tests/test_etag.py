@@ -0,0 +1,23 @@
+CHECK = {"child_dob": "2015-06-12", "region": "DE", "feature": "free_chat"}
+
+
+def test_check_etag_gets_304(client):
+    etag = client.post("/age-gate/check", json=CHECK).headers["ETag"]
+    response = client.post("/age-gate/check", json=CHECK, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+def test_rule_edit_without_version_bump_changes_etag(client, rule_data, use_rules):
+    before = client.post("/age-gate/check", json=CHECK)
+    etag = before.headers["ETag"]
+
+    # Same declared version, different content
+    rule_data["rules"]["DE"]["free_chat"] = 18
+    snapshot = use_rules(rule_data)
+    assert snapshot.version == rule_data["version"]
+
+    response = client.post("/age-gate/check", json=CHECK, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["reason"] != before.json()["reason"]
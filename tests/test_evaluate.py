@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import BASE_RULES, ROOT, RULES_FILE
+
+
+def evaluate(tmp_path, rows, output, *extra, rules=RULES_FILE):
+    source = tmp_path / "users.csv"
+    text = "user_id,child_dob,age,region\n" + "".join(f"{row}\n" for row in rows)
+    if not source.exists() or source.read_text() != text:  # Keep the mtime a resumed job checks
+        source.write_text(text)
+    return subprocess.run(
+        [sys.executable, os.path.join(ROOT, "evaluate.py"), str(source), str(output),
+         "--rules", str(rules), "--id-field", "user_id", "--as-of", "2026-01-01",
+         "--features", "free_chat", "--workers", "2", *extra],
+        capture_output=True, text=True,
+    )
+
+
+def run_evaluate(tmp_path, rows, *extra):
+    output = tmp_path / "results.jsonl"
+    result = evaluate(tmp_path, rows, output, *extra)
+    assert result.returncode == 0, result.stderr
+    return [json.loads(line) for line in output.read_text().splitlines()]
+
+
+def test_bad_rows_become_error_lines(tmp_path):
+    lines = run_evaluate(tmp_path, ["1,,10,US", "2,,5000,US", "3,9999-01-01,,US", "4,,ten,US", "5,2010-05-01,,US"])
+    assert [line["id"] for line in lines] == ["1", "2", "3", "4", "5"]
+    assert lines[0]["result"]["age"] == 10
+    assert lines[1]["error"] == {"status_code": 422, "detail": "age is out of range"}
+    assert lines[2]["error"] == {"status_code": 422, "detail": "child_dob is out of range"}
+    assert lines[3]["error"]["status_code"] == 422
+    assert lines[4]["result"]["age"] == 15
+    assert not (tmp_path / "results.jsonl.parts").exists()
+
+
+def test_output_keeps_input_order_across_chunks(tmp_path):
+    rows = [f"{i},,{i % 18},US" for i in range(2000)]
+    lines = run_evaluate(tmp_path, rows, "--chunk-mb", "0.005")
+    assert [line["id"] for line in lines] == [str(i) for i in range(2000)]
+    assert [line["result"]["age"] for line in lines] == [i % 18 for i in range(2000)]
+
+
+def test_resume_refuses_rules_edited_without_a_version_bump(tmp_path, rule_data):
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps(rule_data))
+    work_dir = tmp_path / "work"
+    rows = ["1,,10,US", "2,,14,FR"]
+    # The output directory is missing, so the run stops after its parts are written
+    first = evaluate(tmp_path, rows, tmp_path / "missing" / "results.jsonl", "--work-dir", str(work_dir), rules=rules)
+    assert first.returncode != 0
+    assert (work_dir / "job.json").exists()
+
+    rule_data["rules"]["FR"]["free_chat"] = 13
+    assert rule_data["version"] == BASE_RULES["version"]
+    rules.write_text(json.dumps(rule_data))
+    resumed = evaluate(tmp_path, rows, tmp_path / "results.jsonl", "--work-dir", str(work_dir), rules=rules)
+    assert resumed.returncode == 2
+    assert "holds parts of a different job" in resumed.stderr
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def schema_file(tmp_path, monkeypatch):
+    path = tmp_path / "openapi.json"
+    monkeypatch.setenv("AGE_GATE_PRELOAD", "0")
+    monkeypatch.setattr(main, "OPENAPI_FILE", str(path))
+    monkeypatch.setattr(main.app, "openapi_schema", None)
+    return path
+
+
+def prebuilt_schema(fingerprint):
+    schema = json.loads(json.dumps(main.app.openapi()))
+    main.app.openapi_schema = None
+    schema["info"]["title"] = "Prebuilt"
+    schema[main.OPENAPI_FINGERPRINT_KEY] = fingerprint
+    return schema
+
+
+def test_prebuilt_schema_is_served_without_preload(schema_file):
+    schema_file.write_text(json.dumps(prebuilt_schema(main.openapi_fingerprint())))
+
+    with TestClient(main.app) as client:
+        served = client.get("/openapi.json").json()
+    assert served["info"]["title"] == "Prebuilt"
+    assert main.OPENAPI_FINGERPRINT_KEY not in served
+
+
+def test_schema_built_from_other_code_is_ignored(schema_file):
+    # Same operations, but a model or parameter changed since the build
+    schema_file.write_text(json.dumps(prebuilt_schema("0" * 32)))
+
+    with TestClient(main.app) as client:
+        assert client.get("/openapi.json").json()["info"]["title"] == main.app.title
+
+
+def test_fingerprint_tracks_source(tmp_path, monkeypatch):
+    module = tmp_path / "models.py"
+    module.write_text("LIMIT = 1\n")
+    monkeypatch.setattr(main, "__file__", str(tmp_path / "main.py"))
+    before = main.openapi_fingerprint()
+    module.write_text("LIMIT = 2\n")
+    assert main.openapi_fingerprint() != before
@@ -0,0 +1,210 @@
+from calendar import isleap
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import dates
+from checks import CHECK_DISCLAIMER, evaluate_check, evaluate_check_bulk
+from encoding import encode_json, render_json
+from main import AgeGateResponse, BulkAgeGateResponse, FeatureResult
+from rulestore import RuleSnapshot
+
+# ------------------------
+# REFERENCE IMPLEMENTATION
+# ------------------------
+# The check handlers as they were before the rule table and decision table,
+# working on the rule dicts and rendered through the response models the
+# way FastAPI's response_model path does. Changes since then are applied
+# here on purpose: subdivisions inherit from their country, a Feb 29
+# birthday falls on Mar 1 in common years, and tenant overlays.
+TODAY = date(2023, 2, 28)
+
+TENANT = {
+    "feature_metadata": {
+        "photo_upload": {"display_name": "Photo Upload", "description": "Share photos", "category": "social"},
+    },
+    "rules": {"US": {"photo_upload": 13, "free_chat": 16}},
+    "default_rules": {"photo_upload": 11},
+}
+
+
+def reference_anniversary(dob: date, years: int) -> date:
+    if dob.month == 2 and dob.day == 29 and not isleap(dob.year + years):
+        return date(dob.year + years, 3, 1)
+    return dob.replace(year=dob.year + years)
+
+
+def reference_region_rules(data: dict, region: str, tenant=None) -> dict:
+    rules, default_rules = data["rules"], data["default_rules"]
+    country = region.partition("-")[0] if "-" in region else None
+    if region in rules:
+        region_rules = rules[region] if country is None else {**rules.get(country, default_rules), **rules[region]}
+    elif country in rules:
+        region_rules = rules[country]
+    else:
+        region_rules = default_rules
+    if tenant is None:
+        return region_rules
+    overlay = data["tenants"][tenant]
+    if region_rules is default_rules:
+        return {**default_rules, **overlay["default_rules"]}
+    added = {feature: age for feature, age in overlay["default_rules"].items() if feature in overlay["feature_metadata"]}
+    return {**region_rules, **added, **overlay["rules"].get(region, {})}
+
+
+def reference_regulation(data: dict, region: str) -> str:
+    metadata = data["region_metadata"].get(region) or data["region_metadata"].get(region.partition("-")[0])
+    return metadata["primary_regulation"] if metadata else "Standard age verification practices"
+
+
+def reference_upcoming_unlocks(data: dict, region_rules: dict, age: int, dob: date, tenant=None):
+    feature_metadata = {**data["feature_metadata"], **(data["tenants"][tenant]["feature_metadata"] if tenant else {})}
+    upcoming = []
+    for feature, min_age in region_rules.items():
+        if age < min_age <= age + 5:
+            upcoming.append({
+                "feature": feature,
+                "feature_display_name": feature_metadata.get(feature, {}).get("display_name", feature),
+                "unlocks_at_age": min_age,
+                "years_until_unlock": min_age - age,
+                "unlock_date": reference_anniversary(dob, min_age).isoformat(),
+            })
+    upcoming.sort(key=lambda x: x["years_until_unlock"])
+    return upcoming if upcoming else None
+
+
+def reference_age_and_dob(payload) -> tuple[int, date]:
+    if payload.child_dob:
+        dob = payload.child_dob
+        return TODAY.year - dob.year - ((TODAY.month, TODAY.day) < (dob.month, dob.day)), dob
+    return payload.age, date(TODAY.year - payload.age, TODAY.month, TODAY.day)
+
+
+def reference_age_band(data: dict, age: int) -> str:
+    return next((band for min_age, max_age, band in data["age_bands"] if min_age <= age <= max_age), "unknown")
+
+
+def rendered(model) -> bytes:
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+def reference_check(data: dict, payload, tenant=None) -> bytes:
+    age, dob = reference_age_and_dob(payload)
+    region, feature = payload.region, payload.feature
+    region_rules = reference_region_rules(data, region, tenant)
+    min_age = region_rules[feature]
+    allowed = age >= min_age
+    return rendered(AgeGateResponse(
+        allowed=allowed,
+        reason_code="AGE_RESTRICTED" if not allowed else "ALLOWED",
+        reason=(
+            f"{feature} is restricted for children under {min_age} in {region}"
+            if not allowed else
+            f"{feature} is allowed for this age group"
+        ),
+        age=age,
+        age_band=reference_age_band(data, age),
+        region=region,
+        regulation_reference=reference_regulation(data, region),
+        years_until_eligible=(min_age - age) if not allowed else None,
+        next_eligible_date=reference_anniversary(dob, min_age).isoformat() if not allowed else None,
+        upcoming_unlocks=reference_upcoming_unlocks(data, region_rules, age, dob, tenant),
+        disclaimer=CHECK_DISCLAIMER,
+    ))
+
+
+def reference_check_bulk(data: dict, payload, tenant=None) -> bytes:
+    age, dob = reference_age_and_dob(payload)
+    region = payload.region
+    region_rules = reference_region_rules(data, region, tenant)
+    results = []
+    for feature in payload.features:
+        min_age = region_rules.get(feature)
+        if min_age is None:
+            continue
+        allowed = age >= min_age
+        results.append(FeatureResult(
+            feature=feature,
+            allowed=allowed,
+            reason_code="ALLOWED" if allowed else "AGE_RESTRICTED",
+            reason=(
+                f"{feature} is allowed for this age group"
+                if allowed else
+                f"{feature} is restricted for children under {min_age} in {region}"
+            ),
+            min_age_required=min_age,
+            next_eligible_date=reference_anniversary(dob, min_age).isoformat() if not allowed else None,
+        ))
+    allowed_count = sum(result.allowed for result in results)
+    return rendered(BulkAgeGateResponse(
+        age=age,
+        age_band=reference_age_band(data, age),
+        region=region,
+        regulation_reference=reference_regulation(data, region),
+        results=results,
+        summary={
+            "total_features_checked": len(results),
+            "allowed": allowed_count,
+            "restricted": len(results) - allowed_count,
+        },
+        upcoming_unlocks=reference_upcoming_unlocks(data, region_rules, age, dob, tenant),
+        disclaimer=CHECK_DISCLAIMER,
+    ))
+
+
+# ------------------------
+# PARITY
+# ------------------------
+@pytest.fixture
+def data(rule_data, monkeypatch):
+    monkeypatch.setattr(dates, "today", lambda: TODAY)
+    rule_data["rules"]["US-CA"] = {"free_chat": 16, "ai_chat": 12}
+    rule_data["tenants"] = {"acme": TENANT}
+    return rule_data
+
+
+def payload(region, age=None, child_dob=None):
+    return SimpleNamespace(region=region, age=age, child_dob=child_dob)
+
+
+CASES = [
+    pytest.param(payload("US", age=10), None, id="normal-age"),
+    pytest.param(payload("DE", child_dob=date(2011, 6, 15)), None, id="normal-dob"),
+    pytest.param(payload("FR", age=15), None, id="at-minimum-age"),
+    pytest.param(payload("US", child_dob=date(2012, 2, 29)), None, id="feb-29"),
+    pytest.param(payload("GB", child_dob=date(2008, 2, 29)), None, id="feb-29-birthday-tomorrow"),
+    pytest.param(payload("ZZ", age=9), None, id="unknown-region"),
+    pytest.param(payload("US-CA", age=14), None, id="subdivision"),
+    pytest.param(payload("US-NY", age=14), None, id="unlisted-subdivision"),
+    pytest.param(payload("US", age=12), "acme", id="tenant"),
+    pytest.param(payload("ZZ", age=10), "acme", id="tenant-unknown-region"),
+]
+
+
+def snapshot_for(data, tenant):
+    snapshot = RuleSnapshot(data)
+    return snapshot if tenant is None else snapshot.tenants[tenant]
+
+
+@pytest.mark.parametrize("request_payload,tenant", CASES)
+def test_check_matches_reference(data, request_payload, tenant):
+    snapshot = snapshot_for(data, tenant)
+    for feature in ("free_chat", "voice_recording", "push_notifications", *(("photo_upload",) if tenant else ())):
+        check = SimpleNamespace(**vars(request_payload), feature=feature)
+        content, _ = evaluate_check(check, snapshot)
+        expected = reference_check(data, check, tenant)
+        assert render_json(content) == expected, feature
+        assert encode_json(content) == expected, feature
+
+
+@pytest.mark.parametrize("request_payload,tenant", CASES)
+def test_check_bulk_matches_reference(data, request_payload, tenant):
+    snapshot = snapshot_for(data, tenant)
+    check = SimpleNamespace(**vars(request_payload), features=[*snapshot.feature_metadata, "teleport", "free_chat"])
+    content, _ = evaluate_check_bulk(check, snapshot)
+    expected = reference_check_bulk(data, check, tenant)
+    assert render_json(content) == expected
+    assert encode_json(content) == expected
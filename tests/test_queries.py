@@ -0,0 +1,51 @@
+import pytest
+
+
+@pytest.fixture
+def california(rule_data, use_rules):
+    rule_data["rules"]["US-CA"] = {"ai_chat": 16}
+    return use_rules(rule_data)
+
+
+def min_age(client, **params):
+    response = client.get("/age-gate/query/min-age", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_allowed_regions_in_a_group(client):
+    body = client.get("/age-gate/query/regions", params={"feature": "ai_chat", "age": 14, "regions": "EU"}).json()
+    assert body["scope"] == ["DE", "FR", "IT", "ES", "NL", "SE", "PL"]
+    # Youngest minimum age first; equal ages keep the group's order
+    assert body["allowed"] == ["SE", "IT", "ES"]
+    assert body["restricted"] == ["FR", "DE", "NL", "PL"]
+    assert body["most_lenient"] == {"min_age": 13, "regions": ["SE"]}
+    assert body["strictest"] == {"min_age": 16, "regions": ["DE", "NL", "PL"]}
+
+
+def test_allowed_regions_at_the_minimum_age(client):
+    at = client.get("/age-gate/query/regions", params={"feature": "ai_chat", "age": 16, "regions": "DE,FR"}).json()
+    below = client.get("/age-gate/query/regions", params={"feature": "ai_chat", "age": 15, "regions": "DE,FR"}).json()
+    assert at["allowed"] == ["FR", "DE"] and at["restricted"] == []
+    assert below["allowed"] == ["FR"] and below["restricted"] == ["DE"]
+
+
+def test_min_age_for_a_subdivision_and_its_country(client, california):
+    assert min_age(client, features="ai_chat", regions="US")["strictest_age"] == 13
+    assert min_age(client, features="ai_chat", regions="US-CA")["strictest_age"] == 16
+    # The subdivision inherits what it does not override
+    assert min_age(client, features="free_chat", regions="US-CA")["strictest_age"] == 13
+
+    body = min_age(client, features="ai_chat,free_chat,ai_chat", regions="US,US-CA")
+    assert body["scope"] == ["US", "US-CA"]
+    assert [entry["feature"] for entry in body["features"]] == ["ai_chat", "free_chat"]
+    assert body["features"][0]["most_lenient"] == {"min_age": 13, "regions": ["US"]}
+    assert body["features"][0]["strictest"] == {"min_age": 16, "regions": ["US-CA"]}
+    assert (body["most_lenient_age"], body["strictest_age"]) == (13, 16)
+
+
+def test_unknown_names_are_rejected(client):
+    assert client.get("/age-gate/query/min-age", params={"features": "teleport"}).status_code == 400
+    response = client.get("/age-gate/query/min-age", params={"features": "ai_chat", "regions": "ATLANTIS"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown region or group 'ATLANTIS'"
@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+import uuid
+
+import pytest
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter
+
+from ratelimit import RespStorage, SharedMemoryStorage
+from resp_fake import FakeRespServer
+
+LIMIT = parse("3/minute")
+
+
+@pytest.fixture
+def resp_server():
+    server = FakeRespServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def resp_storage(resp_server):
+    storages = []
+
+    def make():
+        # Flushes are driven by the tests, not the background thread
+        storage = RespStorage(resp_server.uri + "?flush_interval=3600&timeout=0.5")
+        storages.append(storage)
+        return storage
+
+    yield make
+    for storage in storages:
+        storage._stopped.set()
+        storage.connection.close()
+
+
+@pytest.fixture
+def shm_uri():
+    storage_name = f"age-gate-test-{uuid.uuid4().hex}"
+    yield f"shm:///{storage_name}?slots=64"
+    os.unlink(SharedMemoryStorage(f"shm:///{storage_name}").path)
+
+
+# ------------------------
+# shm://
+# ------------------------
+def test_shm_hit_limit_and_reset(shm_uri):
+    limiter = FixedWindowRateLimiter(SharedMemoryStorage(shm_uri))
+    assert [limiter.hit(LIMIT, "client") for _ in range(4)] == [True, True, True, False]
+    assert limiter.hit(LIMIT, "other")
+    limiter.clear(LIMIT, "client")
+    assert limiter.hit(LIMIT, "client")
+
+
+def test_shm_counters_are_shared_between_workers(shm_uri):
+    first, second = SharedMemoryStorage(shm_uri), SharedMemoryStorage(shm_uri)
+    first.incr("key", 60)
+    first.incr("key", 60)
+    assert second.incr("key", 60) == 3
+    assert second.reset() == 1
+    assert first.get("key") == 0
+
+
+def _hammer(storage, hits):
+    for _ in range(hits):
+        storage.incr("key", 60)
+
+
+def test_shm_counters_are_exact_across_forked_workers(shm_uri):
+    # Created before the fork, like a pre-forking server's storage
+    storage = SharedMemoryStorage(shm_uri)
+    storage.incr("key", 60)
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_hammer, args=(storage, 5000)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    _hammer(storage, 5000)
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert storage.get("key") == 1 + 5 * 5000
+
+
+# ------------------------
+# resp://
+# ------------------------
+def test_resp_hit_limit_and_reset(resp_server, resp_storage):
+    storage = resp_storage()
+    limiter = FixedWindowRateLimiter(storage)
+    assert [limiter.hit(LIMIT, "client") for _ in range(4)] == [True, True, True, False]
+    storage.flush()
+    assert resp_server.data
+    assert storage.reset() == 1
+    assert not resp_server.data
+    assert limiter.hit(LIMIT, "client")
+
+
+def test_resp_batches_increments_into_one_pipeline(resp_server, resp_storage):
+    storage = resp_storage()
+    for _ in range(50):
+        storage.incr("a", 60)
+    storage.incr("b", 60)
+    assert resp_server.names("INCRBY") == []  # Nothing on the request path
+
+    storage.flush()
+    assert sorted(resp_server.names("INCRBY")) == [["age-gate:a", "50"], ["age-gate:b", "1"]]
+    assert len(resp_server.names("PEXPIRE")) == 2  # Windows opened by this node
+
+
+def test_resp_limit_holds_across_workers(resp_storage):
+    first, second = resp_storage(), resp_storage()
+    for _ in range(2):
+        first.incr("client", 60)
+    first.flush()
+    second.incr("client", 60)
+    second.flush()
+    assert second.get("client") == 3
+    first.incr("client", 60)
+    first.flush()
+    assert first.get("client") == 4
+
+
+def test_resp_survives_server_loss(resp_server, resp_storage):
+    storage = resp_storage()
+    storage.incr("client", 60)
+    storage.flush()
+    assert storage.check()
+
+    resp_server.stop()
+    # Hits keep working on the local view while the server is gone
+    assert storage.incr("client", 60) == 2
+    assert storage.incr("client", 60) == 3
+    assert not storage.check()
+    with pytest.raises(OSError):
+        storage.flush()
+
+    # Pending hits are kept and sent once the server is back (here: restarted empty)
+    resp_server.start()
+    storage.flush()
+    assert int(resp_server.data[b"age-gate:client"][0]) == 2
+    assert storage.check()
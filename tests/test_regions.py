@@ -0,0 +1,66 @@
+def test_subdivision_without_metadata_is_listed(client, rule_data, use_rules):
+    rule_data["rules"]["US-CA"] = {"personalized_ads": 16}
+    use_rules(rule_data)
+
+    regions = client.get("/age-gate/regions", params={"level": "subdivision"}).json()["regions"]
+    assert [entry["code"] for entry in regions] == ["US-CA"]
+    assert regions[0]["notable_exceptions"] == {"personalized_ads": 16}
+    assert regions[0]["name"].startswith("United States")
+
+    codes = [entry["code"] for entry in client.get("/age-gate/regions", params={"country": "US"}).json()["regions"]]
+    assert codes == ["US", "US-CA"]
+
+
+def regions_page(client, **params):
+    response = client.get("/age-gate/regions", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_pages_cover_every_region_once(client):
+    everything = regions_page(client)
+    codes = [entry["code"] for entry in everything["regions"]]
+    assert codes == sorted(codes)
+    assert everything["total_regions"] == len(codes)
+    assert everything["next_offset"] is None
+
+    seen, offset = [], 0
+    while offset is not None:
+        page = regions_page(client, offset=offset, limit=5)
+        assert page["total_regions"] == len(codes)
+        assert len(page["regions"]) <= 5
+        seen += [entry["code"] for entry in page["regions"]]
+        offset = page["next_offset"]
+    assert seen == codes
+
+
+def test_page_boundaries(client):
+    total = regions_page(client)["total_regions"]
+    last = regions_page(client, offset=total - 1, limit=1)
+    assert len(last["regions"]) == 1 and last["next_offset"] is None
+    assert regions_page(client, offset=total - 2, limit=1)["next_offset"] == total - 1
+    exact = regions_page(client, offset=0, limit=total)
+    assert len(exact["regions"]) == total and exact["next_offset"] is None
+    past = regions_page(client, offset=total + 10)
+    assert past["regions"] == [] and past["next_offset"] is None and past["total_regions"] == total
+    assert client.get("/age-gate/regions", params={"limit": 0}).status_code == 422
+    assert client.get("/age-gate/regions", params={"limit": 501}).status_code == 422
+    assert client.get("/age-gate/regions", params={"offset": -1}).status_code == 422
+
+
+def test_filters_page_within_the_selection(client, rule_data, use_rules):
+    rule_data["rules"].update({"US-CA": {"ai_chat": 16}, "US-TX": {"ai_chat": 14}, "CA-QC": {"ai_chat": 14}})
+    use_rules(rule_data)
+
+    first = regions_page(client, country="US", limit=2)
+    assert [entry["code"] for entry in first["regions"]] == ["US", "US-CA"]
+    assert (first["total_regions"], first["next_offset"]) == (3, 2)
+    second = regions_page(client, country="US", limit=2, offset=2)
+    assert [entry["code"] for entry in second["regions"]] == ["US-TX"]
+    assert second["next_offset"] is None
+
+    subdivisions = regions_page(client, level="subdivision")
+    assert [entry["code"] for entry in subdivisions["regions"]] == ["CA-QC", "US-CA", "US-TX"]
+    assert [entry["code"] for entry in regions_page(client, country="US", level="country")["regions"]] == ["US"]
+    assert regions_page(client, country="ZZ")["regions"] == []
+    assert "-" not in "".join(entry["code"] for entry in regions_page(client, level="country")["regions"])
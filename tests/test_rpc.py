@@ -0,0 +1,92 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from checks import CheckError, evaluate_check, evaluate_check_bulk
+from rpc import CheckParams, RpcClient, RpcServer
+from rulestore import RuleStore
+
+TENANT = {
+    "feature_metadata": {
+        "photo_upload": {"display_name": "Photo Upload", "description": "Share photos", "category": "social"},
+    },
+    "rules": {"US": {"photo_upload": 13}},
+    "default_rules": {"photo_upload": 16},
+}
+
+
+@pytest.fixture
+def rpc(tmp_path, rule_data):
+    """(socket path, RuleStore) of an RpcServer running on its own event loop."""
+    rule_data["tenants"] = {"acme": TENANT}
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps(rule_data))
+    store = RuleStore(str(rules))
+    server = RpcServer(store, str(tmp_path / "rpc.sock"))
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server.path, store
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def expected(evaluate, params, snapshot, bulk):
+    return evaluate(CheckParams(params, bulk), snapshot)[0]
+
+
+def test_check_round_trip(rpc):
+    path, store = rpc
+    params = {"age": 12, "region": "US", "feature": "free_chat"}
+    with RpcClient(path) as client:
+        assert client.call("check", **params) == expected(evaluate_check, params, store.current, False)
+        with pytest.raises(CheckError) as exc_info:
+            client.call("check", age=12, region="US", feature="teleport")
+    assert exc_info.value.status_code == 400
+
+
+def test_bulk_check_round_trip(rpc):
+    path, store = rpc
+    params = {"child_dob": "2012-02-29", "region": "DE", "features": ["free_chat", "teleport", "ai_chat"]}
+    with RpcClient(path) as client:
+        assert client.call("check_bulk", **params) == expected(evaluate_check_bulk, params, store.current, True)
+
+
+def test_batch_streams_results_and_item_errors(rpc):
+    path, store = rpc
+    items = [
+        {"age": 14, "region": "FR", "feature": "free_chat"},
+        {"age": 14, "region": "FR", "feature": "teleport"},
+        {"region": "FR", "feature": "free_chat"},
+        {"age": 16, "region": "ZZ", "feature": "ai_chat"},
+    ]
+    with RpcClient(path) as client:
+        replies = list(client.batch("check", items))
+        # The connection stays usable after a batch
+        assert client.call("check", **items[0]) == expected(evaluate_check, items[0], store.current, False)
+    assert [index for index, _ in replies] == [0, 1, 2, 3]
+    assert replies[0][1] == expected(evaluate_check, items[0], store.current, False)
+    assert replies[3][1] == expected(evaluate_check, items[3], store.current, False)
+    assert isinstance(replies[1][1], CheckError) and replies[1][1].status_code == 400
+    assert isinstance(replies[2][1], CheckError) and replies[2][1].status_code == 422
+
+
+def test_tenant_scoped_calls(rpc):
+    path, store = rpc
+    tenant = store.current.tenants["acme"]
+    with RpcClient(path, tenant="acme") as client:
+        for region, age in (("US", 13), ("GB", 13), ("GB", 16)):
+            params = {"age": age, "region": region, "feature": "photo_upload"}
+            assert client.call("check", **params) == expected(evaluate_check, params, tenant, False)
+        params = {"age": 14, "region": "US", "features": ["photo_upload", "free_chat"]}
+        assert client.call("check_bulk", **params) == expected(evaluate_check_bulk, params, tenant, True)
+    with RpcClient(path) as client, pytest.raises(CheckError):
+        client.call("check", age=13, region="US", feature="photo_upload")
+    with RpcClient(path, tenant="nobody") as client, pytest.raises(CheckError) as exc_info:
+        client.call("check", age=13, region="US", feature="free_chat")
+    assert exc_info.value.detail == "Unknown tenant 'nobody'"
@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+FEATURES = {
+    "ai_chat": {"display_name": "AI Chat", "description": "Chat with AI", "category": "AI-Powered"},
+    "free_chat": {"display_name": "Free Chat", "description": "Chat freely", "category": "Social"},
+}
+
+
+def rule_file(path, version, nl_ai_chat):
+    path.write_text(json.dumps({
+        "version": version,
+        "rules": {"NL": {"ai_chat": nl_ai_chat, "free_chat": 16}, "US": {"ai_chat": 13, "free_chat": 13}},
+        "default_rules": {"ai_chat": 13, "free_chat": 13},
+        "region_metadata": {},
+        "feature_metadata": FEATURES,
+        "age_bands": [[0, 12, "0-12"], [13, 17, "13-17"], [18, 120, "18+"]],
+    }))
+    return str(path)
+
+
+POPULATION = [
+    "user_id,child_dob,region",
+    "1,2012-06-01,NL",
+    "2,2012-06-01,NL",
+    "3,2011-01-01,NL",
+    "4,2009-01-01,NL",
+    "5,2015-01-01,NL",
+    "6,2012-06-01,US",
+    "7,not-a-date,NL",
+]
+
+
+def test_report_and_affected_rows(tmp_path):
+    current = rule_file(tmp_path / "current.json", "1", 16)
+    candidate = rule_file(tmp_path / "candidate.json", "2", 13)
+    population = tmp_path / "users.csv"
+    population.write_text("\n".join(POPULATION) + "\n")
+    affected = tmp_path / "affected.csv"
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "simulate.py"), candidate, str(population), "--rules", current,
+         "--as-of", "2026-01-01", "--affected", str(affected), "--workers", "2", "--chunk-mb", "0.00005"],
+        capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+    report = json.loads(result.stdout)
+    assert report["current_version"] == "1" and report["candidate_version"] == "2"
+    assert (report["rows"], report["skipped_rows"], report["affected_rows"]) == (6, 1, 3)
+    assert report["by_feature"] == {"ai_chat": {"newly_restricted": 0, "newly_allowed": 3}}
+    assert report["by_region"] == {
+        "NL": {"rows": 5, "affected_rows": 3, "newly_restricted": 0, "newly_allowed": 3},
+        "US": {"rows": 1, "affected_rows": 0, "newly_restricted": 0, "newly_allowed": 0},
+    }
+    assert report["by_age_band"]["13-17"]["affected_rows"] == 3
+    assert report["by_age_band"]["0-12"] == {"rows": 1, "affected_rows": 0, "newly_restricted": 0, "newly_allowed": 0}
+    assert report["changes"] == [
+        {"region": "NL", "feature": "ai_chat", "age_band": "13-17", "newly_restricted": 0, "newly_allowed": 3},
+    ]
+    assert affected.read_text().splitlines() == POPULATION[:4]
+    assert "7 rows" in result.stderr and "3 affected, 1 skipped" in result.stderr
@@ -0,0 +1,24 @@
+import json
+
+GOOD = {"age": 10, "region": "US", "feature": "free_chat"}
+
+
+def stream(client, records):
+    body = "".join(json.dumps(record) + "\n" for record in records)
+    response = client.post("/age-gate/check-stream", content=body,
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_stream_reports_out_of_range_records_inline(client):
+    lines = stream(client, [GOOD, {**GOOD, "age": 5000}, {**GOOD, "age": None, "child_dob": "9999-01-01"}, GOOD])
+    assert len(lines) == 4
+    assert lines[0]["allowed"] is False and lines[3] == lines[0]
+    assert lines[1] == {"line": 2, "error": {"status_code": 422, "detail": "age is out of range"}}
+    assert lines[2] == {"line": 3, "error": {"status_code": 422, "detail": "child_dob is out of range"}}
+
+
+def test_check_rejects_out_of_range_age(client):
+    response = client.post("/age-gate/check", json={**GOOD, "age": 5000})
+    assert response.status_code == 422
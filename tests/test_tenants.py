@@ -0,0 +1,45 @@
+import pytest
+
+TENANT = {
+    "feature_metadata": {
+        "photo_upload": {"display_name": "Photo Upload", "description": "Share photos", "category": "social"},
+        "pen_pals": {"display_name": "Pen Pals", "description": "Write to other kids", "category": "social"},
+    },
+    "rules": {"US": {"photo_upload": 13}, "DE": {"pen_pals": 15}},
+    "default_rules": {"photo_upload": 16},
+}
+
+
+@pytest.fixture
+def tenant_rules(rule_data, use_rules):
+    rule_data["tenants"] = {"acme": TENANT}
+    return use_rules(rule_data)
+
+
+def catalog_ages(client, feature):
+    features = client.get("/age-gate/features", headers={"X-Tenant-ID": "acme"}).json()["features"]
+    return next(entry for entry in features if entry["name"] == feature)["age_requirements_by_region"]
+
+
+def check(client, region, feature, age):
+    return client.post("/age-gate/check", json={"age": age, "region": region, "feature": feature},
+                       headers={"X-Tenant-ID": "acme"})
+
+
+@pytest.mark.parametrize("feature", ["photo_upload", "pen_pals"])
+def test_catalog_agrees_with_check_for_tenant_features(client, tenant_rules, feature):
+    ages = catalog_ages(client, feature)
+    for region in ("GB", "US", "DE", "FR"):
+        response = check(client, region, feature, 14)
+        if ages[region] is None:
+            assert response.status_code == 400, region
+        else:
+            assert response.status_code == 200, region
+            assert response.json()["allowed"] == (14 >= ages[region]), region
+
+
+def test_tenant_default_applies_in_listed_regions(client, tenant_rules):
+    assert catalog_ages(client, "photo_upload")["GB"] == 16
+    assert catalog_ages(client, "photo_upload")["US"] == 13
+    assert check(client, "GB", "photo_upload", 16).json()["allowed"] is True
+    assert check(client, "GB", "photo_upload", 15).json()["allowed"] is False
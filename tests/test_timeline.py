@@ -0,0 +1,55 @@
+from datetime import date
+
+import dates
+from conftest import BASE_RULES
+
+TODAY = date(2026, 1, 1)
+
+
+def timeline(client, monkeypatch, **params):
+    monkeypatch.setattr(dates, "today", lambda: TODAY)
+    response = client.get("/age-gate/timeline", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_entries_are_in_unlock_order_with_ties_in_rule_order(client, monkeypatch):
+    body = timeline(client, monkeypatch, region="FR", child_dob="2014-06-01")
+    rules = BASE_RULES["rules"]["FR"]
+    # Stable sort: features unlocking at the same age keep the rule file's order
+    assert [entry["feature"] for entry in body["timeline"]] == sorted(rules, key=rules.get)
+    assert [entry["unlocks_at_age"] for entry in body["timeline"]] == sorted(rules.values())
+    assert body["age"] == 11
+    assert body["regulation_reference"] == "GDPR (French implementation)"
+
+    push, voice = body["timeline"][:2]
+    assert push == {"feature": "push_notifications", "feature_display_name": "Push Notifications",
+                    "unlocks_at_age": 6, "unlock_date": "2020-06-01", "unlocked": True}
+    assert voice["unlock_date"] == "2024-06-01" and voice["unlocked"] is True
+    assert all(not entry["unlocked"] for entry in body["timeline"] if entry["unlocks_at_age"] == 15)
+
+
+def test_horizon_is_inclusive(client, monkeypatch):
+    def ages(horizon):
+        body = timeline(client, monkeypatch, region="FR", child_dob="2014-06-01", horizon=horizon)
+        return [entry["unlocks_at_age"] for entry in body["timeline"]]
+
+    assert ages(0) == []
+    assert ages(6) == [6]
+    assert ages(10) == [6, 10, 10]
+    assert ages(14) == [6, 10, 10]
+    assert len(ages(15)) == len(BASE_RULES["rules"]["FR"])
+
+
+def test_leap_day_birthday_unlocks_on_march_1(client, monkeypatch):
+    body = timeline(client, monkeypatch, region="US", child_dob="2012-02-29")
+    dates_by_age = {entry["unlocks_at_age"]: entry["unlock_date"] for entry in body["timeline"]}
+    assert dates_by_age[5] == "2017-03-01"
+    assert dates_by_age[8] == "2020-02-29"
+    assert dates_by_age[13] == "2025-03-01"
+
+
+def test_unknown_region_uses_default_rules(client, monkeypatch):
+    body = timeline(client, monkeypatch, region="ZZ", child_dob="2014-06-01")
+    assert [entry["unlocks_at_age"] for entry in body["timeline"]] == sorted(BASE_RULES["default_rules"].values())
+    assert body["regulation_reference"] == "Standard age verification practices"